@@ -12,6 +12,8 @@ INSTALL_DIR="/opt/raspi-print-agent"
 SERVICE_NAME="raspi-print-agent"
 CONFIG_DIR="/etc/raspi-print-agent"
 LOG_DIR="/var/log/raspi-print-agent"
+CACHE_DIR="/var/cache/raspi-print-agent"
+STATE_DIR="/var/lib/raspi-print-agent"
 USER="pi"
 GROUP="lp"
 
@@ -45,12 +47,18 @@ echo "📁 Creating directories..."
 mkdir -p "$INSTALL_DIR"
 mkdir -p "$CONFIG_DIR"
 mkdir -p "$LOG_DIR"
+mkdir -p "$CACHE_DIR"
+mkdir -p "$STATE_DIR"
 
 # Set permissions
 chown "$USER:$GROUP" "$INSTALL_DIR"
 chown "$USER:$GROUP" "$LOG_DIR"
+chown "$USER:$GROUP" "$CACHE_DIR"
+chown "$USER:$GROUP" "$STATE_DIR"
 chmod 755 "$INSTALL_DIR"
 chmod 755 "$LOG_DIR"
+chmod 755 "$CACHE_DIR"
+chmod 750 "$STATE_DIR"
 
 echo "📋 Copying application files..."
 
@@ -151,7 +159,7 @@ echo ""
 echo "2. Update the following required settings:"
 echo "   - BACKEND_URL: Your AutoPrint backend URL"
 echo "   - RASPI_API_KEY: Your Raspberry Pi API key"
-echo "   - PRINTER_NAME: Your CUPS printer name"
+echo "   - PRINTER_NAME: Your CUPS printer name (comma-separated for several printers)"
 echo ""
 echo "3. List available printers:"
 echo "   lpstat -p"
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Backend Client for Raspberry Pi Print Agent
+Circuit breaker and hedged requests around the backend API
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Deque, List
+
+import aiohttp
+
+class BackendUnavailable(Exception):
+    """The circuit breaker is open; the request was not sent"""
+
+@dataclass
+class BackendResponse:
+    """Status and decoded body of a backend response"""
+    status: int
+    body: Any  # Parsed JSON, or the text if the response is not JSON
+
+class CircuitBreaker:
+    """
+    Stops calls to a backend that keeps failing and lets them back in gradually
+    
+    closed:    calls go through; `failure_threshold` consecutive failures open it
+    open:      calls fail at once for `reset_timeout` seconds, doubling (up to
+               `max_reset_timeout`) each time a trial fails
+    half-open: one trial call at a time; `success_threshold` successes in a
+               row close the breaker, any failure opens it again
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0,
+                 max_reset_timeout: float = 120.0, success_threshold: int = 3):
+        """
+        Initialize the breaker
+        
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds the breaker first stays open
+            max_reset_timeout: Longest time the breaker stays open
+            success_threshold: Successful trials that close it again
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.success_threshold = success_threshold
+        self.logger = logging.getLogger(__name__)
+        
+        self._state = self.CLOSED
+        self._failures = 0
+        self._successes = 0
+        self._trial_in_flight = False
+        self._open_period = reset_timeout
+        self._open_until = 0.0
+        
+        self.stats = {
+            'opened': 0,
+            'rejected': 0
+        }
+    
+    @property
+    def state(self) -> str:
+        """Current state; an open breaker turns half-open once its time is up"""
+        if self._state == self.OPEN and time.monotonic() >= self._open_until:
+            self._state = self.HALF_OPEN
+            self._successes = 0
+            self.logger.info("Backend circuit breaker half-open, sending trial requests")
+        return self._state
+    
+    def acquire(self) -> bool:
+        """Ask to send a call; every granted call must be followed by record()"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.stats['rejected'] += 1
+        return False
+    
+    def record(self, success: Optional[bool]) -> None:
+        """Record the outcome of a granted call (None if it was abandoned without one)"""
+        if self._state == self.HALF_OPEN:
+            self._trial_in_flight = False
+        if success is None:
+            return
+        
+        if success:
+            self._failures = 0
+            if self._state == self.HALF_OPEN:
+                self._successes += 1
+                if self._successes >= self.success_threshold:
+                    self._state = self.CLOSED
+                    self._open_period = self.reset_timeout
+                    self.logger.info("Backend circuit breaker closed")
+            return
+        
+        self._failures += 1
+        if self._state == self.HALF_OPEN:
+            self._open(min(self._open_period * 2, self.max_reset_timeout))
+        elif self._state == self.CLOSED and self._failures >= self.failure_threshold:
+            self._open(self.reset_timeout)
+    
+    def _open(self, period: float) -> None:
+        """Stop calls for `period` seconds"""
+        self._state = self.OPEN
+        self._open_period = period
+        self._open_until = time.monotonic() + period
+        self.stats['opened'] += 1
+        self.logger.error(f"Backend circuit breaker open for {period:.0f}s after {self._failures} failure(s)")
+    
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds until a call would be granted; True if it would"""
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.state
+            if state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            until_half_open = self._open_until - time.monotonic() if state == self.OPEN else 0.1
+            await asyncio.sleep(min(max(until_half_open, 0.01), remaining))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Breaker statistics"""
+        state = self.state
+        return {
+            **self.stats,
+            'state': state,
+            'consecutive_failures': self._failures,
+            'open_seconds_left': max(self._open_until - time.monotonic(), 0.0) if state == self.OPEN else 0.0
+        }
+
+class BackendClient:
+    """
+    Backend API calls through a circuit breaker, with hedging for GETs
+    
+    A hedged GET sends a second copy of the request once the first has taken
+    longer than the 95th percentile of recent latencies, and takes whichever
+    answers first. Only a 2xx answer wins straight away; a non-2xx answer
+    waits for the other request, and if neither succeeds the first request's
+    answer is the one returned. GETs that are not idempotent, such as
+    /api/print/fetch (which consumes the UPID), must pass hedge=False.
+    
+    Hedges are only sent while the breaker is closed; a struggling backend
+    does not get extra load.
+    """
+    
+    LATENCY_SAMPLES = 200
+    MIN_SAMPLES = 20  # Below this the default hedge delay is used
+    
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, api_key: str,
+                 breaker: Optional[CircuitBreaker] = None, hedge: bool = True,
+                 hedge_default_delay: float = 1.0, hedge_min_delay: float = 0.05):
+        """
+        Initialize the client
+        
+        Args:
+            session: HTTP session for backend traffic
+            base_url: Backend URL
+            api_key: Value of the X-API-KEY header
+            breaker: Circuit breaker (a default one if omitted)
+            hedge: Hedge GET requests
+            hedge_default_delay: Hedge delay until enough latencies have been seen (seconds)
+            hedge_min_delay: Shortest hedge delay, however fast the backend is (seconds)
+        """
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.logger = logging.getLogger(__name__)
+        
+        self.latencies: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+        
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'hedges_sent': 0,
+            'hedges_won': 0
+        }
+    
+    @property
+    def hedge_delay(self) -> float:
+        """Seconds after which a GET is hedged: p95 of recent GET latencies"""
+        if len(self.latencies) < self.MIN_SAMPLES:
+            return self.hedge_default_delay
+        ordered = sorted(self.latencies)
+        return max(ordered[int(len(ordered) * 0.95)], self.hedge_min_delay)
+    
+    async def request(self, method: str, path: str, wait: float = 0.0, hedge: Optional[bool] = None,
+                      **kwargs) -> BackendResponse:
+        """
+        Send a request to the backend
+        
+        Args:
+            method: HTTP method; GETs are hedged
+            path: Path below the backend URL
+            wait: Seconds to wait for an open breaker to let the request through
+            hedge: Whether a GET may be hedged (the client's setting if None)
+            **kwargs: Passed to aiohttp (params, json, ...)
+        
+        Returns:
+            BackendResponse
+        
+        Raises:
+            BackendUnavailable: If the breaker does not let the request through
+            aiohttp.ClientError, asyncio.TimeoutError: If the request fails
+        """
+        if not self.breaker.acquire():
+            if not wait or not await self.breaker.wait(wait) or not self.breaker.acquire():
+                raise BackendUnavailable(f"Backend circuit breaker is {self.breaker.state}")
+        
+        url = f"{self.base_url}{path}"
+        headers = {'X-API-KEY': self.api_key, 'Content-Type': 'application/json', **kwargs.pop('headers', {})}
+        primary = asyncio.create_task(self._send(method, url, headers, kwargs))
+        if method != 'GET' or not (self.hedge if hedge is None else hedge):
+            return await primary
+        return await self._hedged(primary, method, url, headers, kwargs)
+    
+    async def _send(self, method: str, url: str, headers: Dict[str, str], kwargs: Dict[str, Any],
+                    granted: bool = True) -> BackendResponse:
+        """Send one request (already granted by the breaker) and record its outcome"""
+        if not granted and not self.breaker.acquire():
+            raise BackendUnavailable("Backend circuit breaker opened before the hedge")
+        self.stats['requests'] += 1
+        started_at = time.monotonic()
+        outcome: Optional[bool] = None
+        try:
+            async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                if response.content_type == 'application/json':
+                    body = await response.json()
+                else:
+                    body = await response.text()
+            outcome = response.status < 500 and response.status != 429
+            if outcome and method == 'GET':
+                self.latencies.append(time.monotonic() - started_at)
+            return BackendResponse(response.status, body)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            outcome = False
+            raise
+        finally:
+            if outcome is False:
+                self.stats['failures'] += 1
+            self.breaker.record(outcome)
+    
+    async def _hedged(self, primary: asyncio.Task, method: str, url: str, headers: Dict[str, str],
+                      kwargs: Dict[str, Any]) -> BackendResponse:
+        """Race the request against a copy sent after the hedge delay"""
+        tasks: List[asyncio.Task] = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if not done and self.breaker.state == CircuitBreaker.CLOSED:
+                tasks.append(asyncio.create_task(self._send(method, url, headers, kwargs, granted=False)))
+                self.stats['hedges_sent'] += 1
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception() and 200 <= task.result().status < 300:
+                        if task is not primary:
+                            self.stats['hedges_won'] += 1
+                        return task.result()
+            
+            # Neither succeeded: the first request speaks for the job
+            for task in tasks:
+                if not task.exception():
+                    return task.result()
+            return primary.result()  # Raises the primary's error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Client statistics, including the breaker's"""
+        hedges = self.stats['hedges_sent']
+        return {
+            **self.stats,
+            'hedge_win_rate': self.stats['hedges_won'] / hedges if hedges else 0.0,
+            'hedge_delay_seconds': self.hedge_delay,
+            'breaker': self.breaker.get_stats()
+        }
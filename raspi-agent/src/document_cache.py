@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Document Cache for Raspberry Pi Print Agent
+Persistent, content-addressed store for downloaded print files
+"""
+
+import os
+import json
+import logging
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+class DocumentCache:
+    """
+    Content-addressed on-disk cache with an LRU byte budget
+    
+    Documents are stored under their SHA-256 and can be found again through
+    aliases (a backend checksum, or the object path of the S3 URL whose
+    ETag is then revalidated). Inserts and evictions are atomic renames and
+    unlinks, so a crash never leaves a half-written document in the cache.
+    Documents currently being printed are pinned and never evicted.
+    """
+    
+    INDEX_FILE = 'index.json'
+    
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Initialize the cache and load existing entries from disk
+        
+        Args:
+            cache_dir: Directory holding the cache
+            max_bytes: Byte budget; least recently used documents are evicted beyond it
+        """
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.tmp_dir = os.path.join(cache_dir, 'tmp')
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()  # sha256 -> size, LRU first
+        self._aliases: Dict[str, str] = {}  # alias key -> sha256
+        self._etags: Dict[str, str] = {}  # sha256 -> ETag reported by storage
+        self._pins: Dict[str, int] = {}
+        self.bytes_used = 0
+        
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'bytes_saved': 0,
+            'evictions': 0
+        }
+        
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._load()
+    
+    def _load(self) -> None:
+        """Rebuild the LRU order from file mtimes and restore aliases"""
+        # Leftovers from interrupted downloads are never valid entries
+        for name in os.listdir(self.tmp_dir):
+            try:
+                os.unlink(os.path.join(self.tmp_dir, name))
+            except OSError:
+                pass
+        
+        objects = []
+        for name in os.listdir(self.objects_dir):
+            path = os.path.join(self.objects_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            objects.append((stat.st_mtime, name, stat.st_size))
+        
+        for _, sha256, size in sorted(objects):
+            self._entries[sha256] = size
+            self.bytes_used += size
+        
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE)) as f:
+                index = json.load(f)
+            self._aliases = {
+                key: sha256 for key, sha256 in index.get('aliases', {}).items()
+                if sha256 in self._entries
+            }
+            self._etags = {
+                sha256: etag for sha256, etag in index.get('etags', {}).items()
+                if sha256 in self._entries
+            }
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable cache index: {e}")
+        
+        self.logger.info(f"Document cache: {len(self._entries)} entries, {self.bytes_used} bytes")
+        if self._evict():
+            self._save_index()
+    
+    def _save_index(self) -> None:
+        """Atomically persist aliases and ETags"""
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'aliases': self._aliases, 'etags': self._etags}, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            self.logger.error(f"Failed to write cache index: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    def path_for(self, sha256: str) -> str:
+        """Location of a cached document"""
+        return os.path.join(self.objects_dir, sha256)
+    
+    def owns(self, path: str) -> bool:
+        """True if path points into the cache (and must not be deleted by callers)"""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.objects_dir)
+    
+    def resolve(self, key: str) -> Optional[str]:
+        """Map an alias key to a cached document's SHA-256"""
+        sha256 = self._aliases.get(key)
+        if sha256 and sha256 in self._entries:
+            return sha256
+        return None
+    
+    def contains(self, sha256: str) -> bool:
+        """True if the document is in the cache"""
+        return sha256 in self._entries
+    
+    def etag_for(self, sha256: str) -> Optional[str]:
+        """ETag the document had when it was downloaded"""
+        return self._etags.get(sha256)
+    
+    def new_temp_path(self) -> str:
+        """Reserve a temporary path on the cache filesystem for a download"""
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, prefix='download_', suffix='.part')
+        os.close(fd)
+        return path
+    
+    def hit(self, sha256: str) -> str:
+        """
+        Record a cache hit, mark the document most recently used and pin it
+        
+        Returns:
+            Path of the cached document
+        """
+        size = self._entries[sha256]
+        self._entries.move_to_end(sha256)
+        self.stats['hits'] += 1
+        self.stats['bytes_saved'] += size
+        
+        path = self.path_for(sha256)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.pin(sha256)
+        return path
+    
+    def insert(self, temp_path: str, sha256: str, aliases: List[str], etag: Optional[str] = None) -> str:
+        """
+        Move a fully downloaded file into the cache and pin it
+        
+        Args:
+            temp_path: Downloaded file (from new_temp_path)
+            sha256: Hex digest of the file's contents
+            aliases: Alias keys that should resolve to this document
+            etag: ETag reported by storage, used for revalidation
+        
+        Returns:
+            Path of the cached document
+        """
+        self.stats['misses'] += 1
+        path = self.path_for(sha256)
+        
+        if sha256 in self._entries:
+            # Same content under a new alias; keep the existing copy
+            os.unlink(temp_path)
+            self._entries.move_to_end(sha256)
+        else:
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+            self._entries[sha256] = size
+            self.bytes_used += size
+        
+        for key in aliases:
+            self._aliases[key] = sha256
+        if etag:
+            self._etags[sha256] = etag
+        
+        self.pin(sha256)
+        self._evict()
+        self._save_index()
+        return path
+    
+    def pin(self, sha256: str) -> None:
+        """Protect a document from eviction while it is in use"""
+        self._pins[sha256] = self._pins.get(sha256, 0) + 1
+    
+    def release(self, path: str) -> None:
+        """Unpin a document returned by hit() or insert()"""
+        sha256 = os.path.basename(path)
+        count = self._pins.get(sha256, 0) - 1
+        if count > 0:
+            self._pins[sha256] = count
+        else:
+            self._pins.pop(sha256, None)
+        if self._evict():
+            self._save_index()
+    
+    def _evict(self) -> bool:
+        """
+        Drop least recently used, unpinned documents until within budget
+        
+        Returns:
+            bool: True if anything was evicted (the index needs saving)
+        """
+        if self.bytes_used <= self.max_bytes:
+            return False
+        
+        evicted = False
+        for sha256 in list(self._entries):
+            if self.bytes_used <= self.max_bytes:
+                break
+            if sha256 in self._pins:
+                continue
+            
+            size = self._entries.pop(sha256)
+            self.bytes_used -= size
+            self.stats['evictions'] += 1
+            evicted = True
+            try:
+                os.unlink(self.path_for(sha256))
+            except OSError as e:
+                self.logger.warning(f"Failed to evict cached document {sha256}: {e}")
+            
+            self._etags.pop(sha256, None)
+            self._aliases = {key: value for key, value in self._aliases.items() if value != sha256}
+            self.logger.debug(f"Evicted cached document {sha256} ({size} bytes)")
+        
+        return evicted
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_ratio': self.stats['hits'] / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes_used': self.bytes_used,
+            'max_bytes': self.max_bytes
+        }
\ No newline at end of file
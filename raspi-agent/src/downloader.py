@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Ranged Downloader for Raspberry Pi Print Agent
+Parallel, resumable HTTP downloads of large print files
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import logging
+import aiohttp
+from dataclasses import dataclass
+from typing import Dict, Optional, List, Tuple
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification"""
+
+@dataclass
+class _Cursor:
+    """Next byte offset to write"""
+    offset: int
+
+@dataclass
+class DownloadResult:
+    """Outcome of a download"""
+    status: int
+    size: int = 0
+    sha256: Optional[str] = None
+    etag: Optional[str] = None
+
+class RangedDownloader:
+    """
+    Downloads files with concurrent HTTP Range requests
+    
+    The first request asks for the first chunk only. If the server answers
+    206 the total size is known, the destination file is preallocated and
+    the remaining chunks are fetched in parallel, each written at its own
+    offset. A chunk that fails mid-way is resumed from the last byte written
+    rather than restarted. Servers that ignore Range get a plain sequential
+    download. Size and SHA-256 are verified once all bytes are on disk.
+    """
+    
+    READ_SIZE = 256 * 1024
+    
+    def __init__(self, session: aiohttp.ClientSession, chunk_size: int = 8 * 1024 * 1024,
+                 max_connections: int = 4, max_retries: int = 3,
+                 base_retry_delay: float = 1.0, read_timeout: float = 30.0,
+                 connect_timeout: float = 10.0):
+        """
+        Initialize the downloader
+        
+        Args:
+            session: HTTP session used for all requests
+            chunk_size: Bytes per range request
+            max_connections: Concurrent range requests per download
+            max_retries: Attempts per chunk before the download fails
+            base_retry_delay: Base delay for exponential backoff (seconds)
+            read_timeout: Maximum silence on a socket before a chunk is retried (seconds)
+            connect_timeout: Maximum time to establish a connection (seconds)
+        """
+        self.session = session
+        self.chunk_size = chunk_size
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.base_retry_delay = base_retry_delay
+        # No total timeout: large files may legitimately take minutes
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.logger = logging.getLogger(__name__)
+        
+        self.stats = {
+            'downloads': 0,
+            'bytes_downloaded': 0,
+            'ranged_downloads': 0,
+            'chunk_retries': 0
+        }
+    
+    async def download(self, url: str, dest_path: str, headers: Optional[Dict[str, str]] = None,
+                       expected_size: Optional[int] = None,
+                       expected_sha256: Optional[str] = None) -> DownloadResult:
+        """
+        Download url into dest_path
+        
+        Args:
+            url: File URL
+            dest_path: Destination file (created or truncated)
+            headers: Extra headers for the first request, e.g. If-None-Match
+            expected_size: Size announced by the backend, if known
+            expected_sha256: SHA-256 announced by the backend, if known
+        
+        Returns:
+            DownloadResult; for statuses other than 200 nothing is written
+        
+        Raises:
+            DownloadError: If the transfer fails or verification does not match
+        """
+        loop = asyncio.get_running_loop()
+        request_headers = {**(headers or {}), 'Range': f'bytes=0-{self.chunk_size - 1}'}
+        
+        fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            async with self.session.get(url, headers=request_headers, timeout=self.timeout) as response:
+                etag = response.headers.get('ETag')
+                
+                if response.status == 200:
+                    # Range ignored: the whole body is coming
+                    size, sha256 = await self._read_sequential(response, fd, url, etag)
+                elif response.status == 206:
+                    size, sha256 = await self._read_ranged(response, fd, url, etag)
+                else:
+                    return DownloadResult(status=response.status, etag=etag)
+        finally:
+            await loop.run_in_executor(None, os.close, fd)
+        
+        if expected_size is not None and size != expected_size:
+            raise DownloadError(f"Size mismatch: expected {expected_size} bytes, got {size}")
+        if sha256 is None:
+            sha256 = await loop.run_in_executor(None, self._hash_file, dest_path)
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            raise DownloadError(f"Checksum mismatch: expected {expected_sha256}, got {sha256}")
+        
+        self.stats['downloads'] += 1
+        return DownloadResult(status=200, size=size, sha256=sha256, etag=etag)
+    
+    async def _read_sequential(self, response: aiohttp.ClientResponse, fd: int,
+                               url: str, etag: Optional[str]) -> Tuple[int, Optional[str]]:
+        """Stream a full 200 response, resuming with Range if the connection drops"""
+        digest = hashlib.sha256()
+        cursor = _Cursor(0)
+        content_length = response.content_length
+        
+        try:
+            await self._write_body(response, fd, cursor, digest)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if content_length is None or response.headers.get('Accept-Ranges') != 'bytes':
+                raise DownloadError(f"Download failed at {cursor.offset} bytes: {e}")
+            self.logger.warning(f"Download interrupted at {cursor.offset} ({e}), resuming")
+        
+        if content_length is None or cursor.offset >= content_length:
+            return cursor.offset, digest.hexdigest()
+        
+        # Connection ended early; continue in order so the digest stays valid
+        await self._fetch_range(url, fd, cursor.offset, content_length - 1, etag, digest)
+        return content_length, digest.hexdigest()
+    
+    async def _read_ranged(self, response: aiohttp.ClientResponse, fd: int,
+                           url: str, etag: Optional[str]) -> Tuple[int, Optional[str]]:
+        """Finish a download whose first chunk arrived as a 206 response"""
+        loop = asyncio.get_running_loop()
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        if not match:
+            raise DownloadError(f"Unparseable Content-Range: {response.headers.get('Content-Range')}")
+        first_end, total = int(match.group(2)), int(match.group(3))
+        
+        await loop.run_in_executor(None, self._preallocate, fd, total)
+        
+        cursor = _Cursor(0)
+        try:
+            await self._write_body(response, fd, cursor, limit=first_end + 1)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"First chunk interrupted at {cursor.offset} ({e}), resuming")
+        if cursor.offset <= first_end:
+            await self._fetch_range(url, fd, cursor.offset, first_end, etag)
+        
+        ranges: List[Tuple[int, int]] = [
+            (start, min(start + self.chunk_size, total) - 1)
+            for start in range(first_end + 1, total, self.chunk_size)
+        ]
+        if ranges:
+            self.stats['ranged_downloads'] += 1
+            semaphore = asyncio.Semaphore(self.max_connections)
+            
+            async def fetch(start: int, end: int):
+                async with semaphore:
+                    await self._fetch_range(url, fd, start, end, etag)
+            
+            await asyncio.gather(*(fetch(start, end) for start, end in ranges))
+        
+        # Parallel chunks arrive out of order, so hash once everything is on disk
+        return total, None
+    
+    async def _fetch_range(self, url: str, fd: int, start: int, end: int,
+                           etag: Optional[str], digest=None) -> None:
+        """Fetch bytes start..end (inclusive), resuming after transient errors"""
+        cursor = _Cursor(start)
+        attempt = 0
+        
+        while cursor.offset <= end:
+            headers = {'Range': f'bytes={cursor.offset}-{end}'}
+            if etag:
+                # Never stitch together bytes from two versions of the object
+                headers['If-Match'] = etag
+            
+            try:
+                async with self.session.get(url, headers=headers, timeout=self.timeout) as response:
+                    if response.status != 206:
+                        raise DownloadError(f"Range request failed: HTTP {response.status}")
+                    await self._write_body(response, fd, cursor, digest, limit=end + 1)
+                    if cursor.offset <= end:
+                        raise aiohttp.ClientPayloadError(f"Range ended early at {cursor.offset}")
+            
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                attempt += 1
+                self.stats['chunk_retries'] += 1
+                if attempt >= self.max_retries:
+                    raise DownloadError(f"Range {start}-{end} failed after {attempt} attempts: {e}")
+                
+                delay = self.base_retry_delay * (2 ** (attempt - 1))
+                self.logger.warning(f"Range {start}-{end} interrupted at {cursor.offset} ({e}), resuming in {delay}s")
+                await asyncio.sleep(delay)
+    
+    async def _write_body(self, response: aiohttp.ClientResponse, fd: int, cursor: _Cursor,
+                          digest=None, limit: Optional[int] = None) -> None:
+        """
+        Write a response body at cursor.offset, advancing the cursor
+        
+        The cursor is updated after every write, so if the connection fails
+        the caller knows exactly which bytes are already on disk.
+        """
+        loop = asyncio.get_running_loop()
+        async for data in response.content.iter_chunked(self.READ_SIZE):
+            if limit is not None:
+                data = data[:max(limit - cursor.offset, 0)]
+            if not data:
+                break
+            await loop.run_in_executor(None, os.pwrite, fd, data, cursor.offset)
+            if digest is not None:
+                digest.update(data)
+            cursor.offset += len(data)
+            self.stats['bytes_downloaded'] += len(data)
+    
+    @staticmethod
+    def _preallocate(fd: int, size: int) -> None:
+        """Reserve space for the whole file up front"""
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+    
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """SHA-256 of a file on disk"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
\ No newline at end of file
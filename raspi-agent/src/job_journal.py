@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Job Journal for Raspberry Pi Print Agent
+Write-ahead record of print job progress so restarts can resume in-flight jobs
+"""
+
+import json
+import time
+import logging
+import sqlite3
+from typing import Dict, Any, Optional, List
+
+class JobJournal:
+    """
+    SQLite journal of unfinished print jobs
+    
+    Every stage transition is committed before the agent acts on it, so
+    after a crash each job can be resumed from the last stage it reached:
+    job details are never fetched twice (the backend treats a fetch as
+    consuming the UPID), downloaded files are reused, and jobs already
+    handed to CUPS are reattached by their CUPS job ID instead of being
+    printed again. A job's row is deleted once its report is in the outbox.
+    """
+    
+    ACCEPTED = 'accepted'
+    FETCHED = 'fetched'
+    DOWNLOADED = 'downloaded'
+    SUBMITTED = 'submitted'
+    COMPLETED = 'completed'
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            upid TEXT PRIMARY KEY,
+            stage TEXT NOT NULL,
+            job_data TEXT,
+            file_path TEXT,
+            streamed INTEGER,
+            cups_job_id INTEGER,
+            pages_printed INTEGER,
+            page_offset INTEGER,
+            page_ranges TEXT,
+            accepted_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the journal
+        
+        Args:
+            path: SQLite database file (':memory:' for a non-durable journal)
+        """
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # Commits run on the event loop, so no fsync per transition. With WAL a
+        # crash or restart of the agent still loses nothing; only a power cut or
+        # kernel crash can roll back the last transitions, and a job rolled back
+        # from 'submitted' is then printed again.
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(self.SCHEMA)
+        columns = {row['name'] for row in self._db.execute('PRAGMA table_info(jobs)')}
+        # Journals written before jobs could be batched or split
+        for column, column_type in (('page_offset', 'INTEGER'), ('page_ranges', 'TEXT')):
+            if column not in columns:
+                self._db.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        self._db.commit()
+        
+        self.stats = {
+            'transitions': 0,
+            'jobs_resumed': 0
+        }
+    
+    def record(self, upid: str, stage: str, job_data: Optional[Dict[str, Any]] = None,
+               file_path: Optional[str] = None, streamed: Optional[bool] = None,
+               cups_job_id: Optional[int] = None, pages_printed: Optional[int] = None,
+               page_offset: Optional[int] = None,
+               page_ranges: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        Record that a job reached a stage
+        
+        Fields left as None keep the value from earlier stages.
+        """
+        now = time.time()
+        self._db.execute(
+            'INSERT INTO jobs (upid, stage, job_data, file_path, streamed, cups_job_id, pages_printed, '
+            'page_offset, page_ranges, accepted_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (upid) DO UPDATE SET stage = excluded.stage, '
+            'job_data = COALESCE(excluded.job_data, job_data), '
+            'file_path = COALESCE(excluded.file_path, file_path), '
+            'streamed = COALESCE(excluded.streamed, streamed), '
+            'cups_job_id = COALESCE(excluded.cups_job_id, cups_job_id), '
+            'pages_printed = COALESCE(excluded.pages_printed, pages_printed), '
+            'page_offset = COALESCE(excluded.page_offset, page_offset), '
+            'page_ranges = COALESCE(excluded.page_ranges, page_ranges), '
+            'updated_at = excluded.updated_at',
+            (
+                upid, stage,
+                json.dumps(job_data) if job_data is not None else None,
+                file_path, int(streamed) if streamed is not None else None, cups_job_id, pages_printed,
+                page_offset, json.dumps(page_ranges) if page_ranges is not None else None, now, now
+            )
+        )
+        self._db.commit()
+        self.stats['transitions'] += 1
+    
+    def finish(self, upid: str) -> None:
+        """Forget a job whose outcome has been handed to the outbox"""
+        self._db.execute('DELETE FROM jobs WHERE upid = ?', (upid,))
+        self._db.commit()
+    
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Jobs left over from a previous run, oldest first"""
+        rows = self._db.execute('SELECT * FROM jobs ORDER BY accepted_at').fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['job_data'] = json.loads(job['job_data']) if job['job_data'] else None
+            job['streamed'] = bool(job['streamed'])
+            job['page_ranges'] = json.loads(job['page_ranges']) if job['page_ranges'] else None
+            jobs.append(job)
+        return jobs
+    
+    def file_paths(self) -> List[str]:
+        """Downloaded files still referenced by unfinished jobs"""
+        rows = self._db.execute('SELECT file_path FROM jobs WHERE file_path IS NOT NULL').fetchall()
+        return [row['file_path'] for row in rows]
+    
+    def close(self) -> None:
+        """Close the database"""
+        self._db.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Journal statistics"""
+        rows = self._db.execute('SELECT stage, COUNT(*) AS jobs FROM jobs GROUP BY stage').fetchall()
+        return {
+            **self.stats,
+            'unfinished': {row['stage']: row['jobs'] for row in rows}
+        }
\ No newline at end of file
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Event Loop Monitor for Raspberry Pi Print Agent
+Measures event loop lag and reports what was blocking it
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Dict, Any, Optional
+
+from metrics import REGISTRY
+
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'print_agent_event_loop_lag_seconds',
+    'Delay between when the loop heartbeat was due and when it ran',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+class LoopMonitor:
+    """
+    Heartbeat task plus watchdog thread
+    
+    The heartbeat sleeps for a fixed interval on the event loop and records
+    how late it wakes up; that delay is time some other callback held the
+    loop. The watchdog thread checks the heartbeat from outside the loop,
+    so while the loop is still blocked it can capture the loop thread's
+    stack and name the call responsible. Stack dumps are rate-limited so
+    a recurring stall cannot flood the log.
+    """
+    
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, log_interval: float = 60.0):
+        """
+        Initialize the monitor
+        
+        Args:
+            interval: Heartbeat period (seconds)
+            threshold: Lag above which the loop counts as blocked (seconds)
+            log_interval: Minimum time between two logged stack traces (seconds)
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.log_interval = log_interval
+        self.logger = logging.getLogger(__name__)
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        
+        self._last_beat = 0.0
+        self._stall_reported = False
+        self._last_log = 0.0
+        
+        self.stats = {
+            'max_lag_seconds': 0.0,
+            'stalls': 0,
+            'stack_logs_suppressed': 0
+        }
+    
+    def start(self) -> None:
+        """Start the heartbeat on the running loop and the watchdog thread"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        
+        # Written by the watchdog thread, so exposed through a callback
+        REGISTRY.callback(
+            'print_agent_event_loop_stalls',
+            'Times the event loop was blocked for longer than the lag threshold',
+            'counter', lambda: self.stats['stalls']
+        )
+        
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+    
+    async def stop(self) -> None:
+        """Stop monitoring"""
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog:
+            await asyncio.get_running_loop().run_in_executor(None, self._watchdog.join)
+            self._watchdog = None
+    
+    async def _heartbeat(self) -> None:
+        """Record how late each wake-up is"""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            
+            self._last_beat = now
+            self._stall_reported = False
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.stats['max_lag_seconds']:
+                self.stats['max_lag_seconds'] = lag
+            if lag > self.threshold:
+                self.logger.debug(f"Event loop lag {lag * 1000:.0f}ms")
+    
+    def _watch(self) -> None:
+        """Watchdog thread: catch the loop while it is blocked"""
+        check_every = min(self.interval, self.threshold) / 2
+        while not self._stopping.wait(check_every):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for <= self.threshold or self._stall_reported:
+                continue
+            
+            # One report per stall; the heartbeat clears the flag when the loop recovers
+            self._stall_reported = True
+            self.stats['stalls'] += 1
+            self._report_stall(blocked_for)
+    
+    def _report_stall(self, blocked_for: float) -> None:
+        """Log the loop thread's current stack, at most once per log_interval"""
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval:
+            self.stats['stack_logs_suppressed'] += 1
+            return
+        self._last_log = now
+        
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = ''.join(traceback.format_stack(frame)) if frame else '<unavailable>\n'
+        suppressed = self.stats['stack_logs_suppressed']
+        self.logger.warning(
+            f"Event loop blocked for {blocked_for * 1000:.0f}ms+ "
+            f"({suppressed} earlier stall(s) not logged). Blocking call:\n{stack.rstrip()}"
+        )
+        self.stats['stack_logs_suppressed'] = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Monitor statistics"""
+        return dict(self.stats)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Metrics for Raspberry Pi Print Agent
+Minimal Prometheus registry and text exposition format
+"""
+
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Dict, Any, Callable, List, Tuple, Sequence, Union
+
+# Latency buckets (seconds) spanning a fast backend call to a long physical print
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    """Render a sample value the way Prometheus expects"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Render a label set, e.g. {stage="fetch"}"""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+class _Metric(ABC):
+    """Base class for metrics recorded in place"""
+    
+    TYPE = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+    
+    def labels(self, *values: str):
+        """Child metric for one combination of label values"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+    
+    @abstractmethod
+    def _new_child(self):
+        """Create the storage for one label combination"""
+    
+    def _default(self):
+        """The single child of an unlabelled metric"""
+        return self.labels()
+    
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(sample name, rendered labels, value) for every child"""
+
+class _Value:
+    """A single counter or gauge value"""
+    
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0.0
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    
+    TYPE = 'counter'
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment an unlabelled counter"""
+        self._default().inc(amount)
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            (f'{self.name}_total', _format_labels(self.labelnames, key), child.value)
+            for key, child in self._children.items()
+        ]
+
+class _CounterChild(_Value):
+    __slots__ = ()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    
+    TYPE = 'gauge'
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def set(self, value: float) -> None:
+        """Set an unlabelled gauge"""
+        self._default().set(value)
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self.name, _format_labels(self.labelnames, key), child.value)
+            for key, child in self._children.items()
+        ]
+
+class _GaugeChild(_Value):
+    __slots__ = ()
+    
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    
+    TYPE = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float) -> None:
+        """Record an observation on an unlabelled histogram"""
+        self._default().observe(value)
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                samples.append((f'{self.name}_bucket', labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f'{self.name}_sum', labels, child.sum))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum')
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+    
+    def observe(self, value: float) -> None:
+        # Non-cumulative counts: one list increment per observation
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class CallbackMetric:
+    """
+    Counter or gauge whose value is read from existing state at scrape time
+    
+    The callback returns either a number or a dict mapping label value
+    tuples to numbers, so counters the agent already keeps cost nothing
+    extra on the hot path.
+    """
+    
+    def __init__(self, name: str, documentation: str, metric_type: str,
+                 callback: Callable[[], Union[float, Dict[LabelValues, float]]],
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.TYPE = metric_type
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+    
+    def samples(self) -> List[Tuple[str, str, float]]:
+        sample_name = f'{self.name}_total' if self.TYPE == 'counter' else self.name
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [(sample_name, '', float(value))]
+        return [
+            (sample_name, _format_labels(self.labelnames, key), float(child))
+            for key, child in value.items()
+        ]
+
+class Registry:
+    """
+    Collection of metrics rendered for /metrics
+    
+    Metrics are plain attribute updates with no locking. That is safe
+    because everything is recorded from the asyncio event loop thread;
+    values owned by other threads are exposed through callbacks instead.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+    
+    def register(self, metric):
+        """Add a metric, replacing any earlier one with the same name"""
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter"""
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge"""
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Create and register a histogram"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def callback(self, name: str, documentation: str, metric_type: str,
+                 callback: Callable[[], Union[float, Dict[LabelValues, float]]],
+                 labelnames: Sequence[str] = ()) -> CallbackMetric:
+        """Register a metric read from a callback at scrape time"""
+        return self.register(CallbackMetric(name, documentation, metric_type, callback, labelnames))
+    
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing callback must not take the whole scrape down
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.TYPE}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
\ No newline at end of file
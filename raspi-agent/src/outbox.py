@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Report Outbox for Raspberry Pi Print Agent
+Durable, batched delivery of completion and error reports to the backend
+"""
+
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
+
+class ReportOutbox:
+    """
+    Append-only SQLite outbox drained by a background flusher
+    
+    Job workers only insert a row (a WAL append, well under a millisecond)
+    and move on. The flusher sends due reports in batches, deletes the ones
+    the backend accepted and reschedules the rest with exponential backoff.
+    When a whole batch fails the backend is considered down and the flusher
+    waits before trying again, so reports pile up locally during an outage
+    and go out together when it ends. Rows survive restarts, so nothing is
+    lost when the agent is stopped with reports still pending.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            upid TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            UNIQUE (kind, upid)
+        )
+    """
+    
+    def __init__(self, path: str, send: Callable[[str, Dict[str, Any]], Awaitable[int]],
+                 batch_size: int = 20, flush_interval: float = 1.0,
+                 base_retry_delay: float = 2.0, max_retry_delay: float = 300.0):
+        """
+        Initialize the outbox
+        
+        Args:
+            path: SQLite database file (':memory:' for a non-durable outbox)
+            send: Coroutine delivering one report, returning the HTTP status
+            batch_size: Reports sent concurrently per flush
+            flush_interval: Idle time between flushes (seconds)
+            base_retry_delay: Base delay for exponential backoff (seconds)
+            max_retry_delay: Cap on the backoff delay (seconds)
+        """
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_retry_delay = base_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.logger = logging.getLogger(__name__)
+        
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(self.SCHEMA)
+        self._db.commit()
+        
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._outage_failures = 0
+        
+        self.stats = {
+            'enqueued': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'retries': 0,
+            'duplicates': 0
+        }
+        
+        pending = self.pending()
+        if pending:
+            # Backoff from the previous run does not carry over
+            self._db.execute('UPDATE reports SET next_attempt_at = ?', (time.time(),))
+            self._db.commit()
+            self.logger.info(f"Replaying {pending} undelivered report(s) from {path}")
+    
+    def enqueue(self, kind: str, upid: str, payload: Dict[str, Any]) -> bool:
+        """
+        Persist a report for delivery
+        
+        A second report of the same kind for the same UPID is ignored, so a
+        retried job never double-counts its pages.
+        
+        Returns:
+            bool: True if the report was added, False if it was a duplicate
+        """
+        now = time.time()
+        cursor = self._db.execute(
+            'INSERT OR IGNORE INTO reports (kind, upid, payload, created_at, next_attempt_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (kind, upid, json.dumps(payload), now, now)
+        )
+        self._db.commit()
+        
+        if cursor.rowcount == 0:
+            self.stats['duplicates'] += 1
+            self.logger.debug(f"Duplicate {kind} report for {upid} ignored")
+            return False
+        
+        self.stats['enqueued'] += 1
+        self._wakeup.set()
+        return True
+    
+    def pending(self) -> int:
+        """Number of reports not yet delivered"""
+        return self._db.execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+    
+    def start(self):
+        """Start the background flusher"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self, drain_timeout: float = 5.0):
+        """
+        Stop the flusher, making a last attempt to deliver pending reports
+        
+        Anything still undelivered stays in the database for the next start.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        if self.pending():
+            try:
+                await asyncio.wait_for(self.flush(ignore_schedule=True), drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        
+        pending = self.pending()
+        if pending:
+            self.logger.warning(f"{pending} report(s) left in outbox for next start")
+        self._db.close()
+    
+    async def _run(self):
+        """Flush whenever reports arrive or become due"""
+        while True:
+            try:
+                delivered = await self.flush()
+            except Exception as e:
+                self.logger.error(f"Outbox flush failed: {e}")
+                delivered = 0
+            
+            if self._outage_failures:
+                # Backend unreachable: let reports accumulate instead of hammering it
+                delay = min(self.base_retry_delay * (2 ** (self._outage_failures - 1)), self.max_retry_delay)
+            elif delivered >= self.batch_size:
+                continue  # More may be waiting
+            else:
+                delay = self.flush_interval
+            
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def flush(self, ignore_schedule: bool = False) -> int:
+        """
+        Send one batch of due reports
+        
+        Args:
+            ignore_schedule: Send pending reports even if their retry time has not come
+        
+        Returns:
+            int: Number of reports delivered
+        """
+        now = time.time()
+        rows: List[Tuple[int, str, str, str, int]] = self._db.execute(
+            'SELECT id, kind, upid, payload, attempts FROM reports '
+            'WHERE next_attempt_at <= ? ORDER BY id LIMIT ?',
+            (float('inf') if ignore_schedule else now, self.batch_size)
+        ).fetchall()
+        if not rows:
+            return 0
+        
+        results = await asyncio.gather(
+            *(self.send(kind, json.loads(payload)) for _, kind, _, payload, _ in rows),
+            return_exceptions=True
+        )
+        
+        delivered = failed = 0
+        for (row_id, kind, upid, _, attempts), result in zip(rows, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"Error delivering {kind} report for {upid}: {result}")
+                self._reschedule(row_id, attempts, now)
+                failed += 1
+            elif result in (200, 201):
+                self._db.execute('DELETE FROM reports WHERE id = ?', (row_id,))
+                self.stats['delivered'] += 1
+                delivered += 1
+            elif 400 <= result < 500 and result not in (408, 429):
+                # The backend will never accept this report; retrying cannot help
+                self.logger.error(f"Backend rejected {kind} report for {upid} with HTTP {result}, dropping")
+                self._db.execute('DELETE FROM reports WHERE id = ?', (row_id,))
+                self.stats['dropped'] += 1
+            else:
+                self.logger.warning(f"Backend error {result} for {kind} report for {upid}")
+                self._reschedule(row_id, attempts, now)
+                failed += 1
+        self._db.commit()
+        
+        if delivered:
+            self.logger.info(f"Delivered {delivered} report(s), {self.pending()} pending")
+        if failed and not delivered:
+            self._outage_failures += 1
+        else:
+            self._outage_failures = 0
+        return delivered
+    
+    def _reschedule(self, row_id: int, attempts: int, now: float):
+        """Schedule the next delivery attempt for a report"""
+        delay = min(self.base_retry_delay * (2 ** attempts), self.max_retry_delay)
+        self._db.execute(
+            'UPDATE reports SET attempts = ?, next_attempt_at = ? WHERE id = ?',
+            (attempts + 1, now + delay, row_id)
+        )
+        self.stats['retries'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Outbox statistics"""
+        oldest = self._db.execute('SELECT MIN(created_at) FROM reports').fetchone()[0]
+        return {
+            **self.stats,
+            'pending': self.pending(),
+            'oldest_pending_seconds': time.time() - oldest if oldest else 0.0
+        }
\ No newline at end of file
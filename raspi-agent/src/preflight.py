@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+PDF Preflight for Raspberry Pi Print Agent
+Checks documents in worker processes before they reach CUPS
+"""
+
+import re
+import time
+import asyncio
+import functools
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Tuple, List
+
+try:
+    from pypdf import PdfReader
+    from pypdf.errors import DependencyError
+except ImportError:  # Fall back to a structural scan of the raw file
+    PdfReader = None
+    DependencyError = None
+
+PAGE_RE = re.compile(rb'/Type\s*/Page\b')
+MEDIABOX_RE = re.compile(rb'/MediaBox\s*\[\s*([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s*\]')
+MEDIA_SIZE_RE = re.compile(r'_(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)(mm|in)$')
+
+POINTS_PER_MM = 72 / 25.4
+PAPER_SIZES_MM = {
+    'a3': (297.0, 420.0),
+    'a4': (210.0, 297.0),
+    'a5': (148.0, 210.0),
+    'letter': (215.9, 279.4),
+    'legal': (215.9, 355.6)
+}
+
+@dataclass
+class PreflightResult:
+    """Outcome of checking one document"""
+    ok: bool
+    pages: int = 0  # 0 if the page count could not be determined
+    encrypted: bool = False
+    mismatched_sizes: List[str] = field(default_factory=list)  # Pages that are not the requested paper size
+    error: str = ''
+    method: str = 'basic'  # pypdf or basic
+    seconds: float = 0.0
+
+def paper_dimensions(paper_size: str) -> Optional[Tuple[float, float]]:
+    """
+    Size of a paper name in points, portrait
+    
+    Accepts the names used in PrintOptions (A4, Letter, ...) and PWG media
+    names such as iso_a4_210x297mm or na_letter_8.5x11in.
+    """
+    name = paper_size.lower()
+    if name in PAPER_SIZES_MM:
+        width, height = PAPER_SIZES_MM[name]
+        return width * POINTS_PER_MM, height * POINTS_PER_MM
+    
+    match = MEDIA_SIZE_RE.search(name)
+    if not match:
+        return None
+    scale = POINTS_PER_MM if match.group(3) == 'mm' else 72.0
+    return float(match.group(1)) * scale, float(match.group(2)) * scale
+
+def _fits(width: float, height: float, paper: Tuple[float, float], tolerance: float) -> bool:
+    """True if a page is the paper size, in either orientation"""
+    short, long = sorted((abs(width), abs(height)))
+    return abs(short - paper[0]) <= tolerance and abs(long - paper[1]) <= tolerance
+
+def _check_with_pypdf(file_path: str, paper: Optional[Tuple[float, float]], tolerance: float) -> PreflightResult:
+    """Parse the document with pypdf"""
+    reader = PdfReader(file_path, strict=False)
+    encrypted = reader.is_encrypted
+    if encrypted and not reader.decrypt(''):
+        return PreflightResult(False, encrypted=True, method='pypdf',
+                               error="Document is password protected and cannot be printed")
+    
+    pages = len(reader.pages)
+    if not pages:
+        return PreflightResult(False, encrypted=encrypted, method='pypdf', error="Document has no pages")
+    
+    mismatched = []
+    for number, page in enumerate(reader.pages, 1):
+        box = page.mediabox
+        width, height = float(box.width), float(box.height)
+        if width <= 0 or height <= 0:
+            return PreflightResult(False, pages, encrypted, method='pypdf',
+                                   error=f"Page {number} has an invalid size ({width:.0f}x{height:.0f}pt)")
+        if paper and not _fits(width, height, paper, tolerance):
+            mismatched.append(f"page {number}: {width:.0f}x{height:.0f}pt")
+    return PreflightResult(True, pages, encrypted, mismatched, method='pypdf')
+
+def _check_basic(file_path: str, paper: Optional[Tuple[float, float]], tolerance: float) -> PreflightResult:
+    """
+    Scan the raw file when pypdf is not installed
+    
+    Catches truncated uploads. Page objects and media boxes
+    inside compressed object streams are invisible to the scan, so the page
+    count may come out as 0 (unknown).
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    
+    if b'%%EOF' not in data[-2048:]:
+        return PreflightResult(False, error="PDF document is truncated (no %%EOF marker)")
+    
+    mismatched = []
+    for box in MEDIABOX_RE.findall(data):
+        x0, y0, x1, y1 = (float(value) for value in box)
+        if paper and not _fits(x1 - x0, y1 - y0, paper, tolerance):
+            mismatched.append(f"{abs(x1 - x0):.0f}x{abs(y1 - y0):.0f}pt")
+    return PreflightResult(True, len(PAGE_RE.findall(data)), b'/Encrypt' in data, sorted(set(mismatched)))
+
+def preflight_pdf(file_path: str, paper_size: str, tolerance_mm: float = 5.0) -> PreflightResult:
+    """
+    Check a PDF before it is printed (runs in a worker process)
+    
+    Args:
+        file_path: Document to check
+        paper_size: Paper the job asks for
+        tolerance_mm: Difference from the paper size still counted as a match
+    
+    Returns:
+        PreflightResult: ok=False with a precise error for documents that cannot print
+    """
+    started_at = time.monotonic()
+    paper = paper_dimensions(paper_size)
+    tolerance = tolerance_mm * POINTS_PER_MM
+    logging.getLogger('pypdf').setLevel(logging.ERROR)  # Repairs of minor damage are not news
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(1024)
+        if not head:
+            result = PreflightResult(False, error="Document is empty")
+        elif b'%PDF-' not in head:
+            result = PreflightResult(False, error="Not a PDF document (no %PDF header)")
+        elif PdfReader is not None:
+            try:
+                result = _check_with_pypdf(file_path, paper, tolerance)
+            except DependencyError:
+                # Encrypted with AES but the cryptography package is missing
+                result = _check_basic(file_path, paper, tolerance)
+        else:
+            result = _check_basic(file_path, paper, tolerance)
+    except Exception as e:
+        result = PreflightResult(False, error=f"Malformed PDF: {e}", method='pypdf' if PdfReader else 'basic')
+    result.seconds = time.monotonic() - started_at
+    return result
+
+class Preflight:
+    """
+    Runs preflight_pdf in a process pool
+    
+    Parsing a PDF is CPU-bound and can be slow for hostile or broken
+    files, so it happens in worker processes where it neither blocks the
+    event loop nor holds the GIL. A check that exceeds the timeout rejects
+    the document and the pool is recycled to reclaim the stuck worker.
+    Results are memoized by document hash and paper size, so a document
+    printed again skips the check.
+    """
+    
+    def __init__(self, workers: int = 2, timeout: float = 30.0, strict_paper: bool = False,
+                 tolerance_mm: float = 5.0, cache_size: int = 256):
+        """
+        Initialize the preflight pool (worker processes start on first use)
+        
+        Args:
+            workers: Worker processes
+            timeout: Seconds before a check gives up and rejects the document
+            strict_paper: Reject documents whose pages are not the requested paper size
+            tolerance_mm: Difference from the paper size still counted as a match
+            cache_size: Results kept for documents with a known hash
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.strict_paper = strict_paper
+        self.tolerance_mm = tolerance_mm
+        self.cache_size = cache_size
+        self.logger = logging.getLogger(__name__)
+        
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._results: 'OrderedDict[Tuple[str, str], PreflightResult]' = OrderedDict()
+        
+        self.stats = {
+            'checked': 0,
+            'rejected': 0,
+            'cache_hits': 0,
+            'encrypted': 0,
+            'paper_mismatches': 0,
+            'timeouts': 0,
+            'worker_crashes': 0,
+            'seconds_total': 0.0
+        }
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use"""
+        if self._executor is None:
+            # Forked from a clean server process, not from the threaded agent
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver')
+            )
+        return self._executor
+    
+    def _recycle(self) -> None:
+        """Replace the pool, killing workers that are stuck on a document"""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        for process in list(getattr(executor, '_processes', {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def check(self, file_path: str, paper_size: str, cache_key: Optional[str] = None) -> PreflightResult:
+        """
+        Check a document
+        
+        Args:
+            file_path: Document to check
+            paper_size: Paper the job asks for
+            cache_key: Content hash of the document, if known
+        
+        Returns:
+            PreflightResult: ok=False if the document should not be printed
+        """
+        key = (cache_key, paper_size.lower()) if cache_key else None
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return self._results[key]
+        
+        loop = asyncio.get_running_loop()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._pool(), preflight_pdf, file_path, paper_size, self.tolerance_mm),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            self._recycle()
+            result = PreflightResult(False, error=f"Document could not be parsed within {self.timeout:.0f}s", seconds=self.timeout)
+        except BrokenProcessPool as e:
+            # Most likely memory exhaustion; not proof the document is bad
+            self.stats['worker_crashes'] += 1
+            self.logger.warning(f"Preflight worker crashed on {file_path}, skipping the check: {e}")
+            self._recycle()
+            return PreflightResult(True)
+        
+        if result.ok and result.mismatched_sizes:
+            self.stats['paper_mismatches'] += 1
+            sizes = ', '.join(result.mismatched_sizes[:3])
+            if self.strict_paper:
+                result.ok = False
+                result.error = f"Document does not match paper size {paper_size} ({sizes})"
+            else:
+                self.logger.warning(f"Document {file_path} does not match paper size {paper_size} ({sizes})")
+        
+        self.stats['checked'] += 1
+        self.stats['seconds_total'] += result.seconds
+        if result.encrypted:
+            self.stats['encrypted'] += 1
+        if not result.ok:
+            self.stats['rejected'] += 1
+        
+        if key:
+            self._results[key] = result
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return result
+    
+    async def close(self) -> None:
+        """Shut down the worker processes"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(executor.shutdown, wait=True, cancel_futures=True)
+            )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Preflight statistics"""
+        checked = self.stats['checked']
+        return {
+            **self.stats,
+            'method': 'pypdf' if PdfReader is not None else 'basic',
+            'avg_seconds': self.stats['seconds_total'] / checked if checked else 0.0
+        }
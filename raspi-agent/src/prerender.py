@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Document Pre-renderer for Raspberry Pi Print Agent
+Converts queued PDFs to the printer's native format ahead of printing
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, Optional, List
+
+from print_manager import PrintOptions
+from document_cache import DocumentCache
+
+TOOLS = ('cupsfilter', 'gs')
+
+class Prerenderer:
+    """
+    Runs the PDF-to-printer-language conversion before a job is submitted
+    
+    CUPS only starts converting a document once it has been submitted, and
+    on a Pi the filter chain is often slower than the printer. Rendering
+    queued documents while earlier jobs print moves that work off the
+    critical path; the output is then submitted raw. Renders run as
+    separate processes (one per core by default) at low priority and are
+    cached by document hash, printer and options, so a reprint costs
+    nothing.
+    
+    cupsfilter runs the queue's own filter chain from its PPD and produces
+    exactly what CUPS would send to the printer. gs renders with a fixed
+    Ghostscript device for queues without a PPD.
+    """
+    
+    def __init__(self, cache: DocumentCache, tool: str = 'cupsfilter', workers: int = 0,
+                 gs_device: str = 'pxlmono', resolution: int = 600, timeout: float = 300.0,
+                 ppd_dir: str = '/etc/cups/ppd'):
+        """
+        Initialize the pre-renderer
+        
+        Args:
+            cache: Store for rendered output (separate from the document cache)
+            tool: cupsfilter or gs
+            workers: Concurrent renders (0 for one per CPU core)
+            gs_device: Ghostscript output device (tool=gs)
+            resolution: Output resolution in dpi (tool=gs)
+            timeout: Seconds before a render is abandoned
+            ppd_dir: Directory holding the CUPS queue PPDs (tool=cupsfilter)
+        """
+        if tool not in TOOLS:
+            raise ValueError(f"Unknown pre-render tool '{tool}', expected one of {TOOLS}")
+        self.cache = cache
+        self.tool = tool
+        self.workers = workers or os.cpu_count() or 1
+        self.gs_device = gs_device
+        self.resolution = resolution
+        self.timeout = timeout
+        self.ppd_dir = ppd_dir
+        self.logger = logging.getLogger(__name__)
+        
+        self._slots = asyncio.Semaphore(self.workers)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._nice = shutil.which('nice')
+        
+        self.stats = {
+            'renders': 0,
+            'cache_hits': 0,
+            'failures': 0,
+            'render_seconds_total': 0.0,
+            'bytes_in': 0,
+            'bytes_out': 0
+        }
+    
+    @staticmethod
+    def available(tool: str) -> bool:
+        """True if the render tool is installed"""
+        return shutil.which(tool) is not None
+    
+    def command(self, source: str, printer_name: str, print_options: PrintOptions) -> Optional[List[str]]:
+        """
+        Command line rendering a document for a printer, writing to stdout
+        
+        Returns:
+            List of arguments, or None if this printer cannot be pre-rendered
+        """
+        if self.tool == 'cupsfilter':
+            ppd = os.path.join(self.ppd_dir, f'{printer_name}.ppd')
+            if not os.path.exists(ppd):
+                return None
+            command = ['cupsfilter', '-p', ppd, '-e']
+            for name, value in print_options.to_cups_options().items():
+                command += ['-o', f'{name}={value}']
+            return command + [source]
+        
+        command = [
+            'gs', '-q', '-dBATCH', '-dNOPAUSE', '-dSAFER',
+            f'-sDEVICE={self.gs_device}', f'-r{self.resolution}',
+            f'-sPAPERSIZE={print_options.paper_size.lower()}', '-dFIXEDMEDIA', '-dPDFFitPage'
+        ]
+        if print_options.duplex:
+            command.append('-dDuplex')
+        if print_options.copies > 1:
+            command.append(f'-dNumCopies={print_options.copies}')
+        return command + ['-sOutputFile=-', source]
+    
+    def _key(self, document_sha256: str, printer_name: str, print_options: PrintOptions) -> str:
+        """Cache key of one rendering"""
+        options = sorted(print_options.to_cups_options().items())
+        settings = (self.tool, self.gs_device, self.resolution) if self.tool == 'gs' else (self.tool,)
+        text = f"{document_sha256}|{printer_name}|{options}|{settings}"
+        return hashlib.sha256(text.encode()).hexdigest()
+    
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """SHA-256 of a file's contents"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    async def render(self, file_path: str, printer_name: str, print_options: PrintOptions,
+                     document_sha256: Optional[str] = None) -> Optional[str]:
+        """
+        Render a document for a printer, or fetch an earlier rendering
+        
+        Args:
+            file_path: PDF to render
+            printer_name: CUPS queue the output is for
+            print_options: Options to bake into the output
+            document_sha256: Hash of the document, if already known
+        
+        Returns:
+            Path of the rendered output (pinned until release()) or None if
+            the document cannot be pre-rendered and should print as PDF
+        """
+        if document_sha256 is None:
+            loop = asyncio.get_running_loop()
+            document_sha256 = await loop.run_in_executor(None, self._hash_file, file_path)
+        key = self._key(document_sha256, printer_name, print_options)
+        
+        # One render per key; concurrent requests for it wait and share the result
+        while key in self._inflight:
+            await asyncio.shield(self._inflight[key])
+        if self.cache.contains(key):
+            self.stats['cache_hits'] += 1
+            return self.cache.hit(key)
+        
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            return await self._render(key, file_path, printer_name, print_options)
+        finally:
+            self._inflight.pop(key).set_result(None)
+    
+    async def _render(self, key: str, file_path: str, printer_name: str,
+                      print_options: PrintOptions) -> Optional[str]:
+        """Run the render tool into the cache"""
+        command = self.command(file_path, printer_name, print_options)
+        if command is None:
+            return None
+        if self._nice:
+            command = [self._nice, '-n', '10'] + command
+        
+        async with self._slots:
+            started_at = time.monotonic()
+            temp_path = self.cache.new_temp_path()
+            try:
+                with open(temp_path, 'wb') as output:
+                    process = await asyncio.create_subprocess_exec(
+                        *command, stdout=output, stderr=asyncio.subprocess.PIPE
+                    )
+                    try:
+                        _, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+                    except (asyncio.TimeoutError, asyncio.CancelledError):
+                        process.kill()
+                        await process.wait()
+                        raise
+                if process.returncode != 0 or not os.path.getsize(temp_path):
+                    message = stderr.decode(errors='replace').strip().splitlines()[-1:] or ['no output']
+                    raise RuntimeError(f"{self.tool} exited with status {process.returncode}: {message[0]}")
+            except asyncio.CancelledError:
+                os.unlink(temp_path)
+                raise
+            except Exception as e:
+                os.unlink(temp_path)
+                self.stats['failures'] += 1
+                self.logger.warning(f"Pre-rendering {file_path} for {printer_name} failed, printing the PDF: {e!r}")
+                return None
+            
+            elapsed = time.monotonic() - started_at
+            self.stats['renders'] += 1
+            self.stats['render_seconds_total'] += elapsed
+            self.stats['bytes_in'] += os.path.getsize(file_path)
+            self.stats['bytes_out'] += os.path.getsize(temp_path)
+            path = self.cache.insert(temp_path, key, [])
+            self.logger.info(f"Pre-rendered {file_path} for {printer_name} in {elapsed:.1f}s "
+                             f"({os.path.getsize(path)} bytes)")
+            return path
+    
+    def release(self, path: str) -> None:
+        """Unpin a rendering returned by render()"""
+        self.cache.release(path)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Pre-render statistics"""
+        renders = self.stats['renders']
+        return {
+            **self.stats,
+            'tool': self.tool,
+            'workers': self.workers,
+            'in_progress': len(self._inflight),
+            'avg_render_seconds': self.stats['render_seconds_total'] / renders if renders else 0.0,
+            'cache': self.cache.get_stats()
+        }
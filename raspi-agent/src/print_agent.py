@@ -10,16 +10,59 @@ import asyncio
 import aiohttp
 import logging
 import json
+import sqlite3
+import math
+import re
 import time
+import glob
+import itertools
 import tempfile
 import websockets
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+from dataclasses import dataclass, asdict, astuple, field, replace
 from pathlib import Path
-from urllib.parse import urljoin
+from urllib.parse import urlparse
 
-from print_manager import PrintManager, PrintOptions, PrintJobStatus
+from print_manager import AsyncPrintManager, PrintOptions, PrintJobStatus
+from metrics import REGISTRY, CONTENT_TYPE
+from document_cache import DocumentCache
+from downloader import RangedDownloader
+from outbox import ReportOutbox
+from job_journal import JobJournal
+from loop_monitor import LoopMonitor
+from virtual_printer import VirtualPrinter, VirtualPrintManager
+from printer_pool import PrinterPool
+from scheduler import DEFAULT_PPM, ScheduledQueue, estimate_print_seconds, estimated_waits
+from preflight import Preflight
+from prerender import Prerenderer
+from slimmer import PdfSlimmer
+from transport import Transport, HttpClient
+from backend_client import BackendClient, BackendUnavailable, CircuitBreaker
+
+SHA256_RE = re.compile(r'^[0-9a-fA-F]{64}$')
+FINAL_JOB_STATES = (PrintJobStatus.CANCELLED.value, PrintJobStatus.ABORTED.value, PrintJobStatus.COMPLETED.value)
+
+# Pipeline stages (fetch, download, print) plus the CUPS submit/printing and report phases
+STAGE_SECONDS = REGISTRY.histogram(
+    'print_agent_stage_duration_seconds',
+    'Time a job spends in each pipeline stage and phase',
+    ['stage']
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'print_agent_queue_wait_seconds',
+    'Time from admission until a fetch worker picks the job up'
+)
+TIME_TO_FIRST_PAGE_SECONDS = REGISTRY.histogram(
+    'print_agent_time_to_first_page_seconds',
+    'Time from admission until CUPS starts printing the job'
+)
+BATCH_DOCUMENTS = REGISTRY.histogram(
+    'print_agent_batch_documents',
+    'Jobs combined into each multi-document CUPS job',
+    buckets=(2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
 
 # Configuration from environment variables
 @dataclass
@@ -27,7 +70,7 @@ class Config:
     """Application configuration from environment variables"""
     backend_url: str
     raspi_api_key: str
-    printer_name: str
+    printer_name: str  # Comma-separated list for a pool of printers
     poll_interval_seconds: float = 5.0
     http_port: int = 8080
     file_retention_seconds: int = 3600  # 1 hour
@@ -35,6 +78,79 @@ class Config:
     base_retry_delay: float = 2.0  # Base delay for exponential backoff
     websocket_reconnect_interval: float = 30.0
     log_level: str = "INFO"
+    cups_workers: int = 2  # Threads (and CUPS connections) used for pycups calls
+    cups_notifications: bool = True  # Use IPP subscriptions instead of polling for job completion
+    notification_interval: float = 0.5
+    max_concurrent_jobs: int = 2  # Jobs submitted to CUPS at the same time, per printer
+    max_queue_depth: int = 50  # Requests beyond this are rejected with 429
+    fetch_workers: int = 2  # Concurrent backend metadata fetches
+    download_workers: int = 2  # Concurrent file downloads
+    prefetch_depth: int = 2  # Jobs buffered between pipeline stages
+    scheduler_policy: str = "aged-sjf"  # fifo, sjf or aged-sjf: order of fetched jobs
+    scheduler_aging: float = 1.0  # aged-sjf: seconds of priority a job gains per second waited
+    batch_jobs: bool = False  # Combine small jobs with identical options into one CUPS job
+    batch_window_seconds: float = 0.5  # How long a small job waits for others to join it
+    batch_max_jobs: int = 10
+    batch_max_pages: int = 5  # Larger jobs always print on their own
+    split_threshold_pages: int = 0  # Longer documents print as page-range sub-jobs; 0 never splits
+    split_range_pages: int = 50  # Pages per sub-job
+    split_ahead: int = 1  # Sub-jobs spooling in CUPS behind the one printing
+    preflight: bool = True  # Check PDFs in worker processes before they reach CUPS
+    preflight_workers: int = 2
+    preflight_timeout_seconds: float = 30.0
+    preflight_strict_paper: bool = False  # Reject documents whose pages are not the requested paper size
+    slim_documents: bool = False  # Downsample/desaturate images to what the print quality and colour mode can use
+    slim_workers: int = 2
+    slim_min_kb: int = 256  # Smaller documents are sent as they are
+    slim_min_savings: float = 0.1  # Fraction of the size slimming must save for the result to be used
+    slim_timeout_seconds: float = 120.0
+    slim_ingest_mb_per_second: float = 1.0  # Printer data intake, for estimating the time saved
+    prerender: bool = False  # Convert queued PDFs to the printer's language while earlier jobs print
+    prerender_tool: str = "cupsfilter"  # cupsfilter (queue PPD) or gs
+    prerender_workers: int = 0  # Concurrent renders; 0 for one per CPU core
+    prerender_gs_device: str = "pxlmono"  # Ghostscript device (prerender_tool=gs)
+    prerender_resolution: int = 600
+    prerender_cache_mb: int = 512  # Budget for rendered output, kept apart from the document cache
+    prerender_timeout_seconds: float = 300.0
+    cache_dir: str = "/var/cache/raspi-print-agent"
+    cache_max_mb: int = 1024  # Document cache budget; 0 disables the cache
+    stream_documents: bool = False  # Stream cache misses straight into CUPS instead of a local file
+    download_chunk_mb: int = 8  # Size of each HTTP Range request for large files
+    download_connections: int = 4  # Parallel range requests per download
+    download_read_timeout: float = 30.0  # Stalled socket time before a chunk is resumed
+    backend_connect_timeout: float = 5.0  # DNS, TCP and TLS setup of a backend connection
+    backend_read_timeout: float = 30.0  # Silence allowed while a backend response is read
+    backend_request_timeout: float = 60.0  # Cap on a whole backend API call
+    backend_connections_per_host: int = 4
+    backend_breaker_failures: int = 5  # Consecutive failures that stop backend calls
+    backend_breaker_reset_seconds: float = 10.0  # First pause before trial calls; doubles while they fail
+    backend_breaker_max_reset_seconds: float = 120.0
+    backend_breaker_trials: int = 3  # Successful trial calls that resume normal traffic
+    backend_hedge: bool = True  # Resend idempotent backend GETs slower than the recent p95
+    backend_hedge_delay: float = 1.0  # Hedge delay until enough latencies have been measured
+    storage_connect_timeout: float = 10.0
+    storage_connections_per_host: int = 8  # Shared by the range requests of all downloads
+    http_keepalive_seconds: float = 60.0  # Idle time before a pooled connection is closed
+    http_dns_cache_seconds: int = 300
+    http_warm_interval_seconds: float = 30.0  # Re-open connections after this long without traffic; 0 disables
+    idempotency_ttl_seconds: int = 900  # How long a finished UPID's outcome is replayed to retries
+    state_dir: str = "/var/lib/raspi-print-agent"  # Durable agent state (report outbox, job journal)
+    outbox_batch_size: int = 20  # Reports delivered concurrently per flush
+    loop_monitor: bool = True  # Measure event loop lag and log what blocks it
+    loop_lag_threshold_ms: int = 100  # Lag above which the blocking stack is captured
+    printer_backend: str = "cups"  # 'cups', or 'virtual' for the capacity planning simulator
+    printer_cache_ttl: float = 30.0  # Seconds printer state/capabilities are served from memory
+    virtual_printer_ppm: float = 30.0
+    virtual_printer_speedup: float = 1.0  # Simulated seconds per wall clock second
+    virtual_printer_warmup_seconds: float = 15.0
+    virtual_printer_jam_rate: float = 0.0  # Probability that a sheet jams
+    virtual_printer_paper_capacity: int = 0  # Sheets per tray fill; 0 never runs out
+    virtual_printer_job_overhead_seconds: float = 0.0  # Per-job processing before the first page
+    
+    @property
+    def printer_names(self) -> List[str]:
+        """Printers of the pool, in order of preference"""
+        return [name.strip() for name in self.printer_name.split(',') if name.strip()]
     
     @classmethod
     def from_env(cls) -> 'Config':
@@ -55,19 +171,250 @@ class Config:
             max_retry_attempts=int(os.getenv('MAX_RETRY_ATTEMPTS', '3')),
             base_retry_delay=float(os.getenv('BASE_RETRY_DELAY', '2.0')),
             websocket_reconnect_interval=float(os.getenv('WEBSOCKET_RECONNECT_INTERVAL', '30.0')),
-            log_level=os.getenv('LOG_LEVEL', 'INFO').upper()
+            log_level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+            cups_workers=int(os.getenv('CUPS_WORKERS', '2')),
+            cups_notifications=os.getenv('CUPS_NOTIFICATIONS', 'true').lower() in ('1', 'true', 'yes'),
+            notification_interval=float(os.getenv('NOTIFICATION_INTERVAL_SECONDS', '0.5')),
+            max_concurrent_jobs=int(os.getenv('MAX_CONCURRENT_JOBS', '2')),
+            max_queue_depth=int(os.getenv('MAX_QUEUE_DEPTH', '50')),
+            fetch_workers=int(os.getenv('FETCH_WORKERS', '2')),
+            download_workers=int(os.getenv('DOWNLOAD_WORKERS', '2')),
+            prefetch_depth=int(os.getenv('PREFETCH_DEPTH', '2')),
+            scheduler_policy=os.getenv('SCHEDULER_POLICY', 'aged-sjf').lower(),
+            scheduler_aging=float(os.getenv('SCHEDULER_AGING', '1.0')),
+            batch_jobs=os.getenv('BATCH_JOBS', 'false').lower() in ('1', 'true', 'yes'),
+            batch_window_seconds=float(os.getenv('BATCH_WINDOW_SECONDS', '0.5')),
+            batch_max_jobs=int(os.getenv('BATCH_MAX_JOBS', '10')),
+            batch_max_pages=int(os.getenv('BATCH_MAX_PAGES', '5')),
+            split_threshold_pages=int(os.getenv('SPLIT_THRESHOLD_PAGES', '0')),
+            split_range_pages=int(os.getenv('SPLIT_RANGE_PAGES', '50')),
+            split_ahead=int(os.getenv('SPLIT_AHEAD', '1')),
+            preflight=os.getenv('PREFLIGHT', 'true').lower() in ('1', 'true', 'yes'),
+            preflight_workers=int(os.getenv('PREFLIGHT_WORKERS', '2')),
+            preflight_timeout_seconds=float(os.getenv('PREFLIGHT_TIMEOUT_SECONDS', '30')),
+            preflight_strict_paper=os.getenv('PREFLIGHT_STRICT_PAPER', 'false').lower() in ('1', 'true', 'yes'),
+            slim_documents=os.getenv('SLIM_DOCUMENTS', 'false').lower() in ('1', 'true', 'yes'),
+            slim_workers=int(os.getenv('SLIM_WORKERS', '2')),
+            slim_min_kb=int(os.getenv('SLIM_MIN_KB', '256')),
+            slim_min_savings=float(os.getenv('SLIM_MIN_SAVINGS', '0.1')),
+            slim_timeout_seconds=float(os.getenv('SLIM_TIMEOUT_SECONDS', '120')),
+            slim_ingest_mb_per_second=float(os.getenv('SLIM_INGEST_MB_PER_SECOND', '1.0')),
+            prerender=os.getenv('PRERENDER', 'false').lower() in ('1', 'true', 'yes'),
+            prerender_tool=os.getenv('PRERENDER_TOOL', 'cupsfilter').lower(),
+            prerender_workers=int(os.getenv('PRERENDER_WORKERS', '0')),
+            prerender_gs_device=os.getenv('PRERENDER_GS_DEVICE', 'pxlmono'),
+            prerender_resolution=int(os.getenv('PRERENDER_RESOLUTION', '600')),
+            prerender_cache_mb=int(os.getenv('PRERENDER_CACHE_MB', '512')),
+            prerender_timeout_seconds=float(os.getenv('PRERENDER_TIMEOUT_SECONDS', '300')),
+            cache_dir=os.getenv('CACHE_DIR', '/var/cache/raspi-print-agent'),
+            cache_max_mb=int(os.getenv('CACHE_MAX_MB', '1024')),
+            stream_documents=os.getenv('STREAM_DOCUMENTS', 'false').lower() in ('1', 'true', 'yes'),
+            download_chunk_mb=int(os.getenv('DOWNLOAD_CHUNK_MB', '8')),
+            download_connections=int(os.getenv('DOWNLOAD_CONNECTIONS', '4')),
+            download_read_timeout=float(os.getenv('DOWNLOAD_READ_TIMEOUT', '30')),
+            backend_connect_timeout=float(os.getenv('BACKEND_CONNECT_TIMEOUT', '5')),
+            backend_read_timeout=float(os.getenv('BACKEND_READ_TIMEOUT', '30')),
+            backend_request_timeout=float(os.getenv('BACKEND_REQUEST_TIMEOUT', '60')),
+            backend_connections_per_host=int(os.getenv('BACKEND_CONNECTIONS_PER_HOST', '4')),
+            backend_breaker_failures=int(os.getenv('BACKEND_BREAKER_FAILURES', '5')),
+            backend_breaker_reset_seconds=float(os.getenv('BACKEND_BREAKER_RESET_SECONDS', '10')),
+            backend_breaker_max_reset_seconds=float(os.getenv('BACKEND_BREAKER_MAX_RESET_SECONDS', '120')),
+            backend_breaker_trials=int(os.getenv('BACKEND_BREAKER_TRIALS', '3')),
+            backend_hedge=os.getenv('BACKEND_HEDGE', 'true').lower() in ('1', 'true', 'yes'),
+            backend_hedge_delay=float(os.getenv('BACKEND_HEDGE_DELAY', '1.0')),
+            storage_connect_timeout=float(os.getenv('STORAGE_CONNECT_TIMEOUT', '10')),
+            storage_connections_per_host=int(os.getenv('STORAGE_CONNECTIONS_PER_HOST', '8')),
+            http_keepalive_seconds=float(os.getenv('HTTP_KEEPALIVE_SECONDS', '60')),
+            http_dns_cache_seconds=int(os.getenv('HTTP_DNS_CACHE_SECONDS', '300')),
+            http_warm_interval_seconds=float(os.getenv('HTTP_WARM_INTERVAL_SECONDS', '30')),
+            idempotency_ttl_seconds=int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '900')),
+            state_dir=os.getenv('STATE_DIR', '/var/lib/raspi-print-agent'),
+            outbox_batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', '20')),
+            loop_monitor=os.getenv('LOOP_MONITOR', 'true').lower() in ('1', 'true', 'yes'),
+            loop_lag_threshold_ms=int(os.getenv('LOOP_LAG_THRESHOLD_MS', '100')),
+            printer_backend=os.getenv('PRINTER_BACKEND', 'cups').lower(),
+            printer_cache_ttl=float(os.getenv('PRINTER_CACHE_TTL', '30')),
+            virtual_printer_ppm=float(os.getenv('VIRTUAL_PRINTER_PPM', '30')),
+            virtual_printer_speedup=float(os.getenv('VIRTUAL_PRINTER_SPEEDUP', '1.0')),
+            virtual_printer_warmup_seconds=float(os.getenv('VIRTUAL_PRINTER_WARMUP_SECONDS', '15')),
+            virtual_printer_jam_rate=float(os.getenv('VIRTUAL_PRINTER_JAM_RATE', '0.0')),
+            virtual_printer_paper_capacity=int(os.getenv('VIRTUAL_PRINTER_PAPER_CAPACITY', '0')),
+            virtual_printer_job_overhead_seconds=float(os.getenv('VIRTUAL_PRINTER_JOB_OVERHEAD_SECONDS', '0'))
         )
 
+@dataclass
+class PageRange:
+    """One page-range sub-job of a split print job"""
+    first: int
+    last: Optional[int]  # None for the rest of the document
+    cups_job_id: Optional[int] = None
+    printer_name: Optional[str] = None
+    printed: bool = False
+    sheets: int = 0
+    
+    @property
+    def label(self) -> str:
+        """The range as a CUPS page-ranges value"""
+        return f"{self.first}-{self.last or ''}"
+
+@dataclass
+class PrintJobContext:
+    """State of a single print job as it moves through the pipeline"""
+    upid: str
+    enqueued_at: float
+    started_at: float = 0.0
+    job_data: Dict[str, Any] = field(default_factory=dict)
+    job_title: str = ''
+    print_options: Optional[PrintOptions] = None
+    file_path: Optional[str] = None
+    streamed: bool = False  # Document goes straight from storage into CUPS
+    cups_job_id: Optional[int] = None  # Set once submitted (or when resuming a submitted job)
+    estimated_seconds: Optional[float] = None  # Printer time, known once the job is fetched
+    print_started_at: Optional[float] = None
+    page_offset: Optional[int] = None  # Pages of earlier documents when printed as part of a batch
+    page_ranges: Optional[List[PageRange]] = None  # Sub-jobs, once a long document has been split
+    render: Optional[asyncio.Task] = None  # Pre-rendering, resolving to (printer name, rendered path) or None
+    retryable: bool = False  # Failed before the backend handed the job out; a resubmission runs it again
+
+class PipelineStage:
+    """
+    One stage of the print pipeline
+    
+    A fixed pool of workers drains a bounded input queue and hands every job
+    that succeeds to the next stage. Because each queue is bounded, a slow
+    stage pushes back on the stages before it instead of letting jobs (and
+    their temporary files) pile up.
+    """
+    
+    def __init__(self, name: str, handler: Callable[[PrintJobContext], Awaitable[bool]],
+                 workers: int, queue_size: int,
+                 on_exit: Callable[[PrintJobContext, bool, Optional[Exception]], Awaitable[None]],
+                 policy: str = 'fifo', aging: float = 1.0):
+        """
+        Initialize the stage
+        
+        Args:
+            name: Stage name used in logs and statistics
+            handler: Coroutine run for each job, returning True to pass it on
+            workers: Number of jobs handled concurrently
+            queue_size: Capacity of the input queue
+            on_exit: Called when a job leaves the pipeline from this stage
+            policy: Order in which queued jobs are picked up (see ScheduledQueue)
+            aging: Priority aging rate for the aged-sjf policy
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = ScheduledQueue(maxsize=queue_size, policy=policy, aging=aging)
+        self.next_stage: Optional['PipelineStage'] = None
+        self.on_exit = on_exit
+        self.logger = logging.getLogger('print_agent')
+        
+        self.active = 0
+        self.blocked = 0  # Workers waiting for room in the next stage
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self._tasks: List[asyncio.Task] = []
+    
+    def start(self):
+        """Start the stage workers"""
+        self._tasks = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.workers)
+        ]
+    
+    async def stop(self):
+        """Cancel the stage workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def _worker(self, worker_id: int):
+        """Process jobs from the input queue one at a time"""
+        while True:
+            ctx = await self.queue.get()
+            self.active += 1
+            started_at = time.monotonic()
+            
+            try:
+                success = await self.handler(ctx)
+                error = None
+            except Exception as e:
+                self.logger.error(f"{self.name} worker {worker_id} failed on UPID {ctx.upid}: {e}")
+                success, error = False, e
+            finally:
+                elapsed = time.monotonic() - started_at
+                self.busy_seconds += elapsed
+                self.processed += 1
+                STAGE_SECONDS.labels(self.name).observe(elapsed)
+            
+            try:
+                if success and self.next_stage:
+                    self.blocked += 1
+                    try:
+                        await self.next_stage.queue.put(ctx)
+                    finally:
+                        self.blocked -= 1
+                else:
+                    await self.on_exit(ctx, success, error)
+            finally:
+                self.active -= 1
+                self.queue.task_done()
+    
+    def occupancy(self) -> Dict[str, Any]:
+        """Current load of the stage"""
+        return {
+            'workers': self.workers,
+            'active': self.active,
+            'blocked': self.blocked,
+            'queued': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'processed': self.processed,
+            'avg_busy_seconds': self.busy_seconds / self.processed if self.processed else 0.0
+        }
+
 class PrintAgent:
     """Main Raspberry Pi print agent"""
     
-    def __init__(self, config: Config):
-        """Initialize the print agent with configuration"""
+    def __init__(self, config: Config, print_manager: Optional[AsyncPrintManager] = None):
+        """
+        Initialize the print agent with configuration
+        
+        Args:
+            config: Agent configuration
+            print_manager: Pre-built print manager (e.g. a simulator for benchmarks);
+                created from the configuration if omitted
+        """
         self.config = config
         self.logger = self._setup_logging()
-        self.print_manager = None
-        self.session = None
+        self.print_manager: Optional[PrinterPool] = (
+            PrinterPool({config.printer_names[0]: print_manager}) if print_manager else None
+        )
+        self.transport: Optional[Transport] = None
+        self.backend: Optional[BackendClient] = None
+        self.downloader: Optional[RangedDownloader] = None
+        self.document_cache: Optional[DocumentCache] = None
+        self.preflight: Optional[Preflight] = None
+        self.slimmer: Optional[PdfSlimmer] = None
+        self.prerenderer: Optional[Prerenderer] = None
+        self.outbox: Optional[ReportOutbox] = None
+        self.journal: Optional[JobJournal] = None
+        self._resume_task: Optional[asyncio.Task] = None
+        self.loop_monitor: Optional[LoopMonitor] = None
+        self.virtual_printers: Dict[str, VirtualPrinter] = {}
+        self._virtual_job_ids = itertools.count(1)  # Shared like queues on one CUPS server
         self.temp_files: Dict[str, datetime] = {}  # Track temporary files for cleanup
+        self.printing: Dict[str, PrintJobContext] = {}  # Jobs in the print stage, by UPID
+        
+        # Job pipeline: fetch -> download -> print. The fetch stage's input
+        # queue doubles as the bounded admission queue.
+        self.pipeline: List[PipelineStage] = []
+        self.job_queue: Optional[asyncio.Queue] = None
+        
+        # Idempotency: UPIDs in flight and recently finished outcomes (success, finished_at)
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.recent_results: 'OrderedDict[str, Tuple[bool, float]]' = OrderedDict()
         
         # Statistics
         self.stats = {
@@ -75,8 +422,20 @@ class PrintAgent:
             'jobs_successful': 0,
             'jobs_failed': 0,
             'pages_printed': 0,
+            'jobs_rejected': 0,
+            'requests_coalesced': 0,
+            'requests_replayed': 0,
+            'batches': 0,
+            'jobs_batched': 0,
+            'jobs_split': 0,
+            'split_parts_retried': 0,
             'start_time': datetime.now()
         }
+        self.queue_stats = {
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'jobs_dequeued': 0
+        }
     
     def _setup_logging(self) -> logging.Logger:
         """Setup logging configuration"""
@@ -111,30 +470,351 @@ class PrintAgent:
         self.logger.info(f"Config: Backend URL: {self.config.backend_url}")
         self.logger.info(f"Config: Printer: {self.config.printer_name}")
         
-        # Initialize CUPS print manager
+        if self.config.loop_monitor:
+            self.loop_monitor = LoopMonitor(threshold=self.config.loop_lag_threshold_ms / 1000)
+            self.loop_monitor.start()
+        
+        # Initialize CUPS print managers, one per printer of the pool
         try:
-            self.print_manager = PrintManager(
-                self.config.printer_name,
-                poll_interval=2.0
-            )
+            if self.print_manager is None:
+                self.print_manager = PrinterPool({
+                    name: self._create_print_manager(name) for name in self.config.printer_names
+                })
+            await self.print_manager.connect()
+            if self.config.cups_notifications:
+                if await self.print_manager.enable_notifications(self.config.notification_interval):
+                    self.logger.info("Job completion via CUPS notifications enabled")
             self.logger.info("Print manager initialized successfully")
         except Exception as e:
             self.logger.error(f"Failed to initialize print manager: {e}")
             raise
         
-        # Initialize HTTP session
-        timeout = aiohttp.ClientTimeout(total=60)
-        self.session = aiohttp.ClientSession(timeout=timeout)
+        # Initialize document cache
+        if self.config.cache_max_mb > 0:
+            try:
+                self.document_cache = DocumentCache(
+                    self.config.cache_dir,
+                    self.config.cache_max_mb * 1024 * 1024
+                )
+            except OSError as e:
+                self.logger.warning(f"Document cache disabled: {e}")
+        
+        if self.config.preflight:
+            self.preflight = Preflight(
+                workers=self.config.preflight_workers,
+                timeout=self.config.preflight_timeout_seconds,
+                strict_paper=self.config.preflight_strict_paper
+            )
+        
+        if self.config.slim_documents:
+            if PdfSlimmer.available():
+                self.slimmer = PdfSlimmer(
+                    workers=self.config.slim_workers,
+                    min_bytes=self.config.slim_min_kb * 1024,
+                    min_savings=self.config.slim_min_savings,
+                    timeout=self.config.slim_timeout_seconds,
+                    ingest_bytes_per_second=self.config.slim_ingest_mb_per_second * 1024 * 1024
+                )
+            else:
+                self.logger.warning("Document slimming disabled: gs is not installed")
+        
+        if self.config.prerender:
+            self._init_prerenderer()
+        
+        # Initialize HTTP clients: backend API calls and document downloads get separate pools
+        self.transport = Transport(
+            HttpClient(
+                'backend',
+                connect_timeout=self.config.backend_connect_timeout,
+                read_timeout=self.config.backend_read_timeout,
+                total_timeout=self.config.backend_request_timeout,
+                limit_per_host=self.config.backend_connections_per_host,
+                keepalive=self.config.http_keepalive_seconds,
+                dns_ttl=self.config.http_dns_cache_seconds
+            ),
+            HttpClient(
+                'storage',
+                connect_timeout=self.config.storage_connect_timeout,
+                read_timeout=self.config.download_read_timeout,
+                limit_per_host=self.config.storage_connections_per_host,
+                keepalive=self.config.http_keepalive_seconds,
+                dns_ttl=self.config.http_dns_cache_seconds
+            ),
+            warm_interval=self.config.http_warm_interval_seconds
+        )
+        await self.transport.start(self.config.backend_url)
+        self.backend = BackendClient(
+            self.transport.backend.session,
+            self.config.backend_url,
+            self.config.raspi_api_key,
+            breaker=CircuitBreaker(
+                failure_threshold=self.config.backend_breaker_failures,
+                reset_timeout=self.config.backend_breaker_reset_seconds,
+                max_reset_timeout=self.config.backend_breaker_max_reset_seconds,
+                success_threshold=self.config.backend_breaker_trials
+            ),
+            hedge=self.config.backend_hedge,
+            hedge_default_delay=self.config.backend_hedge_delay
+        )
+        self.downloader = RangedDownloader(
+            self.transport.storage.session,
+            chunk_size=self.config.download_chunk_mb * 1024 * 1024,
+            max_connections=self.config.download_connections,
+            max_retries=self.config.max_retry_attempts,
+            base_retry_delay=self.config.base_retry_delay,
+            read_timeout=self.config.download_read_timeout,
+            connect_timeout=self.config.storage_connect_timeout
+        )
+        
+        # Initialize report outbox; reports left over from the last run are replayed
+        outbox_kwargs = dict(
+            batch_size=self.config.outbox_batch_size,
+            base_retry_delay=self.config.base_retry_delay
+        )
+        try:
+            os.makedirs(self.config.state_dir, exist_ok=True)
+            self.outbox = ReportOutbox(
+                os.path.join(self.config.state_dir, 'outbox.db'), self._send_report, **outbox_kwargs
+            )
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"Report outbox is not durable: {e}")
+            self.outbox = ReportOutbox(':memory:', self._send_report, **outbox_kwargs)
+        self.outbox.start()
+        
+        # Initialize job journal
+        try:
+            self.journal = JobJournal(os.path.join(self.config.state_dir, 'journal.db'))
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"Job journal is not durable, jobs will not survive a restart: {e}")
+            self.journal = JobJournal(':memory:')
+        self._remove_orphaned_downloads()
+        
+        # Start the job pipeline. Jobs are admitted in arrival order; once
+        # fetched their size is known, so the later stages pick them up by
+        # scheduling policy. Fetching is cheap, so with a size-based policy the
+        # fetch stage runs ahead and the backlog waits (without its files) in
+        # the download queue, where it can be reordered.
+        policy, aging = self.config.scheduler_policy, self.config.scheduler_aging
+        fetch_stage = PipelineStage(
+            'fetch', self._fetch_stage, self.config.fetch_workers,
+            self.config.max_queue_depth, self._job_exit
+        )
+        download_stage = PipelineStage(
+            'download', self._download_stage, self.config.download_workers,
+            self.config.prefetch_depth if policy == 'fifo' else self.config.max_queue_depth,
+            self._job_exit, policy, aging
+        )
+        print_stage = PipelineStage(
+            'print', self._print_stage, self.config.max_concurrent_jobs * len(self.print_manager.printers),
+            self.config.prefetch_depth, self._job_exit, policy, aging
+        )
+        fetch_stage.next_stage = download_stage
+        download_stage.next_stage = print_stage
+        
+        self.pipeline = [fetch_stage, download_stage, print_stage]
+        self.job_queue = fetch_stage.queue
+        for stage in self.pipeline:
+            stage.start()
+        
+        self._register_metrics()
+        
+        # Pick up jobs interrupted by the last shutdown
+        self._resume_task = asyncio.create_task(self._resume_jobs())
         
         self.logger.info("Print agent initialization complete")
     
     async def cleanup(self):
         """Cleanup resources"""
-        if self.session:
-            await self.session.close()
+        if self._resume_task:
+            self._resume_task.cancel()
+            await asyncio.gather(self._resume_task, return_exceptions=True)
+        
+        # Jobs interrupted here stay in the journal and resume on next start
+        for stage in self.pipeline:
+            await stage.stop()
+        
+        if self.outbox:
+            await self.outbox.stop()
+        
+        if self.transport:
+            await self.transport.close()
+        
+        if self.print_manager:
+            await self.print_manager.close()
+        
+        if self.preflight:
+            await self.preflight.close()
         
         # Clean up temporary files
         await self._cleanup_temp_files(force=True)
+        
+        if self.journal:
+            self.journal.close()
+        
+        if self.loop_monitor:
+            await self.loop_monitor.stop()
+    
+    def submit_job(self, upid: str) -> Tuple[str, Optional[bool]]:
+        """
+        Admit a print job into the bounded job queue, deduplicating by UPID
+        
+        Args:
+            upid: Unique print ID
+        
+        Returns:
+            Tuple of (disposition, cached_success) where disposition is one of
+            'queued' (newly admitted), 'coalesced' (already in flight),
+            'done' (finished within the idempotency TTL; cached_success holds
+            its outcome), 'rejected' (queue full) or 'unavailable' (the
+            backend circuit breaker is open, so the job could not be fetched)
+        """
+        self._expire_recent_results()
+        
+        if upid in self.inflight:
+            self.stats['requests_coalesced'] += 1
+            self.logger.info(f"UPID {upid} already in flight, coalescing request")
+            return 'coalesced', None
+        
+        if upid in self.recent_results:
+            self.stats['requests_replayed'] += 1
+            success, _ = self.recent_results[upid]
+            self.logger.info(f"UPID {upid} finished recently, replaying outcome")
+            return 'done', success
+        
+        if self.backend and self.backend.breaker.state == CircuitBreaker.OPEN:
+            self.stats['jobs_rejected'] += 1
+            self.logger.warning(f"Backend unavailable, rejecting UPID: {upid}")
+            return 'unavailable', None
+        
+        try:
+            self.job_queue.put_nowait(PrintJobContext(upid=upid, enqueued_at=time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats['jobs_rejected'] += 1
+            self.logger.warning(f"Job queue full ({self.job_queue.qsize()}), rejecting UPID: {upid}")
+            return 'rejected', None
+        
+        self.inflight[upid] = asyncio.get_running_loop().create_future()
+        self.journal.record(upid, JobJournal.ACCEPTED)
+        self.logger.info(f"Queued print job for UPID: {upid} (depth {self.job_queue.qsize()})")
+        return 'queued', None
+    
+    def _finish_job(self, upid: str, success: bool, replay: bool = True):
+        """Record a job's outcome (unless it is not to be replayed) and wake anyone waiting on it"""
+        future = self.inflight.pop(upid, None)
+        if future and not future.done():
+            future.set_result(success)
+        
+        if not replay:
+            return
+        self.recent_results[upid] = (success, time.monotonic())
+        self.recent_results.move_to_end(upid)
+    
+    def _expire_recent_results(self):
+        """Drop finished outcomes older than the idempotency TTL"""
+        cutoff = time.monotonic() - self.config.idempotency_ttl_seconds
+        while self.recent_results:
+            upid, (_, finished_at) = next(iter(self.recent_results.items()))
+            if finished_at >= cutoff:
+                break
+            self.recent_results.popitem(last=False)
+    
+    @property
+    def active_jobs(self) -> int:
+        """Jobs admitted and already picked up by the pipeline"""
+        return len(self.inflight) - self.job_queue.qsize()
+    
+    def retry_after_seconds(self) -> int:
+        """Estimate how long a rejected client should wait before retrying"""
+        print_stage = self.pipeline[-1]
+        processed = print_stage.processed
+        avg_service = print_stage.busy_seconds / processed if processed else 30.0
+        backlog = len(self.inflight)
+        return max(1, math.ceil(avg_service * backlog / max(print_stage.workers, 1)))
+    
+    def backend_retry_after_seconds(self) -> int:
+        """How long a client turned away while the backend is unavailable should wait"""
+        return max(1, math.ceil(self.backend.breaker.get_stats()['open_seconds_left']))
+    
+    async def _job_exit(self, ctx: PrintJobContext, success: bool, error: Optional[Exception]):
+        """Finish a job that leaves the pipeline, successfully or not"""
+        try:
+            if error is not None:
+                await self.report_error(ctx.upid, f"Unexpected error: {error}")
+        finally:
+            self._discard_render(ctx)
+            if ctx.file_path:
+                await self._release_file(ctx.file_path)
+            self.journal.finish(ctx.upid)
+            self._finish_job(ctx.upid, success, replay=not ctx.retryable)
+    
+    def _remove_orphaned_downloads(self):
+        """Delete temporary downloads left behind by a previous run that no journaled job needs"""
+        referenced = set(self.journal.file_paths())
+        for file_path in glob.glob(os.path.join(tempfile.gettempdir(), 'print_job_*.pdf')):
+            if file_path in referenced:
+                continue
+            try:
+                os.unlink(file_path)
+                self.logger.info(f"Removed orphaned download: {file_path}")
+            except OSError as e:
+                self.logger.warning(f"Failed to remove orphaned download {file_path}: {e}")
+    
+    async def _resume_jobs(self):
+        """Re-enter journaled jobs into the pipeline at the stage they had reached"""
+        fetch_stage, download_stage, print_stage = self.pipeline
+        
+        # Jobs CUPS is already printing go first; their printer time is already spent
+        jobs = sorted(self.journal.unfinished(), key=lambda job: job['stage'] != JobJournal.SUBMITTED)
+        for job in jobs:
+            upid, stage = job['upid'], job['stage']
+            if upid in self.inflight:
+                continue
+            
+            if stage == JobJournal.COMPLETED:
+                # Printed, but the report may not have reached the outbox
+                await self.report_completion(upid, job['pages_printed'] or 0, job['cups_job_id'])
+                self.journal.finish(upid)
+                continue
+            
+            ctx = PrintJobContext(upid=upid, enqueued_at=time.monotonic(), cups_job_id=job['cups_job_id'],
+                                  page_offset=job['page_offset'])
+            if job['page_ranges']:
+                ctx.page_ranges = [PageRange(**part) for part in job['page_ranges']]
+            if job['job_data']:
+                self._apply_job_data(ctx, job['job_data'])
+            
+            if stage == JobJournal.ACCEPTED or not job['job_data']:
+                target = fetch_stage
+            elif stage == JobJournal.SUBMITTED:
+                # Parts of a split job still to be submitted need the document again
+                unprinted = ctx.page_ranges and not all(part.printed for part in ctx.page_ranges)
+                target = print_stage if not unprinted or self._reuse_download(ctx, job['file_path']) else download_stage
+            elif stage == JobJournal.DOWNLOADED and (job['streamed'] or self._reuse_download(ctx, job['file_path'])):
+                ctx.streamed = job['streamed']
+                target = print_stage
+            else:
+                target = download_stage
+            
+            self.logger.info(f"Resuming print job for UPID {upid} from stage '{stage}' ({target.name})")
+            self.journal.stats['jobs_resumed'] += 1
+            self.inflight[upid] = asyncio.get_running_loop().create_future()
+            await target.queue.put(ctx)
+    
+    def _reuse_download(self, ctx: PrintJobContext, file_path: Optional[str]) -> bool:
+        """Adopt a file downloaded before a restart, if it is still there"""
+        if not file_path or not os.path.exists(file_path):
+            return False
+        
+        if self.document_cache and self.document_cache.owns(file_path):
+            sha256 = os.path.basename(file_path)
+            if not self.document_cache.contains(sha256):
+                return False
+            self.document_cache.pin(sha256)
+        else:
+            self.temp_files[file_path] = datetime.now()
+        
+        ctx.file_path = file_path
+        return True
     
     async def fetch_print_job(self, upid: str) -> Optional[Dict[str, Any]]:
         """
@@ -145,41 +825,71 @@ class PrintAgent:
             
         Returns:
             Print job data or None if not found
+        
+        Raises:
+            BackendUnavailable: If the backend circuit breaker is open; the
+                request was not sent, so the UPID has not been consumed
         """
-        url = urljoin(self.config.backend_url, f'/api/print/fetch')
-        headers = {
-            'X-API-KEY': self.config.raspi_api_key,
-            'Content-Type': 'application/json'
-        }
         params = {'upid': upid}
         
         self.logger.info(f"Fetching print job for UPID: {upid}")
         
         try:
-            async with self.session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    job_data = await response.json()
-                    self.logger.info(f"Fetched print job: {job_data.get('jobNumber', 'N/A')}")
-                    return job_data
-                elif response.status == 404:
-                    self.logger.warning(f"Print job not found for UPID: {upid}")
-                    return None
-                else:
-                    error_text = await response.text()
-                    self.logger.error(f"Backend error {response.status}: {error_text}")
-                    return None
-                    
+            # Never hedged: the fetch consumes the UPID, so a second copy would be told it is gone
+            response = await self.backend.request('GET', '/api/print/fetch', params=params, hedge=False)
+        except BackendUnavailable:
+            raise
         except Exception as e:
-            self.logger.error(f"Error fetching print job: {e}")
+            self.logger.error(f"Error fetching print job: {e!r}")
+            return None
+        
+        if response.status == 200:
+            job_data = response.body
+            self.logger.info(f"Fetched print job: {job_data.get('jobNumber', 'N/A')}")
+            return job_data
+        elif response.status == 404:
+            self.logger.warning(f"Print job not found for UPID: {upid}")
+            return None
+        else:
+            self.logger.error(f"Backend error {response.status}: {response.body}")
             return None
     
-    async def download_file(self, file_url: str, filename: str) -> Optional[str]:
+    async def _download_to(self, file_url: str, dest_path: str,
+                           headers: Optional[Dict[str, str]] = None,
+                           expected_size: Optional[int] = None,
+                           checksum: Optional[str] = None) -> Tuple[int, Optional[str], Optional[str]]:
+        """
+        Download a URL into dest_path with parallel, resumable range requests
+        
+        Args:
+            file_url: Signed S3 URL
+            dest_path: Destination file
+            headers: Extra request headers, e.g. If-None-Match
+            expected_size: File size announced by the backend, if any
+            checksum: Content checksum announced by the backend; verified when it is a SHA-256
+        
+        Returns:
+            Tuple of (http_status, sha256_hex, etag); the digest is None unless status is 200
+        """
+        expected_sha256 = checksum if checksum and SHA256_RE.match(checksum) else None
+        result = await self.downloader.download(
+            file_url, dest_path, headers,
+            expected_size=expected_size,
+            expected_sha256=expected_sha256
+        )
+        return result.status, result.sha256, result.etag
+    
+    async def download_file(self, file_url: str, filename: str,
+                            checksum: Optional[str] = None,
+                            expected_size: Optional[int] = None) -> Optional[str]:
         """
         Download file from S3 URL to temporary location
         
         Args:
             file_url: Signed S3 URL
             filename: Original filename for logging
+            checksum: Content checksum supplied by the backend, if any
+            expected_size: File size supplied by the backend, if any
             
         Returns:
             Path to downloaded file or None if failed
@@ -197,32 +907,122 @@ class PrintAgent:
             temp_file.close()
             
             # Download file
-            async with self.session.get(file_url) as response:
-                if response.status == 200:
-                    with open(temp_path, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            f.write(chunk)
-                    
-                    # Track temporary file
-                    self.temp_files[temp_path] = datetime.now()
-                    
-                    file_size = os.path.getsize(temp_path)
-                    self.logger.info(f"File downloaded successfully: {temp_path} ({file_size} bytes)")
-                    return temp_path
-                else:
-                    self.logger.error(f"Failed to download file: HTTP {response.status}")
-                    os.unlink(temp_path)
-                    return None
-                    
+            status, _, _ = await self._download_to(file_url, temp_path,
+                                                   expected_size=expected_size, checksum=checksum)
+            if status == 200:
+                # Track temporary file
+                self.temp_files[temp_path] = datetime.now()
+                
+                file_size = os.path.getsize(temp_path)
+                self.logger.info(f"File downloaded successfully: {temp_path} ({file_size} bytes)")
+                return temp_path
+            else:
+                self.logger.error(f"Failed to download file: HTTP {status}")
+                os.unlink(temp_path)
+                return None
+        
         except Exception as e:
             self.logger.error(f"Error downloading file: {e}")
             if 'temp_path' in locals() and os.path.exists(temp_path):
                 os.unlink(temp_path)
             return None
     
+    async def fetch_cached_document(self, file_url: str, filename: str,
+                                    checksum: Optional[str] = None,
+                                    expected_size: Optional[int] = None) -> Optional[str]:
+        """
+        Get a document through the local cache, downloading it only on a miss
+        
+        A backend-provided checksum is trusted as a content identifier and
+        skips storage entirely. Otherwise a document seen before under the
+        same object path is revalidated with a conditional GET, so an
+        unchanged file costs a 304 instead of a full download.
+        
+        Args:
+            file_url: Signed S3 URL
+            filename: Original filename for logging
+            checksum: Content checksum supplied by the backend, if any
+            expected_size: File size supplied by the backend, if any
+        
+        Returns:
+            Path to the cached document (pinned until released) or None if failed
+        """
+        cache = self.document_cache
+        parsed = urlparse(file_url)
+        object_key = f"url:{parsed.netloc}{parsed.path}"
+        checksum_key = f"checksum:{checksum.lower()}" if checksum else None
+        
+        # 1. Content already known by checksum
+        if checksum_key:
+            sha256 = cache.resolve(checksum_key)
+            if sha256:
+                self.logger.info(f"Cache hit for {filename} (checksum)")
+                return cache.hit(sha256)
+        
+        # 2. Same storage object seen before: revalidate its ETag
+        headers = None
+        known_sha256 = cache.resolve(object_key)
+        if known_sha256 and cache.etag_for(known_sha256):
+            headers = {'If-None-Match': cache.etag_for(known_sha256)}
+        
+        self.logger.info(f"Downloading file: {filename}")
+        temp_path = cache.new_temp_path()
+        
+        try:
+            status, sha256, etag = await self._download_to(file_url, temp_path, headers,
+                                                           expected_size=expected_size, checksum=checksum)
+            
+            if status == 304 and known_sha256:
+                os.unlink(temp_path)
+                self.logger.info(f"Cache hit for {filename} (ETag revalidated)")
+                return cache.hit(known_sha256)
+            
+            if status != 200:
+                self.logger.error(f"Failed to download file: HTTP {status}")
+                os.unlink(temp_path)
+                return None
+            
+            aliases = [object_key] + ([checksum_key] if checksum_key else [])
+            path = cache.insert(temp_path, sha256, aliases, etag)
+            self.logger.info(f"File downloaded into cache: {path} ({os.path.getsize(path)} bytes)")
+            return path
+        
+        except Exception as e:
+            self.logger.error(f"Error downloading file: {e}")
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return None
+    
+    async def stream_to_printer(self, ctx: PrintJobContext) -> int:
+        """
+        Feed the document from storage directly into a new CUPS job
+        
+        Returns:
+            int: CUPS job ID
+        """
+        file_url = ctx.job_data['fileUrl']
+        self.logger.info(f"Streaming file into CUPS: {ctx.job_data.get('originalName', 'document.pdf')}")
+        
+        async with self.transport.storage.session.get(file_url) as response:
+            if response.status != 200:
+                raise IOError(f"Failed to download file: HTTP {response.status}")
+            return await self.print_manager.print_stream(
+                response.content.iter_chunked(65536),
+                ctx.job_title,
+                ctx.print_options,
+                pages=self._estimated_pages(ctx)
+            )
+    
+    async def _release_file(self, file_path: str):
+        """Unpin a cached document or delete a temporary download"""
+        if self.document_cache and self.document_cache.owns(file_path):
+            self.document_cache.release(file_path)
+        else:
+            await self._cleanup_temp_file(file_path)
+    
     async def process_print_job(self, upid: str) -> bool:
         """
-        Process a complete print job workflow
+        Process a complete print job workflow in one go, outside the pipeline
         
         Args:
             upid: Unique print ID
@@ -230,146 +1030,532 @@ class PrintAgent:
         Returns:
             bool: True if successful, False otherwise
         """
+        ctx = PrintJobContext(upid=upid, enqueued_at=time.monotonic())
+        
+        try:
+            return (
+                await self._fetch_stage(ctx)
+                and await self._download_stage(ctx)
+                and await self._print_stage(ctx)
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Unexpected error processing print job {upid}: {e}")
+            await self.report_error(upid, f"Unexpected error: {e}")
+            return False
+        
+        finally:
+            # Always try to clean up the temporary file
+            self._discard_render(ctx)
+            if ctx.file_path:
+                await self._release_file(ctx.file_path)
+            self.journal.finish(upid)
+    
+    async def _fetch_stage(self, ctx: PrintJobContext) -> bool:
+        """Pipeline stage 1: fetch job details from the backend and parse print options"""
+        upid = ctx.upid
+        ctx.started_at = time.monotonic()
+        wait = ctx.started_at - ctx.enqueued_at
+        self.queue_stats['wait_seconds_total'] += wait
+        self.queue_stats['wait_seconds_max'] = max(self.queue_stats['wait_seconds_max'], wait)
+        self.queue_stats['jobs_dequeued'] += 1
+        QUEUE_WAIT_SECONDS.observe(wait)
+        
         self.logger.info(f"Processing print job for UPID: {upid}")
         self.stats['jobs_processed'] += 1
         
+        # 1. Fetch job details from backend
         try:
-            # 1. Fetch job details from backend
             job_data = await self.fetch_print_job(upid)
-            if not job_data:
-                await self.report_error(upid, "Failed to fetch job details from backend")
-                return False
-            
-            # 2. Extract job information
-            file_url = job_data.get('fileUrl')
-            filename = job_data.get('originalName', 'document.pdf')
-            job_title = job_data.get('jobNumber', f"AutoPrint-{upid}")
-            
-            if not file_url:
-                await self.report_error(upid, "No file URL provided in job data")
-                return False
-            
-            # 3. Parse print options
-            print_options = PrintOptions(
-                copies=job_data.get('copies', 1),
-                duplex=job_data.get('doubleSided', False),
-                paper_size=job_data.get('paperSize', 'A4'),
-                orientation=job_data.get('orientation', 'portrait'),
-                color_mode=job_data.get('colorMode', 'blackwhite'),
-                print_quality=job_data.get('printQuality', 'normal')
+        except BackendUnavailable as e:
+            self.logger.error(f"Not fetching print job for UPID {upid}: {e}")
+            ctx.retryable = True
+            await self.report_error(upid, "Backend unavailable, job details not fetched; submit the job again")
+            return False
+        if not job_data:
+            await self.report_error(upid, "Failed to fetch job details from backend")
+            return False
+        
+        # 2. Extract job information
+        if not job_data.get('fileUrl'):
+            await self.report_error(upid, "No file URL provided in job data")
+            return False
+        
+        # 3. Parse print options
+        self._apply_job_data(ctx, job_data)
+        self.journal.record(upid, JobJournal.FETCHED, job_data=job_data)
+        
+        self.logger.info(f"Print options: {asdict(ctx.print_options)}")
+        return True
+    
+    def _apply_job_data(self, ctx: PrintJobContext, job_data: Dict[str, Any]):
+        """Set a job's title and print options from the backend job details"""
+        ctx.job_data = job_data
+        ctx.job_title = job_data.get('jobNumber', f"AutoPrint-{ctx.upid}")
+        ctx.print_options = PrintOptions(
+            copies=job_data.get('copies', 1),
+            duplex=job_data.get('doubleSided', False),
+            paper_size=job_data.get('paperSize', 'A4'),
+            orientation=job_data.get('orientation', 'portrait'),
+            color_mode=job_data.get('colorMode', 'blackwhite'),
+            print_quality=job_data.get('printQuality', 'normal')
+        )
+        ctx.estimated_seconds = estimate_print_seconds(job_data, self.print_manager.pages_per_minute or DEFAULT_PPM)
+    
+    def _estimated_pages(self, ctx: PrintJobContext) -> int:
+        """Sheets-worth of work a job puts on a printer, from the backend's page count"""
+        pages = ctx.job_data.get('totalPages') or 1
+        return int(pages) * max(ctx.print_options.copies, 1)
+    
+    async def _download_stage(self, ctx: PrintJobContext) -> bool:
+        """Pipeline stage 2: download the file so it is ready before the printer frees up"""
+        file_url = ctx.job_data['fileUrl']
+        filename = ctx.job_data.get('originalName', 'document.pdf')
+        
+        # 4. Download file (or reuse a cached copy)
+        checksum = ctx.job_data.get('fileHash') or ctx.job_data.get('checksum')
+        expected_size = ctx.job_data.get('fileSize')
+        if self.config.stream_documents and not ctx.page_ranges:
+            # Only a checksum hit avoids storage; anything else is streamed at print time
+            # (a split job resumed after a restart prints its remaining parts from a file)
+            sha256 = self.document_cache.resolve(f"checksum:{checksum.lower()}") if self.document_cache and checksum else None
+            if sha256:
+                self.logger.info(f"Cache hit for {filename} (checksum)")
+                ctx.file_path = self.document_cache.hit(sha256)
+                if not await self._preflight(ctx):
+                    return False
+                await self._slim(ctx)
+                self._start_render(ctx)
+            else:
+                ctx.streamed = True
+            self.journal.record(ctx.upid, JobJournal.DOWNLOADED, job_data=ctx.job_data,
+                                file_path=ctx.file_path, streamed=ctx.streamed)
+            return True
+        
+        if self.document_cache:
+            ctx.file_path = await self.fetch_cached_document(file_url, filename, checksum, expected_size)
+        else:
+            ctx.file_path = await self.download_file(file_url, filename, checksum, expected_size)
+        if not ctx.file_path:
+            await self.report_error(ctx.upid, "Failed to download print file")
+            return False
+        if not await self._preflight(ctx):
+            return False
+        await self._slim(ctx)
+        self.journal.record(ctx.upid, JobJournal.DOWNLOADED, job_data=ctx.job_data,
+                            file_path=ctx.file_path, streamed=False)
+        self._start_render(ctx)
+        return True
+    
+    async def _preflight(self, ctx: PrintJobContext) -> bool:
+        """Reject documents that cannot print and take the page count from the document itself"""
+        if not self.preflight:
+            return True
+        
+        owned = self.document_cache and self.document_cache.owns(ctx.file_path)
+        started_at = time.monotonic()
+        result = await self.preflight.check(
+            ctx.file_path, ctx.print_options.paper_size, os.path.basename(ctx.file_path) if owned else None
+        )
+        STAGE_SECONDS.labels('preflight').observe(time.monotonic() - started_at)
+        if not result.ok:
+            self.logger.warning(f"Preflight rejected UPID {ctx.upid}: {result.error}")
+            await self.report_error(ctx.upid, f"Document rejected: {result.error}")
+            return False
+        
+        if result.pages and result.pages != ctx.job_data.get('totalPages'):
+            self.logger.info(f"UPID {ctx.upid} has {result.pages} page(s), backend said {ctx.job_data.get('totalPages')}")
+            ctx.job_data['totalPages'] = result.pages
+            ctx.estimated_seconds = estimate_print_seconds(
+                ctx.job_data, self.print_manager.pages_per_minute or DEFAULT_PPM
             )
+        return True
+    
+    async def _slim(self, ctx: PrintJobContext):
+        """Swap a job's document for a copy without more image data than the job will print"""
+        if not self.slimmer:
+            return
+        started_at = time.monotonic()
+        slimmed = await self.slimmer.slim(ctx.upid, ctx.file_path, ctx.print_options)
+        STAGE_SECONDS.labels('slim').observe(time.monotonic() - started_at)
+        if slimmed:
+            self.temp_files[slimmed] = datetime.now()
+            await self._release_file(ctx.file_path)
+            ctx.file_path = slimmed
+    
+    def _start_render(self, ctx: PrintJobContext):
+        """Begin rendering a downloaded document for the printer it will most likely go to"""
+        if not self.prerenderer or self._batch_key(ctx) is not None or self._split(ctx):
+            return  # Batched and split documents are submitted as PDFs
+        if ctx.print_options.copies != 1 or ctx.print_options.page_ranges:
+            return  # A raw submission carries no job options, so CUPS would print one copy of everything
+        ctx.render = asyncio.create_task(self._prerender(ctx))
+    
+    async def _prerender(self, ctx: PrintJobContext) -> Optional[Tuple[str, str]]:
+        """Render a job's document; returns (printer name, rendered path) or None"""
+        printer = (await self.print_manager.candidates(ctx.print_options, self._estimated_pages(ctx)))[0]
+        owned = self.document_cache and self.document_cache.owns(ctx.file_path)
+        path = await self.prerenderer.render(
+            ctx.file_path, printer.name, ctx.print_options, os.path.basename(ctx.file_path) if owned else None
+        )
+        return (printer.name, path) if path else None
+    
+    async def _rendered(self, ctx: PrintJobContext) -> Optional[Dict[str, str]]:
+        """Wait for a job's pre-rendering; printer name -> rendered path, or None to print the PDF"""
+        if ctx.render is None:
+            return None
+        started_at = time.monotonic()
+        try:
+            result = await ctx.render
+        except Exception as e:
+            self.logger.warning(f"Pre-rendering UPID {ctx.upid} failed, printing the PDF: {e}")
+            return None
+        STAGE_SECONDS.labels('render_wait').observe(time.monotonic() - started_at)
+        return dict([result]) if result else None
+    
+    def _discard_render(self, ctx: PrintJobContext):
+        """Stop an unfinished pre-rendering or unpin the finished output"""
+        render, ctx.render = ctx.render, None
+        if render is None:
+            return
+        if not render.done():
+            render.cancel()
+        elif not render.cancelled() and render.exception() is None and render.result():
+            self.prerenderer.release(render.result()[1])
+    
+    async def _print_stage(self, ctx: PrintJobContext) -> bool:
+        """Pipeline stage 3: submit to CUPS, wait for completion and report the outcome"""
+        batch = [ctx]
+        key = self._batch_key(ctx)
+        if key is not None:
+            print_stage = self.pipeline[2]
+            batch += await print_stage.queue.take(
+                lambda job: self._batch_key(job) == key,
+                self.config.batch_max_jobs - 1, self.config.batch_window_seconds
+            )
+        
+        started_at = time.monotonic()
+        for job in batch:
+            job.print_started_at = started_at
+            self.printing[job.upid] = job
+        try:
+            if len(batch) == 1:
+                return await self._print_job(ctx)
             
-            self.logger.info(f"Print options: {asdict(print_options)}")
-            
-            # 4. Download file
-            temp_file_path = await self.download_file(file_url, filename)
-            if not temp_file_path:
-                await self.report_error(upid, "Failed to download print file")
-                return False
-            
-            # 5. Submit print job to CUPS
+            # The worker exits the job it picked up; the ones it took along exit here
+            outcomes: Dict[str, bool] = {}
+            error: Optional[Exception] = None
             try:
-                job_id = self.print_manager.print_file(temp_file_path, job_title, print_options)
+                outcomes = await self._print_batch(batch)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                for job in batch[1:]:
+                    try:
+                        await self._job_exit(job, outcomes.get(job.upid, False), error)
+                    finally:
+                        print_stage.queue.task_done()
+            return outcomes[ctx.upid]
+        finally:
+            for job in batch:
+                self.printing.pop(job.upid, None)
+    
+    def _batch_key(self, ctx: PrintJobContext) -> Optional[tuple]:
+        """Options a job can share a CUPS job under, or None if it prints on its own"""
+        if (not self.config.batch_jobs or ctx.cups_job_id is not None or ctx.streamed or not ctx.file_path
+                or ctx.print_options.copies != 1  # CUPS would collate copies across documents
+                or self._estimated_pages(ctx) > self.config.batch_max_pages):
+            return None
+        return astuple(ctx.print_options)
+    
+    async def _print_batch(self, batch: List[PrintJobContext]) -> Dict[str, bool]:
+        """
+        Print several small jobs as the documents of one CUPS job
+        
+        The printer warms up and cycles job state once for the whole batch.
+        Each document's page offset is journaled with the shared CUPS job ID,
+        so every UPID is still reported on its own, also after a restart.
+        
+        Returns:
+            Dict of upid -> True if that job printed
+        """
+        submitted_at = time.monotonic()
+        try:
+            job_id = await self.print_manager.print_files(
+                [job.file_path for job in batch],
+                f"{batch[0].job_title} (+{len(batch) - 1} more)",
+                batch[0].print_options,
+                pages=sum(self._estimated_pages(job) for job in batch)
+            )
+            self.logger.info(f"Batch of {len(batch)} jobs submitted to CUPS: Job ID {job_id}")
+        except Exception as e:
+            for job in batch:
+                await self.report_error(job.upid, f"Failed to submit print job: {e}")
+            return {job.upid: False for job in batch}
+        
+        page_offset = 0
+        for job in batch:
+            job.cups_job_id = job_id
+            job.page_offset = page_offset
+            self.journal.record(job.upid, JobJournal.SUBMITTED, cups_job_id=job_id, page_offset=page_offset)
+            page_offset += self._estimated_pages(job)
+        STAGE_SECONDS.labels('submit').observe(time.monotonic() - submitted_at)
+        BATCH_DOCUMENTS.observe(len(batch))
+        self.stats['batches'] += 1
+        self.stats['jobs_batched'] += len(batch)
+        
+        success, job_info = await self._wait_for_print(batch, job_id)
+        return {job.upid: await self._report_print(job, job_id, success, job_info) for job in batch}
+    
+    async def _print_job(self, ctx: PrintJobContext) -> bool:
+        """Submit one job, wait for it and report the outcome"""
+        upid = ctx.upid
+        if ctx.page_ranges is None and ctx.cups_job_id is None:
+            ctx.page_ranges = self._split(ctx)
+        if ctx.page_ranges:
+            return await self._print_split(ctx)
+        
+        # 5. Submit print job to CUPS (unless it was submitted before a restart)
+        submitted_at = time.monotonic()
+        if ctx.cups_job_id is not None:
+            job_id = ctx.cups_job_id
+            self.logger.info(f"Reattaching to CUPS job {job_id} for UPID {upid}")
+        else:
+            try:
+                if ctx.streamed:
+                    job_id = await self.stream_to_printer(ctx)
+                else:
+                    job_id = await self.print_manager.print_file(
+                        ctx.file_path, ctx.job_title, ctx.print_options, pages=self._estimated_pages(ctx),
+                        rendered=await self._rendered(ctx)
+                    )
                 self.logger.info(f"Print job submitted to CUPS: Job ID {job_id}")
             except Exception as e:
                 await self.report_error(upid, f"Failed to submit print job: {e}")
                 return False
+            ctx.cups_job_id = job_id
+            self.journal.record(upid, JobJournal.SUBMITTED, cups_job_id=job_id)
+            STAGE_SECONDS.labels('submit').observe(time.monotonic() - submitted_at)
+        
+        # 6. Monitor print job completion
+        success, job_info = await self._wait_for_print([ctx], job_id)
+        return await self._report_print(ctx, job_id, success, job_info)
+    
+    def _split(self, ctx: PrintJobContext) -> Optional[List[PageRange]]:
+        """Page ranges to print a long document in, or None to print it as one job"""
+        pages = int(ctx.job_data.get('totalPages') or 0)
+        threshold = self.config.split_threshold_pages
+        if (not threshold or pages <= threshold or ctx.streamed or not ctx.file_path
+                or ctx.print_options.copies != 1):  # CUPS would collate copies within each part
+            return None
+        size = self.config.split_range_pages
+        if ctx.print_options.duplex and size % 2:
+            size += 1  # Every part starts on the front of a sheet
+        ranges = [PageRange(first, first + size - 1) for first in range(1, pages + 1, size)]
+        ranges[-1].last = None  # The page count can be off; the last part takes the rest
+        return ranges
+    
+    async def _print_split(self, ctx: PrintJobContext) -> bool:
+        """
+        Print a long document as consecutive page-range sub-jobs of one UPID
+        
+        The first sheet comes out once the first part has been through the
+        filters instead of the whole document, and the next `split_ahead`
+        parts spool behind the one printing. When a part fails, it and the
+        parts queued behind it are cancelled (pages never come out of order)
+        and printing resumes from the failed part; parts already printed are
+        journaled and not repeated, also after a restart.
+        """
+        upid = ctx.upid
+        parts = ctx.page_ranges
+        if not any(part.cups_job_id is not None or part.printed for part in parts):
+            self.logger.info(f"Splitting UPID {upid} into {len(parts)} page-range parts")
+            self.stats['jobs_split'] += 1
+        
+        retries = 0
+        job_id = None
+        while True:
+            pending = [part for part in parts if not part.printed]
+            if not pending:
+                break
+            part = pending[0]
+            for queued in pending[:1 + self.config.split_ahead]:
+                if queued.cups_job_id is not None:
+                    continue
+                try:
+                    await self._submit_part(ctx, queued)
+                except Exception as e:
+                    if queued is part:
+                        await self.report_error(upid, f"Failed to submit pages {part.label} of the print job: {e}")
+                        return False
+                    break  # Submitted again once it is the part printing
             
-            # 6. Monitor print job completion
-            success, job_info = self.print_manager.wait_for_completion(job_id, timeout=600)  # 10 minute timeout
-            
+            # Only the first part's first sheet is the job's first page
+            first_part = not any(done.printed for done in parts)
+            success, job_info = await self._wait_for_print([ctx] if first_part else [], part.cups_job_id)
+            job_id = part.cups_job_id
             if success:
-                pages_printed = job_info.get('job-media-sheets-completed', 0)
-                self.logger.info(f"Print job completed successfully. Pages: {pages_printed}")
-                
-                # 7. Report success to backend
-                await self.report_completion(upid, pages_printed, job_id)
-                
-                # Update statistics
-                self.stats['jobs_successful'] += 1
-                self.stats['pages_printed'] += pages_printed
-                
-                return True
-            else:
-                error_msg = job_info.get('job-state-message', 'Unknown CUPS error')
-                self.logger.error(f"Print job failed: {error_msg}")
-                await self.report_error(upid, f"Print job failed: {error_msg}")
+                part.printed = True
+                part.sheets = job_info.get('job-media-sheets-completed', 0)
+                self.journal.record(upid, JobJournal.SUBMITTED, page_ranges=[asdict(done) for done in parts])
+                retries = 0
+                continue
+            
+            state = job_info.get('job-state')
+            for queued in pending:
+                if queued.cups_job_id is not None and (queued is not part or state not in FINAL_JOB_STATES):
+                    await self.print_manager.cancel_job(queued.cups_job_id)
+                queued.cups_job_id = None
+            self.journal.record(upid, JobJournal.SUBMITTED, page_ranges=[asdict(done) for done in parts])
+            
+            message = job_info.get('job-state-message', 'Unknown CUPS error')
+            retries += 1
+            if state == PrintJobStatus.CANCELLED.value or retries > self.config.max_retry_attempts:
+                printed = sum(done.sheets for done in parts)
+                self.logger.error(f"Print job failed at pages {part.label}: {message}")
+                await self.report_error(upid, f"Print job failed at pages {part.label} "
+                                              f"({printed} sheet(s) printed before): {message}", part.printer_name)
                 return False
+            delay = self.config.base_retry_delay * (2 ** (retries - 1))
+            self.logger.warning(f"Pages {part.label} of UPID {upid} failed ({message}), printing them again in {delay:.0f}s")
+            self.stats['split_parts_retried'] += 1
+            await asyncio.sleep(delay)
+        
+        return await self._report_print(
+            ctx, job_id, True, {'job-media-sheets-completed': sum(part.sheets for part in parts)}
+        )
+    
+    async def _submit_part(self, ctx: PrintJobContext, part: PageRange):
+        """Submit one part of a split job, to the printer the earlier parts went to"""
+        pages = int(ctx.job_data.get('totalPages') or part.first)
+        submitted_at = time.monotonic()
+        part.cups_job_id = await self.print_manager.print_file(
+            ctx.file_path, f"{ctx.job_title} (pages {part.label})",
+            replace(ctx.print_options, page_ranges=part.label),
+            pages=(part.last or pages) - part.first + 1,
+            printer_name=next((done.printer_name for done in ctx.page_ranges if done.printer_name), None)
+        )
+        part.printer_name = self.print_manager.job_printer(part.cups_job_id)
+        self.journal.record(ctx.upid, JobJournal.SUBMITTED, page_ranges=[asdict(done) for done in ctx.page_ranges])
+        STAGE_SECONDS.labels('submit').observe(time.monotonic() - submitted_at)
+        self.logger.info(f"Pages {part.label} of UPID {ctx.upid} submitted to CUPS: Job ID {part.cups_job_id}")
+    
+    async def _wait_for_print(self, jobs: List[PrintJobContext], job_id: int) -> Tuple[bool, Dict[str, Any]]:
+        """Wait for the CUPS job printing `jobs` to finish"""
+        first_page = []
+        
+        def record_first_page(job_id: int, status: PrintJobStatus, job_info: Dict[str, Any]):
+            if not first_page and status in (PrintJobStatus.PROCESSING, PrintJobStatus.COMPLETED):
+                first_page.append(True)
+                for job in jobs:
+                    TIME_TO_FIRST_PAGE_SECONDS.observe(time.monotonic() - job.enqueued_at)
+        
+        printing_since = time.monotonic()
+        success, job_info = await self.print_manager.wait_for_completion(
+            job_id, timeout=600, on_status=record_first_page  # 10 minute timeout
+        )
+        STAGE_SECONDS.labels('printing').observe(time.monotonic() - printing_since)
+        return success, job_info
+    
+    def _document_outcome(self, ctx: PrintJobContext, success: bool,
+                          job_info: Dict[str, Any]) -> Tuple[bool, int, str]:
+        """
+        Outcome of one document of a batched CUPS job
+        
+        A document counts as printed once the job's completed impressions
+        reach its last page, so when a batch fails part-way the documents
+        that came out before the failure are still reported as printed.
+        
+        Returns:
+            Tuple of (printed, sheets, error message)
+        """
+        pages = self._estimated_pages(ctx)
+        completed = job_info.get('job-impressions-completed')
+        if success or (completed is not None and completed >= ctx.page_offset + pages):
+            return True, math.ceil(pages / 2) if ctx.print_options.duplex else pages, ''
+        message = job_info.get('job-state-message', 'Unknown CUPS error')
+        return False, 0, f"{message} (batched with other jobs, document started at page {ctx.page_offset + 1})"
+    
+    async def _report_print(self, ctx: PrintJobContext, job_id: int, success: bool,
+                            job_info: Dict[str, Any]) -> bool:
+        """Journal and report the outcome of a finished CUPS job for one UPID"""
+        upid = ctx.upid
+        if ctx.page_offset is not None:
+            success, pages_printed, error_msg = self._document_outcome(ctx, success, job_info)
+        else:
+            pages_printed = job_info.get('job-media-sheets-completed', 0)
+            error_msg = job_info.get('job-state-message', 'Unknown CUPS error')
+        
+        if success:
+            self.logger.info(f"Print job completed successfully. Pages: {pages_printed}")
             
-        except Exception as e:
-            self.logger.error(f"Unexpected error processing print job {upid}: {e}")
-            await self.report_error(upid, f"Unexpected error: {e}")
+            # 7. Report success to backend
+            self.journal.record(upid, JobJournal.COMPLETED, pages_printed=pages_printed)
+            await self.report_completion(upid, pages_printed, job_id)
+            
+            # Update statistics
+            self.stats['jobs_successful'] += 1
+            self.stats['pages_printed'] += pages_printed
+            
+            return True
+        else:
+            self.logger.error(f"Print job failed: {error_msg}")
+            await self.report_error(upid, f"Print job failed: {error_msg}", self.print_manager.job_printer(job_id))
             return False
-        
-        finally:
-            # Always try to clean up the temporary file
-            if 'temp_file_path' in locals() and temp_file_path:
-                await self._cleanup_temp_file(temp_file_path)
     
     async def report_completion(self, upid: str, pages_printed: int, printer_job_id: int):
-        """Report successful print job completion to backend"""
-        url = urljoin(self.config.backend_url, '/api/print/complete')
-        headers = {
-            'X-API-KEY': self.config.raspi_api_key,
-            'Content-Type': 'application/json'
-        }
+        """Queue a successful print job completion report for the backend"""
         data = {
             'upid': upid,
             'printed_pages': pages_printed,
-            'printer_id': self.config.printer_name,
+            'printer_id': self.print_manager.job_printer(printer_job_id) or self.config.printer_names[0],
             'cups_job_id': printer_job_id,
             'completed_at': datetime.now().isoformat()
         }
         
-        await self._make_backend_request('POST', url, headers, data, f"completion for {upid}")
+        self.outbox.enqueue('complete', upid, data)
     
-    async def report_error(self, upid: str, error_message: str):
-        """Report print job error to backend"""
-        url = urljoin(self.config.backend_url, '/api/print/error')
-        headers = {
-            'X-API-KEY': self.config.raspi_api_key,
-            'Content-Type': 'application/json'
-        }
+    async def report_error(self, upid: str, error_message: str, printer_name: Optional[str] = None):
+        """Queue a print job error report for the backend, naming the printer the job went to if known"""
         data = {
             'upid': upid,
             'error_message': error_message,
-            'printer_id': self.config.printer_name,
+            'printer_id': printer_name or self.config.printer_names[0],
             'timestamp': datetime.now().isoformat()
         }
         
         self.stats['jobs_failed'] += 1
-        await self._make_backend_request('POST', url, headers, data, f"error report for {upid}")
+        self.outbox.enqueue('error', upid, data)
     
-    async def _make_backend_request(self, method: str, url: str, headers: Dict, data: Dict, description: str):
-        """Make a request to the backend with retry logic"""
-        for attempt in range(self.config.max_retry_attempts):
-            try:
-                async with self.session.request(method, url, headers=headers, json=data) as response:
-                    if response.status in [200, 201]:
-                        self.logger.info(f"Successfully reported {description}")
-                        return
-                    else:
-                        error_text = await response.text()
-                        self.logger.error(f"Backend error {response.status} for {description}: {error_text}")
-                        
-            except Exception as e:
-                self.logger.error(f"Error reporting {description} (attempt {attempt + 1}): {e}")
-            
-            # Exponential backoff
-            if attempt < self.config.max_retry_attempts - 1:
-                delay = self.config.base_retry_delay * (2 ** attempt)
-                self.logger.info(f"Retrying {description} in {delay} seconds...")
-                await asyncio.sleep(delay)
+    async def _send_report(self, kind: str, data: Dict[str, Any]) -> int:
+        """
+        Deliver one outbox report to the backend
         
-        self.logger.error(f"Failed to report {description} after {self.config.max_retry_attempts} attempts")
+        Returns:
+            int: HTTP status of the backend response
+        """
+        started_at = time.monotonic()
+        try:
+            response = await self.backend.request('POST', f'/api/print/{kind}', json=data)
+            if response.status not in [200, 201]:
+                self.logger.error(f"Backend error {response.status} for {kind} report for {data['upid']}: {response.body}")
+            return response.status
+        finally:
+            STAGE_SECONDS.labels('report').observe(time.monotonic() - started_at)
     
     async def _cleanup_temp_files(self, force: bool = False):
         """Clean up old temporary files"""
         current_time = datetime.now()
         retention_delta = timedelta(seconds=self.config.file_retention_seconds)
         
+        # Files of journaled jobs are kept so the jobs can resume after a restart
+        referenced = set(self.journal.file_paths()) if self.journal else set()
+        
         files_to_remove = []
         for file_path, created_time in self.temp_files.items():
+            if file_path in referenced:
+                continue
             if force or (current_time - created_time) > retention_delta:
                 files_to_remove.append(file_path)
         
@@ -390,14 +1576,235 @@ class PrintAgent:
         except Exception as e:
             self.logger.error(f"Error cleaning up temporary file {file_path}: {e}")
     
+    def _register_metrics(self):
+        """Expose counters the agent already keeps; they are read only when /metrics is scraped"""
+        REGISTRY.callback(
+            'print_agent_jobs', 'Jobs by outcome', 'counter',
+            lambda: {
+                ('success',): self.stats['jobs_successful'],
+                ('failure',): self.stats['jobs_failed'],
+                ('rejected',): self.stats['jobs_rejected']
+            },
+            ['outcome']
+        )
+        REGISTRY.callback(
+            'print_agent_pages_printed', 'Pages reported printed by CUPS', 'counter',
+            lambda: self.stats['pages_printed']
+        )
+        REGISTRY.callback(
+            'print_agent_queue_depth', 'Jobs waiting in the admission queue', 'gauge',
+            lambda: self.job_queue.qsize() if self.job_queue else 0
+        )
+        REGISTRY.callback(
+            'print_agent_inflight_jobs', 'Jobs admitted and not yet finished', 'gauge',
+            lambda: len(self.inflight)
+        )
+        REGISTRY.callback(
+            'print_agent_stage_active_jobs', 'Jobs being worked on by each pipeline stage', 'gauge',
+            lambda: {(stage.name,): stage.active for stage in self.pipeline},
+            ['stage']
+        )
+        REGISTRY.callback(
+            'print_agent_backend_breaker_state', 'Backend circuit breaker state (1 for the current one)', 'gauge',
+            lambda: {
+                (state,): int(self.backend is not None and self.backend.breaker.state == state)
+                for state in (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+            },
+            ['state']
+        )
+        REGISTRY.callback(
+            'print_agent_backend_hedges', 'Hedged backend requests sent, and those that answered first', 'counter',
+            lambda: {
+                ('sent',): self.backend.stats['hedges_sent'] if self.backend else 0,
+                ('won',): self.backend.stats['hedges_won'] if self.backend else 0
+            },
+            ['result']
+        )
+        REGISTRY.callback(
+            'print_agent_download_bytes', 'Bytes downloaded from storage', 'counter',
+            lambda: self.downloader.stats['bytes_downloaded'] if self.downloader else 0
+        )
+        REGISTRY.callback(
+            'print_agent_cups_polls', 'Batched CUPS job status polls', 'counter',
+            lambda: self.print_manager.polls if self.print_manager else 0
+        )
+        REGISTRY.callback(
+            'print_agent_printer_jobs', 'Jobs finished on each printer of the pool by outcome', 'counter',
+            lambda: {
+                (name, outcome): printer[f'jobs_{outcome}']
+                for name, printer in (self.print_manager.get_stats() if self.print_manager else {}).items()
+                for outcome in ('completed', 'failed')
+            },
+            ['printer', 'outcome']
+        )
+        REGISTRY.callback(
+            'print_agent_printer_queued_pages', 'Pages submitted to each printer and not yet finished', 'gauge',
+            lambda: {
+                (name,): printer['queued_pages']
+                for name, printer in (self.print_manager.get_stats() if self.print_manager else {}).items()
+            },
+            ['printer']
+        )
+        REGISTRY.callback(
+            'print_agent_retries', 'Retried requests to the backend and storage', 'counter',
+            lambda: {
+                ('report',): self.outbox.stats['retries'] if self.outbox else 0,
+                ('download',): self.downloader.stats['chunk_retries'] if self.downloader else 0
+            },
+            ['kind']
+        )
+        REGISTRY.callback(
+            'print_agent_reports_pending', 'Reports waiting in the outbox', 'gauge',
+            lambda: self.outbox.pending() if self.outbox else 0
+        )
+        if self.preflight:
+            REGISTRY.callback(
+                'print_agent_preflight_rejections', 'Documents rejected before reaching CUPS', 'counter',
+                lambda: self.preflight.stats['rejected']
+            )
+        if self.slimmer:
+            REGISTRY.callback(
+                'print_agent_slimming_bytes_saved', 'Document bytes not sent to printers thanks to slimming', 'counter',
+                lambda: self.slimmer.stats['bytes_in'] - self.slimmer.stats['bytes_out']
+            )
+        if self.document_cache:
+            REGISTRY.callback(
+                'print_agent_document_cache_lookups', 'Document cache lookups by result', 'counter',
+                lambda: {
+                    ('hit',): self.document_cache.stats['hits'],
+                    ('miss',): self.document_cache.stats['misses']
+                },
+                ['result']
+            )
+    
+    def _init_prerenderer(self):
+        """Set up pre-rendering, if the printers are real and the render tool is installed"""
+        tool = self.config.prerender_tool
+        if self.config.printer_backend == 'virtual':
+            self.logger.info("Pre-rendering disabled: virtual printers take PDFs")
+            return
+        if not Prerenderer.available(tool):
+            self.logger.warning(f"Pre-rendering disabled: {tool} is not installed")
+            return
+        try:
+            cache = DocumentCache(
+                os.path.join(self.config.cache_dir, 'rendered'),
+                self.config.prerender_cache_mb * 1024 * 1024
+            )
+        except OSError as e:
+            self.logger.warning(f"Pre-rendering disabled: {e}")
+            return
+        self.prerenderer = Prerenderer(
+            cache,
+            tool=tool,
+            workers=self.config.prerender_workers,
+            gs_device=self.config.prerender_gs_device,
+            resolution=self.config.prerender_resolution,
+            timeout=self.config.prerender_timeout_seconds
+        )
+        self.logger.info(f"Pre-rendering with {tool} ({self.prerenderer.workers} worker(s))")
+    
+    def _create_print_manager(self, printer_name: str) -> AsyncPrintManager:
+        """Print manager for one printer of the pool, simulated if PRINTER_BACKEND=virtual"""
+        if self.config.printer_backend != 'virtual':
+            return AsyncPrintManager(
+                printer_name,
+                poll_interval=2.0,
+                max_workers=self.config.cups_workers,
+                cache_ttl=self.config.printer_cache_ttl
+            )
+        
+        device = VirtualPrinter(
+            name=printer_name,
+            ppm=self.config.virtual_printer_ppm,
+            warmup_seconds=self.config.virtual_printer_warmup_seconds,
+            jam_rate=self.config.virtual_printer_jam_rate,
+            paper_capacity=self.config.virtual_printer_paper_capacity,
+            job_overhead_seconds=self.config.virtual_printer_job_overhead_seconds,
+            speedup=self.config.virtual_printer_speedup,
+            job_ids=self._virtual_job_ids
+        )
+        self.virtual_printers[printer_name] = device
+        self.logger.warning(
+            f"Using virtual printer {printer_name} ({self.config.virtual_printer_ppm:g} ppm, "
+            f"{self.config.virtual_printer_speedup:g}x speed); nothing will be printed"
+        )
+        return AsyncPrintManager(
+            printer_name,
+            # A simulated printer is polled on its own (faster) clock
+            poll_interval=2.0 / self.config.virtual_printer_speedup,
+            max_workers=self.config.cups_workers,
+            manager_factory=lambda: VirtualPrintManager(device),
+            cache_ttl=self.config.printer_cache_ttl
+        )
+    
+    def queue_estimates(self) -> List[Dict[str, Any]]:
+        """
+        Jobs waiting for a printer, in the order they are expected to print
+        
+        Wait estimates cover jobs whose size is known; jobs still waiting to
+        be fetched are listed last without one.
+        """
+        if not self.pipeline:
+            return []
+        fetch_stage, download_stage, print_stage = self.pipeline
+        
+        scheduled = print_stage.queue.scheduled() + download_stage.queue.scheduled()
+        waits = estimated_waits(list(self.printing.values()), scheduled, len(self.print_manager.printers))
+        jobs = [
+            {
+                'upid': ctx.upid,
+                'stage': 'printing',
+                'estimated_print_seconds': ctx.estimated_seconds,
+                'estimated_wait_seconds': 0.0
+            }
+            for ctx in self.printing.values()
+        ]
+        for ctx in scheduled:
+            jobs.append({
+                'upid': ctx.upid,
+                'stage': 'ready' if ctx.file_path or ctx.streamed else 'fetched',
+                'estimated_print_seconds': ctx.estimated_seconds,
+                'estimated_wait_seconds': waits[ctx.upid]
+            })
+        for ctx in fetch_stage.queue.scheduled():
+            jobs.append({
+                'upid': ctx.upid,
+                'stage': 'admitted',
+                'estimated_print_seconds': None,
+                'estimated_wait_seconds': None
+            })
+        return jobs
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get current agent statistics"""
         uptime = datetime.now() - self.stats['start_time']
+        dequeued = self.queue_stats['jobs_dequeued']
         
         return {
             **self.stats,
             'uptime_seconds': uptime.total_seconds(),
             'temp_files_count': len(self.temp_files),
+            'queue_depth': self.job_queue.qsize() if self.job_queue else 0,
+            'queue_max_depth': self.config.max_queue_depth,
+            'active_jobs': self.active_jobs,
+            'inflight_upids': len(self.inflight),
+            'avg_queue_wait_seconds': self.queue_stats['wait_seconds_total'] / dequeued if dequeued else 0.0,
+            'max_queue_wait_seconds': self.queue_stats['wait_seconds_max'],
+            'pipeline': {stage.name: stage.occupancy() for stage in self.pipeline},
+            'scheduler_policy': self.config.scheduler_policy,
+            'document_cache': self.document_cache.get_stats() if self.document_cache else None,
+            'preflight': self.preflight.get_stats() if self.preflight else None,
+            'slimming': self.slimmer.get_stats() if self.slimmer else None,
+            'prerender': self.prerenderer.get_stats() if self.prerenderer else None,
+            'downloads': self.downloader.stats if self.downloader else None,
+            'http': self.transport.get_stats() if self.transport else None,
+            'backend': self.backend.get_stats() if self.backend else None,
+            'outbox': self.outbox.get_stats() if self.outbox else None,
+            'journal': self.journal.get_stats() if self.journal else None,
+            'event_loop': self.loop_monitor.get_stats() if self.loop_monitor else None,
+            'printers': self.print_manager.get_stats() if self.print_manager else None,
+            'virtual_printers': {name: device.get_stats() for name, device in self.virtual_printers.items()} or None,
             'printer_name': self.config.printer_name,
             'success_rate': (
                 self.stats['jobs_successful'] / max(self.stats['jobs_processed'], 1) * 100
@@ -420,12 +1827,38 @@ async def handle_print_request(request):
         # Get print agent from app context
         print_agent = request.app['print_agent']
         
-        # Process print job asynchronously
-        asyncio.create_task(print_agent.process_print_job(upid))
+        # Admit into the bounded job queue, shedding load when it is full
+        disposition, success = print_agent.submit_job(upid)
+        
+        if disposition == 'unavailable':
+            retry_after = print_agent.backend_retry_after_seconds()
+            return aiohttp.web.json_response(
+                {'error': 'Backend unavailable', 'upid': upid, 'retry_after': retry_after},
+                status=503,
+                headers={'Retry-After': str(retry_after)}
+            )
+        
+        if disposition == 'rejected':
+            retry_after = print_agent.retry_after_seconds()
+            return aiohttp.web.json_response(
+                {'error': 'Print queue is full', 'upid': upid, 'retry_after': retry_after},
+                status=429,
+                headers={'Retry-After': str(retry_after)}
+            )
+        
+        if disposition == 'done':
+            return aiohttp.web.json_response({
+                'message': f'Print job already {"completed" if success else "failed"} for UPID: {upid}',
+                'upid': upid,
+                'status': disposition,
+                'success': success
+            })
         
         return aiohttp.web.json_response({
-            'message': f'Print job queued for UPID: {upid}',
-            'upid': upid
+            'message': f'Print job {disposition} for UPID: {upid}',
+            'upid': upid,
+            'status': disposition,
+            'queue_depth': print_agent.job_queue.qsize()
         })
         
     except Exception as e:
@@ -439,13 +1872,30 @@ async def handle_status_request(request):
     """Handle status/health check requests"""
     print_agent = request.app['print_agent']
     stats = print_agent.get_stats()
+    # Served from the printer cache; no CUPS round trip per probe
+    printer_info = await print_agent.print_manager.get_printer_info() if print_agent.print_manager else {}
     
     return aiohttp.web.json_response({
         'status': 'healthy',
         'statistics': stats,
-        'printer_info': print_agent.print_manager.get_printer_info() if print_agent.print_manager else {}
+        'printer_info': printer_info
+    }, dumps=lambda data: json.dumps(data, default=str))
+
+async def handle_queue_request(request):
+    """Handle requests for the queued jobs and their estimated waits"""
+    print_agent = request.app['print_agent']
+    return aiohttp.web.json_response({
+        'policy': print_agent.config.scheduler_policy,
+        'jobs': print_agent.queue_estimates()
     })
 
+async def handle_metrics_request(request):
+    """Handle Prometheus scrapes"""
+    return aiohttp.web.Response(
+        body=REGISTRY.render().encode('utf-8'),
+        headers={'Content-Type': CONTENT_TYPE}
+    )
+
 async def create_http_server(print_agent: PrintAgent, port: int):
     """Create and start the HTTP server"""
     app = aiohttp.web.Application()
@@ -455,6 +1905,8 @@ async def create_http_server(print_agent: PrintAgent, port: int):
     app.router.add_post('/print', handle_print_request)
     app.router.add_get('/status', handle_status_request)
     app.router.add_get('/health', handle_status_request)
+    app.router.add_get('/queue', handle_queue_request)
+    app.router.add_get('/metrics', handle_metrics_request)
     
     return app, port
 
@@ -6,12 +6,47 @@ Handles actual printing operations using CUPS
 
 import cups
 import time
+import asyncio
 import logging
 import os
-from typing import Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple, Callable, TypeVar, List, Iterator, AsyncIterator
+from dataclasses import dataclass, astuple, replace
 from enum import Enum
 
+from metrics import REGISTRY
+
+T = TypeVar('T')
+
+# IPP printer attributes kept in the printer cache: state, then capabilities
+PRINTER_STATE_ATTRIBUTES = [
+    'printer-state',
+    'printer-state-reasons',
+    'printer-state-message',
+    'printer-is-accepting-jobs',
+    'queued-job-count'
+]
+PRINTER_CAPABILITY_ATTRIBUTES = [
+    'printer-info',
+    'printer-make-and-model',
+    'color-supported',
+    'print-color-mode-supported',
+    'sides-supported',
+    'media-supported',
+    'print-quality-supported',
+    'orientation-requested-supported',
+    'copies-supported',
+    'document-format-supported',
+    'pages-per-minute'
+]
+
+CUPS_POLL_SECONDS = REGISTRY.histogram(
+    'print_agent_cups_poll_duration_seconds',
+    'Latency of one batched CUPS job status poll'
+)
+
 class PrintJobStatus(Enum):
     """CUPS job status mapping"""
     PENDING = 3
@@ -31,6 +66,7 @@ class PrintOptions:
     orientation: str = "portrait"
     color_mode: str = "monochrome"
     print_quality: str = "normal"
+    page_ranges: Optional[str] = None  # e.g. "1-50"; None prints every page
     
     def to_cups_options(self) -> Dict[str, str]:
         """Convert to CUPS options dictionary"""
@@ -69,8 +105,50 @@ class PrintOptions:
         }
         options['print-quality'] = quality_map.get(self.print_quality.lower(), '4')
         
+        # Page selection
+        if self.page_ranges:
+            options['page-ranges'] = self.page_ranges
+        
         return options
 
+def classify_status(status: PrintJobStatus) -> Optional[bool]:
+    """True if a job with this status completed, False if it failed, None if it is still in progress"""
+    if status == PrintJobStatus.COMPLETED:
+        return True
+    if status in [PrintJobStatus.CANCELLED, PrintJobStatus.ABORTED]:
+        return False
+    return None
+
+def job_outcome(job_id: int, status: PrintJobStatus, job_info: Dict[str, Any],
+                logger: logging.Logger) -> Optional[bool]:
+    """
+    Decide whether a job has finished based on its current status, and log it
+    
+    Args:
+        job_id: CUPS job ID
+        status: Current job status
+        job_info: Job attributes returned by CUPS
+        logger: Logger used to report the transition
+    
+    Returns:
+        True if completed, False if failed, None if still in progress
+    """
+    # Log current status
+    logger.debug(f"Job {job_id} status: {status.name}")
+    outcome = classify_status(status)
+    
+    if outcome is True:
+        pages_printed = job_info.get('job-media-sheets-completed', 0)
+        logger.info(f"Job {job_id} completed successfully. Pages printed: {pages_printed}")
+    elif outcome is False:
+        error_msg = job_info.get('job-state-message', 'Unknown error')
+        logger.error(f"Job {job_id} failed: {status.name} - {error_msg}")
+    elif status in [PrintJobStatus.STOPPED, PrintJobStatus.HELD]:
+        logger.warning(f"Job {job_id} is {status.name}")
+        # Continue monitoring in case it resumes
+    
+    return outcome
+
 class PrintManager:
     """Manages CUPS printing operations"""
     
@@ -120,7 +198,8 @@ class PrintManager:
             self.logger.error(f"Error verifying printer: {e}")
             raise
     
-    def print_file(self, file_path: str, job_title: str, print_options: PrintOptions) -> int:
+    def print_file(self, file_path: str, job_title: str, print_options: PrintOptions,
+                   cups_options: Optional[Dict[str, str]] = None, raw: bool = False) -> int:
         """
         Submit a print job to CUPS
         
@@ -128,6 +207,10 @@ class PrintManager:
             file_path: Path to the file to print
             job_title: Title for the print job
             print_options: Print configuration options
+            cups_options: Options already compiled (and validated) from print_options
+            raw: File is already in the printer's language; bypass the filters.
+                 No other options are sent, so copies and page ranges must be
+                 in the file already
             
         Returns:
             int: CUPS job ID
@@ -145,8 +228,11 @@ class PrintManager:
         self.logger.info(f"Submitting print job: {file_path} ({file_size} bytes)")
         
         try:
-            # Convert print options to CUPS format
-            cups_options = print_options.to_cups_options()
+            # Convert print options to CUPS format (a raw file has them baked in)
+            if raw:
+                cups_options = {'raw': 'true'}
+            else:
+                cups_options = cups_options or print_options.to_cups_options()
             self.logger.debug(f"CUPS options: {cups_options}")
             
             # Submit the print job
@@ -167,6 +253,124 @@ class PrintManager:
             self.logger.error(f"Unexpected error submitting print job: {e}")
             raise
     
+    def print_stream(self, chunks: Iterator[bytes], job_title: str, print_options: PrintOptions,
+                     document_format: str = 'application/pdf',
+                     cups_options: Optional[Dict[str, str]] = None) -> int:
+        """
+        Submit a print job whose document is streamed to CUPS as it arrives
+        
+        Uses createJob + startDocument + writeRequestData + finishDocument so
+        the document never has to be written to a local file first.
+        
+        Args:
+            chunks: Document data, in order
+            job_title: Title for the print job
+            print_options: Print configuration options
+            document_format: MIME type of the document
+            cups_options: Options already compiled (and validated) from print_options
+        
+        Returns:
+            int: CUPS job ID
+        
+        Raises:
+            cups.IPPError: If CUPS operation fails
+            cups.HTTPError: If CUPS stops accepting document data (so it is
+                            told apart from errors raised by the chunk source)
+        """
+        cups_options = cups_options or print_options.to_cups_options()
+        self.logger.debug(f"CUPS options: {cups_options}")
+        
+        job_id = self.cups_conn.createJob(self.printer_name, job_title, cups_options)
+        self.logger.info(f"Streaming print job: Job ID {job_id}")
+        
+        try:
+            self.cups_conn.startDocument(self.printer_name, job_id, job_title, document_format, 1)
+            
+            total_bytes = 0
+            for chunk in chunks:
+                status = self.cups_conn.writeRequestData(chunk, len(chunk))
+                if status != cups.HTTP_CONTINUE:
+                    self.logger.error(f"CUPS rejected document data (HTTP status {status})")
+                    raise cups.HTTPError(status)
+                total_bytes += len(chunk)
+            
+            self.cups_conn.finishDocument(self.printer_name)
+            self.logger.info(f"Print job streamed successfully: Job ID {job_id} ({total_bytes} bytes)")
+            return job_id
+        
+        except Exception as e:
+            self.logger.error(f"Error streaming print job {job_id}: {e}")
+            self._cancel_upload(job_id)
+            raise
+    
+    def print_files(self, file_paths: List[str], job_title: str, print_options: PrintOptions,
+                    cups_options: Optional[Dict[str, str]] = None, chunk_size: int = 65536) -> int:
+        """
+        Submit several files as the documents of one CUPS job
+        
+        The printer handles the job as a single unit (one warm-up, one
+        banner page, one job-state cycle) and prints the documents in order,
+        each starting on a new sheet.
+        
+        Args:
+            file_paths: Paths of the files to print, in order
+            job_title: Title for the print job
+            print_options: Print configuration options (shared by every document)
+            cups_options: Options already compiled (and validated) from print_options
+            chunk_size: Bytes sent per writeRequestData call
+        
+        Returns:
+            int: CUPS job ID
+        
+        Raises:
+            FileNotFoundError: If a file doesn't exist
+            cups.IPPError: If CUPS operation fails
+            IOError: If CUPS stops accepting document data
+        """
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"Print file not found: {file_path}")
+        
+        cups_options = cups_options or print_options.to_cups_options()
+        self.logger.debug(f"CUPS options: {cups_options}")
+        
+        job_id = self.cups_conn.createJob(self.printer_name, job_title, cups_options)
+        self.logger.info(f"Submitting {len(file_paths)} document(s) as Job ID {job_id}")
+        
+        try:
+            for number, file_path in enumerate(file_paths, 1):
+                last_document = 1 if number == len(file_paths) else 0
+                self.cups_conn.startDocument(
+                    self.printer_name, job_id, os.path.basename(file_path), 'application/pdf', last_document
+                )
+                with open(file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(chunk_size), b''):
+                        status = self.cups_conn.writeRequestData(chunk, len(chunk))
+                        if status != cups.HTTP_CONTINUE:
+                            raise IOError(f"CUPS rejected document data (HTTP status {status})")
+                self.cups_conn.finishDocument(self.printer_name)
+            
+            self.logger.info(f"Print job submitted successfully: Job ID {job_id} ({len(file_paths)} documents)")
+            return job_id
+        
+        except Exception as e:
+            self.logger.error(f"Error submitting documents of job {job_id}: {e}")
+            self._cancel_upload(job_id)
+            raise
+    
+    def _cancel_upload(self, job_id: int) -> None:
+        """
+        Cancel a job whose document upload broke off
+        
+        The connection may be stuck in the middle of the upload request, so
+        the cancel goes over a new one, which also replaces it for later calls.
+        """
+        try:
+            self.cups_conn = cups.Connection()
+            self.cups_conn.cancelJob(job_id)
+        except (cups.IPPError, RuntimeError) as e:
+            self.logger.warning(f"Could not cancel job {job_id}: {e}")
+    
     def get_job_status(self, job_id: int) -> Tuple[PrintJobStatus, Dict[str, Any]]:
         """
         Get the current status of a print job
@@ -208,6 +412,57 @@ class PrintManager:
             self.logger.error(f"Error getting job status: {e}")
             raise
     
+    def get_jobs_status(self, job_ids: List[int],
+                        requested_attributes: Optional[List[str]] = None) -> Dict[int, Tuple[PrintJobStatus, Dict[str, Any]]]:
+        """
+        Get the status of several jobs with a single getJobs round trip
+        
+        The scan starts at the oldest requested job ID and only the requested
+        attributes are returned, so the cost does not grow with the size of
+        the CUPS job history. Jobs belonging to other printers are ignored.
+        
+        Args:
+            job_ids: CUPS job IDs to look up
+            requested_attributes: Job attributes to fetch (None for all)
+        
+        Returns:
+            Dict of job_id -> (status, job_info) for every requested job
+        """
+        if not job_ids:
+            return {}
+        
+        jobs = self.cups_conn.getJobs(
+            which_jobs='all',
+            my_jobs=False,
+            first_job_id=min(job_ids),
+            requested_attributes=requested_attributes
+        )
+        printer_suffix = f"/printers/{self.printer_name}"
+        
+        results = {}
+        for job_id in job_ids:
+            job_info = jobs.get(job_id)
+            if job_info is None:
+                # Purged from history or cancelled before we saw it
+                self.logger.warning(f"Job {job_id} not found in CUPS job list")
+                results[job_id] = (PrintJobStatus.ABORTED, {})
+                continue
+            
+            printer_uri = job_info.get('job-printer-uri', printer_suffix)
+            if not printer_uri.endswith(printer_suffix):
+                self.logger.debug(f"Ignoring job {job_id} on {printer_uri}")
+                continue
+            
+            status_code = job_info.get('job-state', 0)
+            try:
+                status = PrintJobStatus(status_code)
+            except ValueError:
+                self.logger.warning(f"Unknown job status code: {status_code}")
+                status = PrintJobStatus.PENDING
+            results[job_id] = (status, job_info)
+        
+        return results
+    
     def wait_for_completion(self, job_id: int, timeout: Optional[float] = None) -> Tuple[bool, Dict[str, Any]]:
         """
         Wait for a print job to complete
@@ -226,25 +481,9 @@ class PrintManager:
             try:
                 status, job_info = self.get_job_status(job_id)
                 
-                # Log current status
-                self.logger.debug(f"Job {job_id} status: {status.name}")
-                
-                # Check for completion
-                if status == PrintJobStatus.COMPLETED:
-                    pages_printed = job_info.get('job-media-sheets-completed', 0)
-                    self.logger.info(f"Job {job_id} completed successfully. Pages printed: {pages_printed}")
-                    return True, job_info
-                
-                # Check for failure states
-                elif status in [PrintJobStatus.CANCELLED, PrintJobStatus.ABORTED]:
-                    error_msg = job_info.get('job-state-message', 'Unknown error')
-                    self.logger.error(f"Job {job_id} failed: {status.name} - {error_msg}")
-                    return False, job_info
-                
-                # Check for stopped/held states
-                elif status in [PrintJobStatus.STOPPED, PrintJobStatus.HELD]:
-                    self.logger.warning(f"Job {job_id} is {status.name}")
-                    # Continue monitoring in case it resumes
+                outcome = job_outcome(job_id, status, job_info, self.logger)
+                if outcome is not None:
+                    return outcome, job_info
                 
                 # Check timeout
                 if timeout and (time.time() - start_time) > timeout:
@@ -276,6 +515,60 @@ class PrintManager:
             self.logger.error(f"Error cancelling job {job_id}: {e}")
             return False
     
+    def get_job_attributes(self, job_id: int) -> Dict[str, Any]:
+        """
+        Get the attributes of a single job without scanning the job table
+        
+        Args:
+            job_id: CUPS job ID
+        
+        Returns:
+            Dict of job attributes
+        """
+        return self.cups_conn.getJobAttributes(job_id)
+    
+    @property
+    def printer_uri(self) -> str:
+        """IPP URI of the configured printer on the local CUPS server"""
+        return f"ipp://localhost/printers/{self.printer_name}"
+    
+    def create_subscription(self, events: List[str], lease_duration: int) -> int:
+        """
+        Create a pull (ippget) subscription for printer and job events
+        
+        Args:
+            events: IPP notify-events to subscribe to
+            lease_duration: Subscription lease in seconds
+        
+        Returns:
+            int: Subscription ID
+        """
+        subscription_id = self.cups_conn.createSubscription(
+            self.printer_uri,
+            events=events,
+            lease_duration=lease_duration
+        )
+        self.logger.info(f"Created CUPS subscription {subscription_id} for {self.printer_uri}")
+        return subscription_id
+    
+    def get_notifications(self, subscription_id: int, sequence_number: int) -> Dict[str, Any]:
+        """Fetch events at or after sequence_number for a subscription"""
+        return self.cups_conn.getNotifications(
+            [subscription_id],
+            sequence_numbers=[sequence_number]
+        )
+    
+    def renew_subscription(self, subscription_id: int, lease_duration: int) -> None:
+        """Extend the lease of a subscription"""
+        self.cups_conn.renewSubscription(subscription_id, lease_duration=lease_duration)
+    
+    def cancel_subscription(self, subscription_id: int) -> None:
+        """Cancel a subscription"""
+        try:
+            self.cups_conn.cancelSubscription(subscription_id)
+        except cups.IPPError as e:
+            self.logger.warning(f"Error cancelling subscription {subscription_id}: {e}")
+    
     def get_printer_info(self) -> Dict[str, Any]:
         """Get detailed information about the configured printer"""
         try:
@@ -285,6 +578,13 @@ class PrintManager:
             self.logger.error(f"Error getting printer info: {e}")
             return {}
     
+    def get_printer_attributes(self) -> Dict[str, Any]:
+        """Get the IPP state and capability attributes of the configured printer"""
+        return self.cups_conn.getPrinterAttributes(
+            self.printer_name,
+            requested_attributes=PRINTER_STATE_ATTRIBUTES + PRINTER_CAPABILITY_ATTRIBUTES
+        )
+    
     def get_job_history(self, limit: int = 10) -> Dict[int, Dict[str, Any]]:
         """
         Get recent job history
@@ -311,6 +611,827 @@ class PrintManager:
             self.logger.error(f"Error getting job history: {e}")
             return {}
 
+class AsyncPrintManager:
+    """
+    Asyncio facade over PrintManager
+    
+    All pycups calls run on a dedicated thread pool so that a long running
+    job never stalls the event loop. pycups connections are not thread-safe,
+    so each worker thread lazily opens its own PrintManager (and with it its
+    own CUPS connection) the first time it is used.
+    """
+    
+    def __init__(self, printer_name: str, poll_interval: float = 2.0, max_workers: int = 2,
+                 manager_factory: Optional[Callable[[], PrintManager]] = None, cache_ttl: float = 30.0):
+        """
+        Initialize the executor used for CUPS calls
+        
+        Args:
+            printer_name: Name of the CUPS printer
+            poll_interval: How often to poll job status (seconds)
+            max_workers: Number of worker threads (and CUPS connections)
+            manager_factory: Creates each worker's PrintManager (e.g. a virtual
+                printer); defaults to a CUPS-backed PrintManager
+            cache_ttl: How long cached printer state and capabilities are trusted (seconds)
+        """
+        self.printer_name = printer_name
+        self.poll_interval = poll_interval
+        self.manager_factory = manager_factory or (
+            lambda: PrintManager(self.printer_name, poll_interval=self.poll_interval)
+        )
+        self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='cups-worker'
+        )
+        self.events: Optional['JobEventListener'] = None
+        self.tracker = JobTracker(self)
+        self.printer_cache = PrinterCache(self, ttl=cache_ttl)
+    
+    def _worker_manager(self) -> PrintManager:
+        """Return the PrintManager owned by the current worker thread"""
+        manager = getattr(self._local, 'manager', None)
+        if manager is None:
+            manager = self.manager_factory()
+            self._local.manager = manager
+        return manager
+    
+    def _call(self, func: Callable[[PrintManager], T]) -> T:
+        """Run func against this thread's PrintManager, reconnecting on transport errors"""
+        manager = self._worker_manager()
+        try:
+            return func(manager)
+        except (cups.HTTPError, RuntimeError):
+            # Drop the broken connection so the next call on this worker reconnects
+            self._local.manager = None
+            raise
+    
+    async def _run(self, func: Callable[[PrintManager], T]) -> T:
+        """Run a blocking PrintManager call on the CUPS executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func)
+    
+    async def _upload(self, func: Callable[[PrintManager], T]) -> T:
+        """Run a document upload, dropping the thread's connection if it fails for any reason"""
+        def upload(manager: PrintManager) -> T:
+            try:
+                return func(manager)
+            except Exception:
+                # The request may be half sent (e.g. the chunk source failed); never reuse it
+                self._local.manager = None
+                raise
+        
+        return await self._run(upload)
+    
+    async def connect(self) -> None:
+        """Open a worker connection, verify the printer exists and load its attributes"""
+        await self._run(lambda manager: None)
+        await self.printer_cache.refresh()
+    
+    async def enable_notifications(self, interval: float = 0.5) -> bool:
+        """
+        Switch job monitoring to CUPS event notifications
+        
+        Args:
+            interval: How often to pull new events from the subscription (seconds)
+        
+        Returns:
+            bool: True if the subscription was created, False if polling remains in use
+        """
+        listener = JobEventListener(self, interval=interval)
+        if await listener.start():
+            self.events = listener
+            return True
+        return False
+    
+    async def print_file(self, file_path: str, job_title: str, print_options: PrintOptions,
+                         raw: bool = False) -> int:
+        """Submit a print job to CUPS with validated options (see PrintManager.print_file)"""
+        cups_options = None if raw else await self.printer_cache.compile_options(print_options)
+        return await self._run(
+            lambda manager: manager.print_file(file_path, job_title, print_options, cups_options, raw)
+        )
+    
+    async def print_stream(self, chunks: AsyncIterator[bytes], job_title: str, print_options: PrintOptions,
+                           document_format: str = 'application/pdf') -> int:
+        """
+        Stream a document into a new CUPS job (see PrintManager.print_stream)
+        
+        The whole upload runs on one worker thread, since every call of a
+        streamed job must use the same CUPS connection. That thread pulls
+        chunks from the async iterator on the event loop, so a slow source
+        simply slows the upload down.
+        """
+        cups_options = await self.printer_cache.compile_options(print_options)
+        loop = asyncio.get_running_loop()
+        iterator = chunks.__aiter__()
+        
+        def pull() -> Iterator[bytes]:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        
+        return await self._upload(
+            lambda manager: manager.print_stream(pull(), job_title, print_options, document_format, cups_options)
+        )
+    
+    async def print_files(self, file_paths: List[str], job_title: str, print_options: PrintOptions) -> int:
+        """Submit several files as one CUPS job (see PrintManager.print_files)"""
+        cups_options = await self.printer_cache.compile_options(print_options)
+        return await self._upload(
+            lambda manager: manager.print_files(file_paths, job_title, print_options, cups_options)
+        )
+    
+    async def get_job_status(self, job_id: int) -> Tuple[PrintJobStatus, Dict[str, Any]]:
+        """Get the current status of a print job (see PrintManager.get_job_status)"""
+        return await self._run(lambda manager: manager.get_job_status(job_id))
+    
+    async def wait_for_completion(self, job_id: int, timeout: Optional[float] = None,
+                                  on_status: Optional[Callable[[int, PrintJobStatus, Dict[str, Any]], None]] = None
+                                  ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Wait for a print job to complete without blocking the event loop
+        
+        The job is handed to the shared JobTracker, so any number of
+        concurrent waiters cost a single status poll per tick.
+        
+        Args:
+            job_id: CUPS job ID to monitor
+            timeout: Maximum time to wait in seconds (None for no timeout)
+            on_status: Called whenever the job's status changes
+        
+        Returns:
+            Tuple of (success, final_job_info)
+        """
+        self.logger.info(f"Monitoring job {job_id} for completion...")
+        logged: List[PrintJobStatus] = []
+        
+        def log_status(job_id: int, status: PrintJobStatus, job_info: Dict[str, Any]) -> None:
+            logged.append(status)
+            job_outcome(job_id, status, job_info, self.logger)
+            if on_status:
+                on_status(job_id, status, job_info)
+        
+        future = self.tracker.watch(job_id, callback=log_status)
+        try:
+            status, job_info = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.logger.error(f"Timeout waiting for job {job_id} completion")
+            return False, self.tracker.last_info(job_id)
+        except Exception as e:
+            self.logger.error(f"Error monitoring job {job_id}: {e}")
+            return False, {}
+        finally:
+            self.tracker.unwatch(job_id, future, callback=log_status)
+        
+        if not logged or logged[-1] != status:
+            # Finished before the callback saw the final state
+            job_outcome(job_id, status, job_info, self.logger)
+        return classify_status(status) is True, job_info
+    
+    async def cancel_job(self, job_id: int) -> bool:
+        """Cancel a print job (see PrintManager.cancel_job)"""
+        return await self._run(lambda manager: manager.cancel_job(job_id))
+    
+    async def get_printer_info(self) -> Dict[str, Any]:
+        """Get detailed information about the configured printer"""
+        return await self._run(lambda manager: manager.get_printer_info())
+    
+    async def get_printer_attributes(self) -> Dict[str, Any]:
+        """Get the IPP state and capability attributes of the configured printer"""
+        return await self._run(lambda manager: manager.get_printer_attributes())
+    
+    async def get_job_attributes(self, job_id: int) -> Dict[str, Any]:
+        """Get the attributes of a single job (see PrintManager.get_job_attributes)"""
+        return await self._run(lambda manager: manager.get_job_attributes(job_id))
+    
+    async def get_job_history(self, limit: int = 10) -> Dict[int, Dict[str, Any]]:
+        """Get recent job history (see PrintManager.get_job_history)"""
+        return await self._run(lambda manager: manager.get_job_history(limit))
+    
+    async def close(self) -> None:
+        """Stop the event listener and shut down the CUPS executor"""
+        if self.events:
+            await self.events.stop()
+        self._executor.shutdown(wait=False)
+
+class JobTracker:
+    """
+    Tracks every outstanding CUPS job of one printer
+    
+    Instead of one polling loop per job, a single loop issues one batched
+    getJobs per tick (restricted to the attributes we need) and fans the
+    results out to per-job futures and callbacks. When CUPS notifications
+    are healthy the tracker only polls at the slow fallback rate and
+    terminal states arrive through resolve() instead.
+    """
+    
+    REQUESTED_ATTRIBUTES = [
+        'job-id',
+        'job-state',
+        'job-state-message',
+        'job-state-reasons',
+        'job-media-sheets-completed',
+        'job-impressions-completed',
+        'job-printer-uri'
+    ]
+    TERMINAL_STATES = {
+        PrintJobStatus.CANCELLED,
+        PrintJobStatus.ABORTED,
+        PrintJobStatus.COMPLETED
+    }
+    
+    def __init__(self, manager: AsyncPrintManager, history_size: int = 256):
+        """
+        Initialize the tracker
+        
+        Args:
+            manager: AsyncPrintManager whose executor runs the CUPS calls
+            history_size: Number of recently finished jobs remembered for late waiters
+        """
+        self.manager = manager
+        self.history_size = history_size
+        self.logger = logging.getLogger(__name__)
+        
+        self.polls = 0
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+        self._callbacks: Dict[int, List[Callable[[int, PrintJobStatus, Dict[str, Any]], None]]] = {}
+        self._last_seen: Dict[int, Tuple[PrintJobStatus, Dict[str, Any]]] = {}
+        self._finished: 'OrderedDict[int, Tuple[PrintJobStatus, Dict[str, Any]]]' = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def watched_jobs(self) -> List[int]:
+        """IDs of jobs that still have waiters"""
+        return list(self._waiters)
+    
+    def watch(self, job_id: int,
+              callback: Optional[Callable[[int, PrintJobStatus, Dict[str, Any]], None]] = None) -> asyncio.Future:
+        """
+        Start tracking a job
+        
+        Args:
+            job_id: CUPS job ID
+            callback: Called with (job_id, status, job_info) whenever the status changes
+        
+        Returns:
+            Future resolved with (status, job_info) once the job reaches a terminal state
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        if job_id in self._finished:
+            future.set_result(self._finished[job_id])
+            return future
+        
+        self._waiters.setdefault(job_id, []).append(future)
+        if callback:
+            self._callbacks.setdefault(job_id, []).append(callback)
+        
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return future
+    
+    def unwatch(self, job_id: int, future: asyncio.Future,
+                callback: Optional[Callable[[int, PrintJobStatus, Dict[str, Any]], None]] = None) -> None:
+        """Stop tracking a job for one waiter"""
+        waiters = self._waiters.get(job_id, [])
+        if future in waiters:
+            waiters.remove(future)
+        callbacks = self._callbacks.get(job_id, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        
+        if not waiters:
+            self._waiters.pop(job_id, None)
+            self._callbacks.pop(job_id, None)
+            self._last_seen.pop(job_id, None)
+    
+    def is_finished(self, job_id: int) -> bool:
+        """True if the job's terminal state has already been recorded"""
+        return job_id in self._finished
+    
+    def last_info(self, job_id: int) -> Dict[str, Any]:
+        """Most recent job attributes seen for a job"""
+        return self._last_seen.get(job_id, (None, {}))[1]
+    
+    def resolve(self, job_id: int, status: PrintJobStatus, job_info: Dict[str, Any]) -> None:
+        """Record a terminal state and wake every waiter of the job"""
+        result = (status, job_info)
+        self._finished[job_id] = result
+        while len(self._finished) > self.history_size:
+            self._finished.popitem(last=False)
+        
+        self._notify(job_id, status, job_info)
+        for future in self._waiters.pop(job_id, []):
+            if not future.done():
+                future.set_result(result)
+        self._callbacks.pop(job_id, None)
+        self._last_seen.pop(job_id, None)
+    
+    def update(self, job_id: int, status: PrintJobStatus, job_info: Dict[str, Any]) -> None:
+        """Record a non-terminal status reported by an event"""
+        if job_id in self._waiters:
+            self._notify(job_id, status, job_info)
+    
+    def _notify(self, job_id: int, status: PrintJobStatus, job_info: Dict[str, Any]) -> None:
+        """Run callbacks if the job's status changed since the last tick"""
+        previous = self._last_seen.get(job_id)
+        self._last_seen[job_id] = (status, job_info)
+        if previous is not None and previous[0] == status:
+            return
+        
+        for callback in list(self._callbacks.get(job_id, [])):
+            try:
+                callback(job_id, status, job_info)
+            except Exception as e:
+                self.logger.error(f"Error in status callback for job {job_id}: {e}")
+    
+    def _interval(self) -> float:
+        """Poll slowly while notifications deliver terminal states"""
+        events = self.manager.events
+        if events and events.healthy:
+            return events.fallback_interval
+        return self.manager.poll_interval
+    
+    async def _run(self) -> None:
+        """Poll all watched jobs until none are left"""
+        while self._waiters:
+            await asyncio.sleep(self._interval())
+            await self.poll()
+    
+    async def poll(self) -> None:
+        """Look up every watched job with one batched getJobs call"""
+        job_ids = self.watched_jobs
+        if not job_ids:
+            return
+        
+        started_at = time.monotonic()
+        try:
+            results = await self.manager._run(
+                lambda manager: manager.get_jobs_status(job_ids, self.REQUESTED_ATTRIBUTES)
+            )
+        except Exception as e:
+            # Keep watching; the next tick retries
+            self.logger.error(f"Error polling job status: {e}")
+            return
+        finally:
+            self.polls += 1
+            CUPS_POLL_SECONDS.observe(time.monotonic() - started_at)
+        
+        for job_id, (status, job_info) in results.items():
+            if status in self.TERMINAL_STATES:
+                self.resolve(job_id, status, job_info)
+            elif job_id in self._waiters:
+                if status == PrintJobStatus.STOPPED:
+                    # Usually the printer itself stopped (jam, paper out)
+                    self.manager.printer_cache.invalidate()
+                self._notify(job_id, status, job_info)
+
+def _as_list(value: Any) -> Optional[List[Any]]:
+    """IPP attributes with one value come back as a scalar; normalise to a list"""
+    if value is None:
+        return None
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+@dataclass
+class PrinterCapabilities:
+    """What a printer can do, from its IPP attributes (None when unknown)"""
+    color: Optional[bool] = None
+    duplex: Optional[bool] = None
+    media: Optional[List[str]] = None
+    pages_per_minute: Optional[float] = None
+    
+    @classmethod
+    def from_attributes(cls, attributes: Dict[str, Any]) -> 'PrinterCapabilities':
+        """Build from IPP printer attributes (getPrinterAttributes)"""
+        sides = _as_list(attributes.get('sides-supported'))
+        media = _as_list(attributes.get('media-supported'))
+        modes = _as_list(attributes.get('print-color-mode-supported'))
+        color = attributes.get('color-supported')
+        if color is None and modes is not None:
+            color = 'color' in modes
+        ppm = attributes.get('pages-per-minute')
+        return cls(
+            color=color,
+            duplex=any(side.startswith('two-sided') for side in sides) if sides is not None else None,
+            media=[name.lower() for name in media] if media is not None else None,
+            pages_per_minute=float(ppm) if ppm else None
+        )
+    
+    def match_media(self, media: str) -> Optional[str]:
+        """
+        Supported media name for a size such as 'a4'
+        
+        PWG self-describing names match on their size part, so 'a4' maps to
+        'iso_a4_210x297mm'. Returns the name unchanged when media support is
+        unknown and None when the printer cannot load it.
+        """
+        media = media.lower()
+        if self.media is None or media in self.media:
+            return media
+        for name in self.media:
+            if name.split('_')[1:2] == [media]:
+                return name
+        return None
+    
+    def supports(self, options: PrintOptions) -> bool:
+        """Whether the printer can honour a job's print options"""
+        if self.color is False and options.color_mode.lower() in ('color', 'colour'):
+            return False
+        if self.duplex is False and options.duplex:
+            return False
+        return self.match_media(options.paper_size) is not None
+
+class PrinterCache:
+    """
+    In-memory copy of one printer's IPP state and capabilities
+    
+    /status, job routing and option validation read from here instead of
+    asking CUPS every time. The attributes are re-read with one
+    getPrinterAttributes call once they are older than the TTL, however
+    many callers are waiting. CUPS printer events update the state in place
+    (or mark the copy stale when the configuration or media changed), and
+    a stopped job marks it stale, so changes show up before the TTL is up.
+    
+    Compiled CUPS option sets are validated against the capabilities and
+    memoized per PrintOptions combination; the memo is dropped whenever the
+    capabilities change.
+    """
+    
+    def __init__(self, manager: 'AsyncPrintManager', ttl: float = 30.0, max_compiled: int = 256):
+        """
+        Initialize the cache
+        
+        Args:
+            manager: AsyncPrintManager used to read the attributes
+            ttl: How long the attributes are trusted (seconds)
+            max_compiled: Number of compiled option sets kept
+        """
+        self.manager = manager
+        self.ttl = ttl
+        self.max_compiled = max_compiled
+        self.logger = logging.getLogger(__name__)
+        
+        self.attributes: Dict[str, Any] = {}
+        self.capabilities = PrinterCapabilities()
+        self.refreshed_at = 0.0
+        self._expires_at = 0.0
+        self._refreshing: Optional[asyncio.Future] = None
+        self._compiled: 'OrderedDict[Tuple, Dict[str, str]]' = OrderedDict()
+        
+        self.stats = {
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'invalidations': 0,
+            'events_applied': 0,
+            'options_compiled': 0,
+            'options_cache_hits': 0,
+            'options_adjusted': 0
+        }
+    
+    @property
+    def fresh(self) -> bool:
+        """Whether the cached attributes are within their TTL"""
+        return time.monotonic() < self._expires_at
+    
+    @property
+    def loaded(self) -> bool:
+        """Whether the attributes have been read at least once"""
+        return self.refreshed_at > 0.0
+    
+    async def get(self) -> Dict[str, Any]:
+        """Printer attributes, re-read first if stale"""
+        if not self.fresh:
+            await self.refresh()
+        return self.attributes
+    
+    async def refresh(self) -> None:
+        """Re-read the attributes; concurrent callers share one CUPS call"""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._refreshing)
+    
+    async def _load(self) -> None:
+        """Fetch the attributes and store them"""
+        try:
+            attributes = await self.manager.get_printer_attributes()
+        except Exception:
+            self.stats['refresh_errors'] += 1
+            raise
+        finally:
+            self._refreshing = None
+        self._store(attributes)
+    
+    def _store(self, attributes: Dict[str, Any]) -> None:
+        """Replace the cached attributes, dropping compiled options if capabilities changed"""
+        changed = any(
+            attributes.get(name) != self.attributes.get(name)
+            for name in PRINTER_CAPABILITY_ATTRIBUTES
+        )
+        self.attributes = dict(attributes)
+        if changed:
+            self.capabilities = PrinterCapabilities.from_attributes(attributes)
+            self._compiled.clear()
+        self.refreshed_at = time.monotonic()
+        self._expires_at = self.refreshed_at + self.ttl
+        self.stats['refreshes'] += 1
+    
+    def invalidate(self) -> None:
+        """Mark the attributes stale so the next reader re-reads them"""
+        self._expires_at = 0.0
+        self.stats['invalidations'] += 1
+    
+    def apply_event(self, event: Dict[str, Any]) -> None:
+        """Update the cache from a CUPS printer event"""
+        self.stats['events_applied'] += 1
+        if event.get('notify-subscribed-event') != 'printer-state-changed':
+            self.invalidate()
+            return
+        for name in PRINTER_STATE_ATTRIBUTES:
+            if name in event:
+                self.attributes[name] = event[name]
+        self.logger.info(
+            f"Printer {self.manager.printer_name} state {self.attributes.get('printer-state')}: "
+            f"{self.attributes.get('printer-state-reasons')}"
+        )
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Cached attributes for status reporting, without waiting on CUPS
+        
+        A stale copy is returned as is and refreshed in the background.
+        """
+        if not self.fresh and self._refreshing is None:
+            task = asyncio.ensure_future(self.refresh())
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return {
+            **self.attributes,
+            'cache_age_seconds': time.monotonic() - self.refreshed_at if self.loaded else None
+        }
+    
+    async def compile_options(self, print_options: PrintOptions) -> Dict[str, str]:
+        """
+        CUPS options for a job, adjusted to what the printer supports
+        
+        Unsupported values are replaced by the nearest supported one (e.g.
+        monochrome for colour on a mono printer) or left to the printer's
+        default, instead of CUPS rejecting the job or ignoring them quietly.
+        """
+        if not self.fresh:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Fall back to the last known capabilities (or none)
+                self.logger.warning(f"Could not refresh printer attributes: {e}")
+        
+        # Page ranges need no validation and differ for every part of a split
+        # job, so they are kept out of the memo and added afterwards
+        page_ranges = {'page-ranges': print_options.page_ranges} if print_options.page_ranges else {}
+        print_options = replace(print_options, page_ranges=None)
+        
+        key = astuple(print_options)
+        cups_options = self._compiled.get(key)
+        if cups_options is not None:
+            self._compiled.move_to_end(key)
+            self.stats['options_cache_hits'] += 1
+            return {**cups_options, **page_ranges}
+        
+        cups_options, adjustments, renames = self._validate(print_options.to_cups_options())
+        if adjustments:
+            self.stats['options_adjusted'] += 1
+            self.logger.warning(
+                f"Adjusted options for {self.manager.printer_name}: {', '.join(adjustments)}"
+            )
+        if renames:
+            self.logger.debug(f"Renamed options for {self.manager.printer_name}: {', '.join(renames)}")
+        self._compiled[key] = cups_options
+        if len(self._compiled) > self.max_compiled:
+            self._compiled.popitem(last=False)
+        self.stats['options_compiled'] += 1
+        return {**cups_options, **page_ranges}
+    
+    def _validate(self, cups_options: Dict[str, str]) -> Tuple[Dict[str, str], List[str], List[str]]:
+        """
+        Check compiled options against the *-supported attributes
+        
+        Returns the options, the values that were downgraded or dropped, and
+        the values only renamed to the printer's spelling (e.g. PWG media names)
+        """
+        options = dict(cups_options)
+        adjustments = []
+        renames = []
+        
+        def adjust(name: str, value: Optional[str], rename: bool = False) -> None:
+            (renames if rename else adjustments).append(f"{name}={options[name]} -> {value or 'printer default'}")
+            if value is None:
+                del options[name]
+            else:
+                options[name] = value
+        
+        modes = _as_list(self.attributes.get('print-color-mode-supported'))
+        if modes is None and self.capabilities.color is False:
+            modes = ['monochrome']
+        if modes is not None and options.get('print-color-mode') not in modes:
+            adjust('print-color-mode', 'monochrome' if 'monochrome' in modes else None)
+        
+        sides = _as_list(self.attributes.get('sides-supported'))
+        if sides is not None and options.get('sides') not in sides:
+            adjust('sides', 'one-sided' if 'one-sided' in sides else None)
+        
+        if 'media' in options:
+            media = self.capabilities.match_media(options['media'])
+            if media != options['media']:
+                adjust('media', media, rename=media is not None)
+        
+        for name in ('print-quality', 'orientation-requested'):
+            supported = _as_list(self.attributes.get(f'{name}-supported'))
+            if name in options and supported is not None and int(options[name]) not in supported:
+                adjust(name, None)
+        
+        copies = self.attributes.get('copies-supported')
+        if 'copies' in options and isinstance(copies, (list, tuple)) and len(copies) == 2:
+            if int(options['copies']) > copies[1]:
+                adjust('copies', str(copies[1]))
+        
+        return options, adjustments, renames
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        return {
+            **self.stats,
+            'compiled_option_sets': len(self._compiled),
+            'age_seconds': time.monotonic() - self.refreshed_at if self.loaded else None
+        }
+
+class JobEventListener:
+    """
+    Feeds job completions from a CUPS IPP pull subscription into the JobTracker
+    
+    One subscription is created per printer. The listener pulls only new
+    events (by sequence number) with getNotifications, which is far cheaper
+    than scanning the job table, and resolves the job in the tracker as soon
+    as it reaches a terminal state.
+    """
+    
+    EVENTS = ['job-completed', 'job-state-changed', 'job-stopped',
+              'printer-state-changed', 'printer-config-changed', 'printer-media-changed']
+    TERMINAL_STATES = {
+        PrintJobStatus.CANCELLED.value,
+        PrintJobStatus.ABORTED.value,
+        PrintJobStatus.COMPLETED.value
+    }
+    
+    def __init__(self, manager: AsyncPrintManager, interval: float = 0.5,
+                 lease_duration: int = 3600, fallback_interval: float = 30.0):
+        """
+        Initialize the listener
+        
+        Args:
+            manager: AsyncPrintManager whose executor runs the CUPS calls
+            interval: How often to pull new events (seconds)
+            lease_duration: Subscription lease, renewed at half-life (seconds)
+            fallback_interval: How often the job tracker still polls as a safety net (seconds)
+        """
+        self.manager = manager
+        self.interval = interval
+        self.lease_duration = lease_duration
+        self.fallback_interval = fallback_interval
+        self.logger = logging.getLogger(__name__)
+        
+        self.subscription_id: Optional[int] = None
+        self.healthy = False
+        self._next_sequence = 1
+        self._lease_renew_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self) -> bool:
+        """Create the subscription and start pulling events"""
+        try:
+            await self._subscribe()
+        except Exception as e:
+            self.logger.warning(f"CUPS notifications unavailable, falling back to polling: {e}")
+            return False
+        if self.subscription_id is None:
+            self.logger.info("Printer does not deliver notifications, job monitoring stays on polling")
+            return False
+        
+        self._task = asyncio.create_task(self._run())
+        return True
+    
+    async def stop(self) -> None:
+        """Stop pulling events and cancel the subscription"""
+        self.healthy = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        
+        if self.subscription_id is not None:
+            subscription_id = self.subscription_id
+            await self.manager._run(lambda manager: manager.cancel_subscription(subscription_id))
+            self.subscription_id = None
+    
+    async def _subscribe(self) -> None:
+        """Create a fresh subscription and reset the sequence counter"""
+        lease = self.lease_duration
+        self.subscription_id = await self.manager._run(
+            lambda manager: manager.create_subscription(self.EVENTS, lease)
+        )
+        self._next_sequence = 1
+        self._lease_renew_at = time.monotonic() + lease / 2
+        self.healthy = True
+    
+    async def _run(self) -> None:
+        """Pull and dispatch events until stopped"""
+        retry_delay = self.interval
+        
+        while True:
+            try:
+                if time.monotonic() >= self._lease_renew_at:
+                    subscription_id, lease = self.subscription_id, self.lease_duration
+                    await self.manager._run(
+                        lambda manager: manager.renew_subscription(subscription_id, lease)
+                    )
+                    self._lease_renew_at = time.monotonic() + lease / 2
+                
+                subscription_id, sequence = self.subscription_id, self._next_sequence
+                notifications = await self.manager._run(
+                    lambda manager: manager.get_notifications(subscription_id, sequence)
+                )
+                
+                for event in notifications.get('events', []):
+                    self._next_sequence = max(
+                        self._next_sequence,
+                        event.get('notify-sequence-number', 0) + 1
+                    )
+                    await self._dispatch(event)
+                
+                self.healthy = True
+                retry_delay = self.interval
+                await asyncio.sleep(self.interval)
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Waiters fall back to polling while the subscription is broken
+                self.healthy = False
+                self.logger.error(f"Error reading CUPS notifications: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.fallback_interval)
+                
+                try:
+                    await self._subscribe()
+                except Exception as e:
+                    self.logger.error(f"Failed to recreate CUPS subscription: {e}")
+    
+    async def _dispatch(self, event: Dict[str, Any]) -> None:
+        """Resolve the tracked job for an event that reports a terminal state"""
+        job_id = event.get('notify-job-id')
+        state = event.get('job-state')
+        name = event.get('notify-subscribed-event')
+        
+        if name and name.startswith('printer-'):
+            self.manager.printer_cache.apply_event(event)
+            return
+        
+        if job_id is None:
+            return
+        
+        if name == 'job-stopped':
+            self.logger.warning(f"Job {job_id} stopped: {event.get('job-state-reasons')}")
+            self.manager.printer_cache.invalidate()
+        
+        if name != 'job-completed' and state not in self.TERMINAL_STATES:
+            # Progress only (e.g. the job started printing); let status callbacks see it
+            try:
+                self.manager.tracker.update(job_id, PrintJobStatus(state), dict(event))
+            except ValueError:
+                pass
+            return
+        
+        if self.manager.tracker.is_finished(job_id):
+            return
+        
+        # Events carry only a few job attributes; fetch the final set once
+        try:
+            job_info = await self.manager._run(lambda manager: manager.get_job_attributes(job_id))
+        except Exception as e:
+            self.logger.warning(f"Could not read final attributes of job {job_id}: {e}")
+            job_info = dict(event)
+        
+        try:
+            status = PrintJobStatus(job_info.get('job-state', state))
+        except ValueError:
+            status = PrintJobStatus.ABORTED
+        
+        self.manager.tracker.resolve(job_id, status, job_info)
+
 # Example usage and test functions
 def test_print_manager():
     """Test function for the print manager"""
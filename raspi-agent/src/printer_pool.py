@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Printer Pool for Raspberry Pi Print Agent
+Routes print jobs across several CUPS printers by capability and load
+"""
+
+import cups
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Tuple, List, Callable, AsyncIterator
+
+from print_manager import AsyncPrintManager, PrintOptions, PrintJobStatus, PrinterCache
+from scheduler import DEFAULT_PPM
+
+# IPP printer-state values
+PRINTER_STOPPED = 5
+
+@dataclass(eq=False)
+class PoolPrinter:
+    """One printer of the pool and what the agent currently has queued on it"""
+    name: str
+    manager: AsyncPrintManager
+    queued_pages: int = 0
+    active_jobs: int = 0
+    consecutive_failures: int = 0
+    quarantined_until: float = 0.0
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        'jobs_submitted': 0,
+        'jobs_completed': 0,
+        'jobs_failed': 0,
+        'pages_submitted': 0,
+        'pages_printed': 0,
+        'submit_errors': 0,
+        'quarantines': 0
+    })
+    
+    @property
+    def cache(self) -> PrinterCache:
+        """The printer's cached state and capabilities"""
+        return self.manager.printer_cache
+    
+    @property
+    def available(self) -> bool:
+        """Not quarantined, accepting jobs and not stopped"""
+        attributes = self.cache.attributes
+        return (
+            time.monotonic() >= self.quarantined_until
+            and attributes.get('printer-is-accepting-jobs', True) is not False
+            and attributes.get('printer-state') != PRINTER_STOPPED
+        )
+    
+    def load_after(self, pages: int) -> float:
+        """Minutes of printing queued on this printer if a job of `pages` were added"""
+        return (self.queued_pages + pages) / (self.cache.capabilities.pages_per_minute or DEFAULT_PPM)
+
+class PrinterPool:
+    """
+    Several printers behind the AsyncPrintManager interface
+    
+    Each printer keeps its own AsyncPrintManager (worker threads, job
+    tracker and event subscription). A job goes to the least loaded printer
+    that supports its colour mode, duplex setting and paper size, where
+    load is the pages the agent has submitted there and not yet seen
+    finish, divided by the printer's speed. Printers that are stopped, not
+    accepting jobs or failing submissions are skipped; after
+    failure_threshold consecutive submit errors a printer is quarantined
+    for quarantine_seconds (doubling on each repeat) and then tried again.
+    Printer state and capabilities come from each manager's PrinterCache.
+    """
+    
+    def __init__(self, managers: Dict[str, AsyncPrintManager], failure_threshold: int = 3,
+                 quarantine_seconds: float = 60.0, max_quarantine_seconds: float = 900.0):
+        """
+        Initialize the pool
+        
+        Args:
+            managers: Printer name -> print manager, in order of preference
+            failure_threshold: Consecutive submit errors before a printer is quarantined
+            quarantine_seconds: First quarantine period (seconds)
+            max_quarantine_seconds: Cap on the quarantine period (seconds)
+        """
+        self.printers = [PoolPrinter(name, manager) for name, manager in managers.items()]
+        self.failure_threshold = failure_threshold
+        self.quarantine_seconds = quarantine_seconds
+        self.max_quarantine_seconds = max_quarantine_seconds
+        self.logger = logging.getLogger(__name__)
+        
+        self._job_printers: Dict[int, PoolPrinter] = {}
+        self._job_pages: Dict[int, int] = {}
+    
+    @property
+    def printer_name(self) -> str:
+        """Name of the first (preferred) printer"""
+        return self.printers[0].name
+    
+    @property
+    def pages_per_minute(self) -> Optional[float]:
+        """Speed of the fastest printer that reports one"""
+        speeds = [printer.cache.capabilities.pages_per_minute for printer in self.printers]
+        return max((speed for speed in speeds if speed), default=None)
+    
+    @property
+    def polls(self) -> int:
+        """Batched job status polls across all printers"""
+        return sum(printer.manager.tracker.polls for printer in self.printers if hasattr(printer.manager, 'tracker'))
+    
+    def _printer(self, name: str) -> Optional[PoolPrinter]:
+        """Look up a printer by name"""
+        for printer in self.printers:
+            if printer.name == name:
+                return printer
+        return None
+    
+    async def connect(self) -> None:
+        """Connect every printer; fails only if none of them can be reached"""
+        connected = 0
+        for printer in self.printers:
+            try:
+                await printer.manager.connect()
+                self.logger.info(f"Printer {printer.name} capabilities: {printer.cache.capabilities}")
+                connected += 1
+            except Exception as e:
+                self.logger.error(f"Printer {printer.name} unavailable: {e}")
+                # Quarantine straight away rather than after failure_threshold jobs
+                printer.consecutive_failures = self.failure_threshold - 1
+                self._record_failure(printer)
+        
+        if not connected:
+            raise RuntimeError(f"None of the printers {[p.name for p in self.printers]} are available")
+        self.logger.info(f"Printer pool ready: {connected}/{len(self.printers)} printer(s)")
+    
+    async def enable_notifications(self, interval: float = 0.5) -> bool:
+        """Enable CUPS notifications on every printer; True if any printer has them"""
+        results = await asyncio.gather(
+            *(printer.manager.enable_notifications(interval) for printer in self.printers),
+            return_exceptions=True
+        )
+        return any(result is True for result in results)
+    
+    async def _refresh_stale(self) -> None:
+        """Re-read the state of printers whose cached attributes have expired"""
+        now = time.monotonic()
+        stale = [
+            printer for printer in self.printers
+            if not printer.cache.fresh and now >= printer.quarantined_until
+        ]
+        results = await asyncio.gather(*(printer.cache.refresh() for printer in stale), return_exceptions=True)
+        for printer, result in zip(stale, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"Could not refresh printer {printer.name}: {result}")
+                self._record_failure(printer)
+    
+    async def candidates(self, print_options: PrintOptions, pages: int = 1) -> List[PoolPrinter]:
+        """
+        Printers to try for a job, best first
+        
+        Capable, available printers come first, least loaded first. If no
+        available printer has the capability the job asks for it goes to
+        the other available printers (CUPS will substitute, e.g. print
+        colour in mono) rather than failing. Quarantined printers are the
+        last resort.
+        """
+        await self._refresh_stale()
+        available = [printer for printer in self.printers if printer.available]
+        capable = [printer for printer in available if printer.cache.capabilities.supports(print_options)]
+        if available and not capable:
+            self.logger.warning(f"No available printer supports {print_options}, using the closest match")
+            capable = available
+        
+        ordered = sorted(capable, key=lambda printer: printer.load_after(pages))
+        ordered += sorted(
+            (printer for printer in self.printers if printer not in ordered),
+            key=lambda printer: printer.quarantined_until
+        )
+        return ordered
+    
+    def _record_submission(self, printer: PoolPrinter, job_id: int, pages: int) -> None:
+        """Count a job against the printer it was submitted to"""
+        printer.consecutive_failures = 0
+        printer.quarantined_until = 0.0
+        printer.queued_pages += pages
+        printer.active_jobs += 1
+        printer.stats['jobs_submitted'] += 1
+        printer.stats['pages_submitted'] += pages
+        self._job_printers[job_id] = printer
+        self._job_pages[job_id] = pages
+        self.logger.info(f"Job {job_id} routed to {printer.name} ({printer.queued_pages} page(s) queued there)")
+    
+    def _record_failure(self, printer: PoolPrinter) -> None:
+        """Count a submit error and quarantine the printer once it keeps failing"""
+        printer.consecutive_failures += 1
+        printer.stats['submit_errors'] += 1
+        if printer.consecutive_failures < self.failure_threshold:
+            return
+        
+        repeats = printer.consecutive_failures - self.failure_threshold
+        period = min(self.quarantine_seconds * (2 ** repeats), self.max_quarantine_seconds)
+        printer.quarantined_until = time.monotonic() + period
+        printer.stats['quarantines'] += 1
+        self.logger.error(f"Printer {printer.name} failing, skipping it for {period:.0f}s")
+    
+    async def print_file(self, file_path: str, job_title: str, print_options: PrintOptions,
+                         pages: int = 1, rendered: Optional[Dict[str, str]] = None,
+                         printer_name: Optional[str] = None) -> int:
+        """
+        Submit a print job to the best printer, falling back to the next on error
+        
+        Args:
+            file_path: Path to the file to print
+            job_title: Title for the print job
+            print_options: Print configuration options
+            pages: Estimated pages (copies included), used to balance load
+            rendered: Printer name -> the document pre-rendered for that printer,
+                      submitted raw instead of file_path if the job goes there
+            printer_name: Submit to this printer only (keeps the parts of a split job together)
+        
+        Returns:
+            int: CUPS job ID
+        """
+        rendered = rendered or {}
+        candidates = await self.candidates(print_options, pages)
+        if printer_name:
+            candidates = [printer for printer in candidates if printer.name == printer_name]
+        last_error: Optional[Exception] = None
+        for printer in candidates:
+            path = rendered.get(printer.name, file_path)
+            try:
+                job_id = await printer.manager.print_file(path, job_title, print_options, raw=path != file_path)
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Submitting to {printer.name} failed: {e}")
+                self._record_failure(printer)
+                last_error = e
+                continue
+            self._record_submission(printer, job_id, pages)
+            return job_id
+        raise last_error or RuntimeError("No printers configured")
+    
+    async def print_files(self, file_paths: List[str], job_title: str, print_options: PrintOptions,
+                          pages: int = 1) -> int:
+        """Submit several files as one job on the best printer (see print_file)"""
+        last_error: Optional[Exception] = None
+        for printer in await self.candidates(print_options, pages):
+            try:
+                job_id = await printer.manager.print_files(file_paths, job_title, print_options)
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Submitting to {printer.name} failed: {e}")
+                self._record_failure(printer)
+                last_error = e
+                continue
+            self._record_submission(printer, job_id, pages)
+            return job_id
+        raise last_error or RuntimeError("No printers configured")
+    
+    async def print_stream(self, chunks: AsyncIterator[bytes], job_title: str, print_options: PrintOptions,
+                           document_format: str = 'application/pdf', pages: int = 1) -> int:
+        """
+        Stream a document into a new job on the best printer
+        
+        A stream can only be consumed once, so there is no fallback to
+        another printer; the error is raised. Only CUPS errors count against
+        the printer: a download that fails mid-stream says nothing about it.
+        """
+        printer = (await self.candidates(print_options, pages))[0]
+        try:
+            job_id = await printer.manager.print_stream(chunks, job_title, print_options, document_format)
+        except (cups.IPPError, cups.HTTPError):
+            self._record_failure(printer)
+            raise
+        self._record_submission(printer, job_id, pages)
+        return job_id
+    
+    async def _owner(self, job_id: int) -> PoolPrinter:
+        """
+        Printer a job was submitted to
+        
+        Jobs submitted before a restart are not in the routing table; CUPS
+        job IDs are unique per server, so the job's printer URI says where
+        it went.
+        """
+        printer = self._job_printers.get(job_id)
+        if printer is not None:
+            return printer
+        
+        for candidate in self.printers:
+            try:
+                attributes = await candidate.manager.get_job_attributes(job_id)
+            except Exception:
+                continue
+            uri = attributes.get('job-printer-uri', '')
+            printer = self._printer(uri.rsplit('/', 1)[-1]) if uri else candidate
+            if printer is not None:
+                self._job_printers[job_id] = printer
+                return printer
+        return self.printers[0]
+    
+    def job_printer(self, job_id: int) -> Optional[str]:
+        """Name of the printer a job was routed to, if known"""
+        printer = self._job_printers.get(job_id)
+        return printer.name if printer else None
+    
+    async def wait_for_completion(self, job_id: int, timeout: Optional[float] = None,
+                                  on_status: Optional[Callable[[int, PrintJobStatus, Dict[str, Any]], None]] = None
+                                  ) -> Tuple[bool, Dict[str, Any]]:
+        """Wait for a job on whichever printer it was routed to (see AsyncPrintManager)"""
+        printer = await self._owner(job_id)
+        try:
+            success, job_info = await printer.manager.wait_for_completion(job_id, timeout=timeout, on_status=on_status)
+        finally:
+            if job_id in self._job_pages:
+                printer.queued_pages -= self._job_pages.pop(job_id)
+                printer.active_jobs -= 1
+        
+        if success:
+            printer.stats['jobs_completed'] += 1
+            printer.stats['pages_printed'] += job_info.get('job-media-sheets-completed', 0)
+        else:
+            printer.stats['jobs_failed'] += 1
+        return success, job_info
+    
+    async def cancel_job(self, job_id: int) -> bool:
+        """Cancel a job on the printer it was routed to"""
+        printer = await self._owner(job_id)
+        cancelled = await printer.manager.cancel_job(job_id)
+        if cancelled and job_id in self._job_pages:
+            # Nobody will wait for it, so take it off the printer's load here
+            printer.queued_pages -= self._job_pages.pop(job_id)
+            printer.active_jobs -= 1
+        return cancelled
+    
+    async def get_printer_info(self) -> Dict[str, Any]:
+        """Cached information about the preferred printer (see PrinterCache.snapshot)"""
+        return self.printers[0].cache.snapshot()
+    
+    async def close(self) -> None:
+        """Close every printer's print manager"""
+        await asyncio.gather(*(printer.manager.close() for printer in self.printers), return_exceptions=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-printer statistics and load"""
+        now = time.monotonic()
+        return {
+            printer.name: {
+                **printer.stats,
+                'available': printer.available,
+                'printer_state': printer.cache.attributes.get('printer-state'),
+                'printer_state_reasons': printer.cache.attributes.get('printer-state-reasons'),
+                'cache': printer.cache.get_stats(),
+                'queued_pages': printer.queued_pages,
+                'active_jobs': printer.active_jobs,
+                'quarantined_for_seconds': max(printer.quarantined_until - now, 0.0)
+            }
+            for printer in self.printers
+        }
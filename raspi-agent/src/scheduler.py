@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Job Scheduler for Raspberry Pi Print Agent
+Orders fetched print jobs by estimated print time
+"""
+
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, Callable
+
+POLICIES = ('fifo', 'sjf', 'aged-sjf')
+DEFAULT_PPM = 20.0  # Printer speed assumed for scheduling when the printer does not report one
+
+# Relative cost of a page, matching the virtual printer's model
+DUPLEX_FACTOR = 1.6
+COLOR_FACTOR = 1.3
+JOB_OVERHEAD_SECONDS = 5.0  # Spooling, filters and paper path per job
+
+def estimate_print_seconds(job_data: Dict[str, Any], ppm: float) -> float:
+    """
+    Estimate how long a job occupies a printer
+    
+    Args:
+        job_data: Job details from the backend (totalPages, copies, doubleSided, colorMode)
+        ppm: Printer speed in pages per minute
+    
+    Returns:
+        float: Estimated seconds from submission to the last sheet
+    """
+    pages = max(int(job_data.get('totalPages') or 1), 1) * max(int(job_data.get('copies') or 1), 1)
+    seconds = pages * 60.0 / ppm
+    if job_data.get('doubleSided'):
+        seconds *= DUPLEX_FACTOR
+    if str(job_data.get('colorMode', '')).lower() in ('color', 'colour'):
+        seconds *= COLOR_FACTOR
+    return JOB_OVERHEAD_SECONDS + seconds
+
+class ScheduledQueue(asyncio.Queue):
+    """
+    Bounded asyncio queue that hands out jobs by scheduling policy
+    
+    fifo:     arrival order
+    sjf:      shortest estimated print time first
+    aged-sjf: shortest first, but every second a job has waited since
+              admission takes `aging` seconds off its estimate, so a large
+              job cannot be overtaken forever
+    
+    Items are print job contexts with `estimated_seconds` (None sorts as
+    unknown, behind known estimates of equal age) and `enqueued_at`
+    (time.monotonic()). Queues here hold tens of jobs, so the choice is a
+    linear scan at get time, which keeps aged priorities exact.
+    
+    Only the _init/_put/_get hooks asyncio.Queue provides for subclasses
+    are overridden; take() removes items through get_nowait(), so waking
+    blocked putters stays asyncio's job.
+    """
+    
+    def __init__(self, maxsize: int = 0, policy: str = 'aged-sjf', aging: float = 1.0):
+        """
+        Initialize the queue
+        
+        Args:
+            maxsize: Capacity (0 for unbounded)
+            policy: One of POLICIES
+            aging: Seconds of priority gained per second waited (aged-sjf)
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduler policy '{policy}', expected one of {POLICIES}")
+        self.policy = policy
+        self.aging = aging
+        self._arrival = asyncio.Event()
+        self._selected: Optional[Any] = None  # Item the next _get() hands out, set by take()
+        super().__init__(maxsize)
+    
+    def _init(self, maxsize):
+        self._queue = []
+    
+    def _put(self, item):
+        self._queue.append(item)
+        self._arrival.set()
+    
+    def _get(self):
+        if self._selected is not None:
+            item, self._selected = self._selected, None
+            self._queue.remove(item)
+            return item
+        if self.policy == 'fifo':
+            return self._queue.pop(0)
+        key = self._sort_key(time.monotonic())
+        return self._queue.pop(min(range(len(self._queue)), key=key))
+    
+    def _sort_key(self, now: float) -> Callable[[int], tuple]:
+        """Key for the item at an index: lower runs first, ties by arrival"""
+        def key(index: int) -> tuple:
+            item = self._queue[index]
+            estimate = item.estimated_seconds
+            if estimate is None:
+                estimate = float('inf')
+            if self.policy == 'aged-sjf':
+                estimate -= self.aging * (now - item.enqueued_at)
+            return (estimate, index)
+        return key
+    
+    def scheduled(self) -> List[Any]:
+        """Queued items in the order they would be handed out right now"""
+        if self.policy == 'fifo':
+            return list(self._queue)
+        key = self._sort_key(time.monotonic())
+        return [self._queue[index] for index in sorted(range(len(self._queue)), key=key)]
+
+    async def take(self, predicate: Callable[[Any], bool], limit: int, timeout: float = 0.0) -> List[Any]:
+        """
+        Remove up to `limit` queued items that match a predicate
+        
+        Matching items are taken in scheduled order; if fewer than `limit`
+        are queued, items arriving within `timeout` seconds are taken too.
+        As with get(), call task_done() for every item taken.
+        
+        Args:
+            predicate: Selects the items to take
+            limit: Maximum number of items
+            timeout: Seconds to wait for further matching items
+        
+        Returns:
+            List of the items taken (possibly empty)
+        """
+        taken: List[Any] = []
+        deadline = time.monotonic() + timeout
+        while True:
+            self._arrival.clear()
+            for item in self.scheduled():
+                if len(taken) >= limit:
+                    break
+                if predicate(item):
+                    self._selected = item
+                    taken.append(self.get_nowait())  # Makes room for a blocked put()
+            
+            remaining = deadline - time.monotonic()
+            if len(taken) >= limit or remaining <= 0:
+                return taken
+            try:
+                await asyncio.wait_for(self._arrival.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+def estimated_waits(ahead: List[Any], queued: List[Any], servers: int) -> Dict[str, Optional[float]]:
+    """
+    Estimated seconds until each queued job starts printing
+    
+    Args:
+        ahead: Jobs already being printed (with estimated_seconds and print_started_at)
+        queued: Waiting jobs in scheduled order
+        servers: Printers working through the queue in parallel
+    
+    Returns:
+        Dict of upid -> seconds (None once a job without an estimate is ahead)
+    """
+    now = time.monotonic()
+    backlog = sum(
+        max((job.estimated_seconds or 0.0) - (now - (job.print_started_at or now)), 0.0)
+        for job in ahead
+    )
+    waits: Dict[str, Optional[float]] = {}
+    for job in queued:
+        waits[job.upid] = backlog / max(servers, 1) if backlog is not None else None
+        if backlog is None or job.estimated_seconds is None:
+            backlog = None
+        else:
+            backlog += job.estimated_seconds
+    return waits
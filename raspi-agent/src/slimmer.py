@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+PDF Slimmer for Raspberry Pi Print Agent
+Downsamples and desaturates document images to match the requested print quality
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, List, Tuple
+
+from print_manager import PrintOptions
+
+# Image resolution worth sending per print quality; None keeps the original
+QUALITY_DPI = {
+    'draft': 150,
+    'normal': 300,
+    'high': None
+}
+
+@dataclass
+class SlimResult:
+    """Outcome of slimming one document"""
+    upid: str
+    bytes_in: int
+    bytes_out: int
+    seconds: float  # Spent slimming, off the printer's critical path
+    seconds_saved: float  # Estimated printer ingest time saved
+
+class PdfSlimmer:
+    """
+    Rewrites PDFs with Ghostscript so the printer receives no more image
+    data than the job can use
+    
+    Phone scans are often 600 dpi colour images printed as draft
+    monochrome, and the printer then spends longer ingesting the document
+    than printing it. Images are downsampled to the resolution of the
+    requested print quality and converted to grayscale for monochrome jobs.
+    Conversions run as separate low-priority processes, a fixed number at
+    a time; the output is used only if it is meaningfully smaller.
+    """
+    
+    def __init__(self, workers: int = 2, min_bytes: int = 256 * 1024, min_savings: float = 0.1,
+                 timeout: float = 120.0, ingest_bytes_per_second: float = 1024 * 1024):
+        """
+        Initialize the slimmer
+        
+        Args:
+            workers: Concurrent conversions
+            min_bytes: Smaller documents are left alone
+            min_savings: Fraction of the size the output must save to be used
+            timeout: Seconds before a conversion is abandoned
+            ingest_bytes_per_second: Rate at which the printer takes in data,
+                                     used to estimate the time saved
+        """
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self.min_savings = min_savings
+        self.timeout = timeout
+        self.ingest_bytes_per_second = ingest_bytes_per_second
+        self.logger = logging.getLogger(__name__)
+        
+        self._slots = asyncio.Semaphore(workers)
+        self._nice = shutil.which('nice')
+        self.recent: deque = deque(maxlen=20)  # Latest SlimResults
+        
+        self.stats = {
+            'slimmed': 0,
+            'skipped': 0,  # Too small, or the output was not smaller
+            'failures': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'seconds_total': 0.0,
+            'seconds_saved_total': 0.0
+        }
+    
+    @staticmethod
+    def available() -> bool:
+        """True if Ghostscript is installed"""
+        return shutil.which('gs') is not None
+    
+    @staticmethod
+    def settings(print_options: PrintOptions) -> Tuple[Optional[int], bool]:
+        """Image resolution (None to keep it) and whether to convert to grayscale"""
+        dpi = QUALITY_DPI.get(print_options.print_quality.lower(), QUALITY_DPI['normal'])
+        grayscale = print_options.color_mode.lower() not in ('color', 'colour')
+        return dpi, grayscale
+    
+    def command(self, source: str, output: str, dpi: Optional[int], grayscale: bool) -> List[str]:
+        """Ghostscript command line rewriting a PDF"""
+        command = [
+            'gs', '-q', '-dBATCH', '-dNOPAUSE', '-dSAFER', '-sDEVICE=pdfwrite',
+            '-dCompatibilityLevel=1.5', '-dAutoRotatePages=/None', '-dDetectDuplicateImages=true'
+        ]
+        if dpi:
+            command += [
+                '-dDownsampleColorImages=true', f'-dColorImageResolution={dpi}',
+                '-dDownsampleGrayImages=true', f'-dGrayImageResolution={dpi}',
+                '-dDownsampleMonoImages=true', f'-dMonoImageResolution={dpi * 2}'  # Line art needs more
+            ]
+        if grayscale:
+            command += ['-sColorConversionStrategy=Gray', '-dProcessColorModel=/DeviceGray']
+        return command + [f'-sOutputFile={output}', source]
+    
+    async def slim(self, upid: str, file_path: str, print_options: PrintOptions) -> Optional[str]:
+        """
+        Slim a document for a job
+        
+        Args:
+            upid: Job the document belongs to (for the per-job record)
+            file_path: PDF to slim
+            print_options: Options the job prints with
+        
+        Returns:
+            Path of a new, smaller temporary PDF (the caller owns it) or None
+            if the original should be printed
+        """
+        dpi, grayscale = self.settings(print_options)
+        bytes_in = os.path.getsize(file_path)
+        if (dpi is None and not grayscale) or bytes_in < self.min_bytes:
+            self.stats['skipped'] += 1
+            return None
+        
+        async with self._slots:
+            started_at = time.monotonic()
+            fd, output = tempfile.mkstemp(suffix='.pdf', prefix='print_job_')
+            os.close(fd)
+            command = self.command(file_path, output, dpi, grayscale)
+            if self._nice:
+                command = [self._nice, '-n', '10'] + command
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    process.kill()
+                    await process.wait()
+                    raise
+                if process.returncode != 0:
+                    message = stderr.decode(errors='replace').strip().splitlines()[-1:] or ['no output']
+                    raise RuntimeError(f"gs exited with status {process.returncode}: {message[0]}")
+            except asyncio.CancelledError:
+                os.unlink(output)
+                raise
+            except Exception as e:
+                os.unlink(output)
+                self.stats['failures'] += 1
+                self.logger.warning(f"Slimming {file_path} failed, printing the original: {e!r}")
+                return None
+        
+        seconds = time.monotonic() - started_at
+        bytes_out = os.path.getsize(output)
+        self.stats['seconds_total'] += seconds
+        if not bytes_out or bytes_out > bytes_in * (1 - self.min_savings):
+            os.unlink(output)
+            self.stats['skipped'] += 1
+            self.logger.debug(f"Slimming {file_path} saved too little ({bytes_in} -> {bytes_out} bytes)")
+            return None
+        
+        result = SlimResult(upid, bytes_in, bytes_out, seconds,
+                            (bytes_in - bytes_out) / self.ingest_bytes_per_second)
+        self.recent.append(result)
+        self.stats['slimmed'] += 1
+        self.stats['bytes_in'] += bytes_in
+        self.stats['bytes_out'] += bytes_out
+        self.stats['seconds_saved_total'] += result.seconds_saved
+        self.logger.info(f"Slimmed document of UPID {upid}: {bytes_in} -> {bytes_out} bytes in {seconds:.1f}s "
+                         f"(~{result.seconds_saved:.1f}s less for the printer to ingest)")
+        return output
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Slimming statistics, with the most recent slimmed jobs"""
+        return {
+            **self.stats,
+            'bytes_saved': self.stats['bytes_in'] - self.stats['bytes_out'],
+            'workers': self.workers,
+            'recent_jobs': [asdict(result) for result in self.recent]
+        }
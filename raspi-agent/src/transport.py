@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+HTTP Transport for Raspberry Pi Print Agent
+Separate, pre-warmed connection pools for backend API and object storage traffic
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, Any, Optional, List
+
+import aiohttp
+
+WARMUP = SimpleNamespace(warmup=True)  # trace_request_ctx of warm-up requests
+
+class HttpClient:
+    """
+    A pooled aiohttp session with its own limits and timeouts
+    
+    Timeouts are per phase: connect covers DNS, TCP and TLS, read is the
+    longest silence on an open socket, and idle connections are kept alive
+    for `keepalive` seconds. Resolved addresses are cached for `dns_ttl`
+    seconds. The origins the client talks to are remembered (most recent
+    first), so warm() can open a connection to each of them before the next
+    real request needs one.
+    """
+    
+    MAX_ORIGINS = 8
+    
+    def __init__(self, name: str, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 total_timeout: Optional[float] = None, limit: int = 32, limit_per_host: int = 4,
+                 keepalive: float = 60.0, dns_ttl: int = 300):
+        """
+        Initialize the client (the session is created by start())
+        
+        Args:
+            name: Name used in logs and statistics
+            connect_timeout: Seconds to resolve, connect and complete the TLS handshake
+            read_timeout: Seconds a socket may stay silent while a response is read
+            total_timeout: Cap on a whole request (None for no cap, e.g. large downloads)
+            limit: Connections in the pool
+            limit_per_host: Connections to any one host
+            keepalive: Seconds an idle connection is kept open for reuse
+            dns_ttl: Seconds resolved addresses are cached
+        """
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.logger = logging.getLogger(__name__)
+        
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.origins: 'OrderedDict[str, None]' = OrderedDict()
+        self.last_used = time.monotonic()
+        self.last_warmed = 0.0
+        
+        self.stats = {
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'dns_lookups': 0,
+            'dns_cache_hits': 0,
+            'warmups': 0,
+            'warmup_failures': 0
+        }
+    
+    def start(self) -> None:
+        """Create the session (inside the running event loop)"""
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_create_end.append(self._count('connections_opened'))
+        trace.on_connection_reuseconn.append(self._count('connections_reused'))
+        trace.on_dns_resolvehost_end.append(self._count('dns_lookups'))
+        trace.on_dns_cache_hit.append(self._count('dns_cache_hits'))
+        
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.total_timeout, sock_connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace])
+    
+    def _count(self, stat: str):
+        """Trace callback incrementing a statistic"""
+        async def callback(session, context, params):
+            self.stats[stat] += 1
+        return callback
+    
+    async def _on_request_start(self, session, context, params):
+        """Remember the origin of every real request and when the client was last used"""
+        if context.trace_request_ctx is WARMUP:
+            return
+        self.stats['requests'] += 1
+        self.last_used = time.monotonic()
+        self.add_origin(str(params.url.origin()))
+    
+    def add_origin(self, origin: str) -> None:
+        """Mark an origin (scheme://host[:port]) for warming"""
+        self.origins[origin] = None
+        self.origins.move_to_end(origin, last=False)
+        while len(self.origins) > self.MAX_ORIGINS:
+            self.origins.popitem()
+    
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since the last real request"""
+        return time.monotonic() - self.last_used
+    
+    async def warm(self) -> int:
+        """
+        Open a connection to every known origin and leave it in the pool
+        
+        Returns:
+            int: Origins reached (any HTTP status counts; the connection is what matters)
+        """
+        self.last_warmed = time.monotonic()
+        results = await asyncio.gather(*(self._warm_origin(origin) for origin in list(self.origins)))
+        return sum(results)
+    
+    async def _warm_origin(self, origin: str) -> bool:
+        """HEAD an origin so its DNS, TCP and TLS setup is done ahead of time"""
+        timeout = aiohttp.ClientTimeout(total=self.connect_timeout + self.read_timeout)
+        try:
+            async with self.session.head(origin + '/', allow_redirects=False, timeout=timeout,
+                                         trace_request_ctx=WARMUP):
+                pass
+        except Exception as e:
+            self.stats['warmup_failures'] += 1
+            self.logger.debug(f"Warming {self.name} connection to {origin} failed: {e!r}")
+            return False
+        self.stats['warmups'] += 1
+        return True
+    
+    async def close(self) -> None:
+        """Close the session and its connections"""
+        if self.session:
+            await self.session.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Client statistics"""
+        opened, reused = self.stats['connections_opened'], self.stats['connections_reused']
+        return {
+            **self.stats,
+            'connection_reuse_ratio': reused / (opened + reused) if opened + reused else 0.0,
+            'idle_seconds': self.idle_seconds,
+            'origins': list(self.origins)
+        }
+
+class Transport:
+    """
+    HTTP clients of the agent: one for the backend API, one for object storage
+    
+    Backend calls are small and latency-sensitive while storage downloads
+    move megabytes over several parallel range requests, so each gets its
+    own connection pool and timeouts; a burst of downloads cannot hold up a
+    job fetch or a report. The backend is warmed at startup, and any client
+    that has been idle for `warm_interval` seconds is warmed again, so the
+    first job after a quiet spell finds open connections instead of paying
+    for DNS, TCP and TLS handshakes.
+    """
+    
+    def __init__(self, backend: HttpClient, storage: HttpClient, warm_interval: float = 30.0):
+        """
+        Initialize the transport
+        
+        Args:
+            backend: Client for the backend API
+            storage: Client for document downloads
+            warm_interval: Idle seconds after which a client's connections are
+                           warmed again (keep it below the keep-alive time); 0 disables
+        """
+        self.backend = backend
+        self.storage = storage
+        self.warm_interval = warm_interval
+        self.logger = logging.getLogger(__name__)
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def clients(self) -> List[HttpClient]:
+        """Both clients"""
+        return [self.backend, self.storage]
+    
+    async def start(self, backend_url: str) -> None:
+        """Create the sessions and warm the backend connection"""
+        for client in self.clients:
+            client.start()
+        self.backend.add_origin(backend_url.rstrip('/'))
+        
+        started_at = time.monotonic()
+        if await self.backend.warm():
+            self.logger.info(f"Backend connection warmed in {(time.monotonic() - started_at) * 1000:.0f}ms")
+        if self.warm_interval > 0:
+            self._task = asyncio.create_task(self._keep_warm())
+    
+    async def _keep_warm(self) -> None:
+        """Re-warm clients that have gone quiet"""
+        while True:
+            await asyncio.sleep(self.warm_interval / 2)
+            for client in self.clients:
+                quiet = time.monotonic() - max(client.last_used, client.last_warmed)
+                if client.origins and quiet >= self.warm_interval:
+                    await client.warm()
+    
+    async def close(self) -> None:
+        """Stop warming and close both clients"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for client in self.clients:
+            await client.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistics per client"""
+        return {client.name: client.get_stats() for client in self.clients}
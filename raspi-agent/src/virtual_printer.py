@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Virtual Printer for Raspberry Pi Print Agent
+Simulated printer behind the PrintManager interface for capacity planning
+"""
+
+import os
+import math
+import time
+import random
+import logging
+import threading
+import itertools
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Tuple, List, Iterator, Deque, Sequence
+
+from print_manager import PrintJobStatus, PrintOptions
+from preflight import PAGE_RE
+
+DEFAULT_MEDIA = ('iso_a4_210x297mm', 'iso_a3_297x420mm', 'iso_a5_148x210mm',
+                 'na_letter_8.5x11in', 'na_legal_8.5x14in')
+
+# IPP printer-state values
+PRINTER_IDLE = 3
+PRINTER_PROCESSING = 4
+PRINTER_STOPPED = 5
+
+def count_pages(data: bytes, bytes_per_page: int) -> int:
+    """
+    Estimate the page count of a document
+    
+    Counts PDF page objects; documents without any (or not PDFs at all)
+    fall back to one page per bytes_per_page.
+    """
+    pages = len(PAGE_RE.findall(data))
+    if pages:
+        return pages
+    return max(1, math.ceil(len(data) / bytes_per_page))
+
+def selected_pages(page_ranges: Optional[str], pages: int) -> int:
+    """Pages of a document a CUPS page-ranges option (e.g. "1-4,7,10-") selects"""
+    if not page_ranges:
+        return pages
+    selected = set()
+    for part in page_ranges.split(','):
+        first, dash, last = part.strip().partition('-')
+        start = int(first) if first else 1
+        end = (int(last) if last else pages) if dash else start
+        selected.update(range(max(start, 1), min(end, pages) + 1))
+    return len(selected)
+
+@dataclass
+class _VirtualJob:
+    """A job queued on the virtual printer"""
+    job_id: int
+    title: str
+    impressions: int  # Page sides to print, copies included
+    duplex: bool
+    color: bool
+    submitted_at: float  # Simulated seconds
+    state: PrintJobStatus = PrintJobStatus.PENDING
+    impressions_done: int = 0
+    completed_at: Optional[float] = None
+    message: str = ''
+    reasons: List[str] = field(default_factory=lambda: ['none'])
+    
+    @property
+    def sheets_done(self) -> int:
+        """Sheets of paper fully printed so far"""
+        if self.duplex:
+            return math.ceil(self.impressions_done / 2)
+        return self.impressions_done
+
+class VirtualPrinter:
+    """
+    Discrete-event model of a single physical printer
+    
+    Jobs print one at a time in submission order. A printer that has been
+    idle for longer than sleep_after_seconds warms up before its first
+    page; each page then takes 60/ppm seconds, stretched for duplex and
+    colour. Paper runs out after paper_capacity sheets and each sheet can
+    jam with probability jam_rate; both stop the printer (and the current
+    job) until an operator is simulated to have fixed it, after which the
+    job resumes. The simulated clock runs speedup times faster than the
+    wall clock, so a day of traffic can be replayed in minutes.
+    
+    State is advanced lazily from whichever thread asks, so the device is
+    shared between all VirtualPrintManager instances under a lock.
+    """
+    
+    def __init__(self, name: str = 'Virtual_Printer', ppm: float = 30.0, duplex_factor: float = 1.6,
+                 color_factor: float = 1.3, warmup_seconds: float = 15.0, sleep_after_seconds: float = 300.0,
+                 job_overhead_seconds: float = 0.0,
+                 jam_rate: float = 0.0, jam_clear_seconds: float = 120.0, paper_capacity: int = 0,
+                 refill_seconds: float = 300.0, bytes_per_page: int = 100 * 1024,
+                 speedup: float = 1.0, seed: Optional[int] = None, history_size: int = 1000,
+                 color: bool = True, duplex: bool = True, media: Sequence[str] = DEFAULT_MEDIA,
+                 job_ids: Optional[Iterator[int]] = None):
+        """
+        Initialize the printer model
+        
+        Args:
+            name: Printer name reported through the PrintManager interface
+            ppm: Simplex monochrome pages per minute
+            duplex_factor: Page time multiplier for duplex jobs
+            color_factor: Page time multiplier for colour jobs
+            warmup_seconds: Warm-up before the first page after sleeping
+            sleep_after_seconds: Idle time after which the printer sleeps
+            job_overhead_seconds: Processing before the first page of every job (spooling, job start)
+            jam_rate: Probability that any one sheet jams
+            jam_clear_seconds: Time for a jam to be cleared
+            paper_capacity: Sheets in the tray (0 for unlimited)
+            refill_seconds: Time for an empty tray to be refilled
+            bytes_per_page: Page estimate for documents without PDF page objects
+            speedup: Simulated seconds per wall clock second
+            seed: Random seed for reproducible jam sequences
+            history_size: Finished jobs kept for status queries
+            color: Whether the printer reports colour support
+            duplex: Whether the printer reports duplex support
+            media: Supported media (PWG names)
+            job_ids: Job ID sequence, shared by printers simulating one CUPS server
+        """
+        self.name = name
+        self.ppm = ppm
+        self.duplex_factor = duplex_factor
+        self.color_factor = color_factor
+        self.warmup_seconds = warmup_seconds
+        self.sleep_after_seconds = sleep_after_seconds
+        self.job_overhead_seconds = job_overhead_seconds
+        self.jam_rate = jam_rate
+        self.jam_clear_seconds = jam_clear_seconds
+        self.paper_capacity = paper_capacity
+        self.refill_seconds = refill_seconds
+        self.bytes_per_page = bytes_per_page
+        self.speedup = speedup
+        self.history_size = history_size
+        self.color = color
+        self.duplex = duplex
+        self.media = list(media)
+        self.logger = logging.getLogger(__name__)
+        
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._epoch = time.monotonic()
+        self._job_ids = job_ids or itertools.count(1)
+        
+        self._jobs: 'OrderedDict[int, _VirtualJob]' = OrderedDict()
+        self._queue: Deque[_VirtualJob] = deque()
+        self._current: Optional[_VirtualJob] = None
+        self._phase = 'idle'  # idle, warmup, processing, printing, stopped
+        self._phase_start = 0.0
+        self._phase_end = 0.0
+        self._clock = 0.0  # Simulated time events have been processed up to
+        self._last_page_at = -math.inf  # Printer starts asleep
+        self._paper = paper_capacity
+        self._reasons = ['none']
+        
+        self.stats = {
+            'jobs_submitted': 0,
+            'jobs_completed': 0,
+            'jobs_cancelled': 0,
+            'impressions_printed': 0,
+            'sheets_printed': 0,
+            'jams': 0,
+            'paper_outs': 0,
+            'warmups': 0,
+            'busy_seconds': 0.0
+        }
+    
+    def now(self) -> float:
+        """Current simulated time (seconds since the printer was created)"""
+        return (time.monotonic() - self._epoch) * self.speedup
+    
+    def submit(self, data: bytes, title: str, print_options: PrintOptions) -> int:
+        """
+        Queue a document for printing
+        
+        Args:
+            data: Document content (used to count pages)
+            title: Job title
+            print_options: Print configuration options
+        
+        Returns:
+            int: Job ID
+        """
+        pages = selected_pages(print_options.page_ranges, count_pages(data, self.bytes_per_page))
+        with self._lock:
+            now = self.now()
+            self._advance(now)
+            job = _VirtualJob(
+                job_id=next(self._job_ids),
+                title=title,
+                impressions=pages * max(1, print_options.copies),
+                duplex=print_options.duplex,
+                color=print_options.color_mode.lower() in ('color', 'colour'),
+                submitted_at=now
+            )
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+            self.stats['jobs_submitted'] += 1
+            self._advance(now)
+        
+        self.logger.debug(f"Virtual job {job.job_id} queued: {job.impressions} impression(s)")
+        return job.job_id
+    
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a pending or printing job; False if it has already finished"""
+        with self._lock:
+            now = self.now()
+            self._advance(now)
+            job = self._jobs.get(job_id)
+            if job is None or job.completed_at is not None:
+                return False
+            
+            if job is self._current:
+                self._current = None
+                self._phase = 'idle'
+                self._reasons = ['none']
+                self._last_page_at = now
+            else:
+                self._queue.remove(job)
+            self._finish(job, PrintJobStatus.CANCELLED, now, 'Job cancelled')
+            self.stats['jobs_cancelled'] += 1
+            self._advance(now)
+            return True
+    
+    def job_status(self, job_id: int) -> Optional[Tuple[PrintJobStatus, Dict[str, Any]]]:
+        """Status and IPP-style attributes of a job, or None if unknown"""
+        with self._lock:
+            self._advance(self.now())
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return job.state, self._job_info(job)
+    
+    def jobs(self) -> Dict[int, Dict[str, Any]]:
+        """Attributes of every job the printer remembers"""
+        with self._lock:
+            self._advance(self.now())
+            return {job_id: self._job_info(job) for job_id, job in self._jobs.items()}
+    
+    def printer_info(self) -> Dict[str, Any]:
+        """Printer attributes in the shape returned by cups.getPrinters()"""
+        with self._lock:
+            self._advance(self.now())
+            if self._phase == 'stopped':
+                state = PRINTER_STOPPED
+            elif self._current is not None:
+                state = PRINTER_PROCESSING
+            else:
+                state = PRINTER_IDLE
+            return {
+                'printer-info': f'Virtual printer ({self.ppm:g} ppm, {self.speedup:g}x)',
+                'printer-make-and-model': 'Raspberry Pi Print Agent Virtual Printer',
+                'printer-state': state,
+                'printer-state-reasons': list(self._reasons),
+                'printer-state-message': self._phase if self._phase != 'idle' else '',
+                'printer-is-accepting-jobs': True,
+                'printer-uri-supported': f'ipp://localhost/printers/{self.name}',
+                'queued-job-count': len(self._queue) + (1 if self._current else 0)
+            }
+    
+    def printer_attributes(self) -> Dict[str, Any]:
+        """State and capability attributes in the shape returned by cups.getPrinterAttributes()"""
+        sides = ['one-sided']
+        if self.duplex:
+            sides += ['two-sided-long-edge', 'two-sided-short-edge']
+        return {
+            **self.printer_info(),
+            'color-supported': self.color,
+            'print-color-mode-supported': ['monochrome', 'color'] if self.color else ['monochrome'],
+            'sides-supported': sides,
+            'media-supported': list(self.media),
+            'print-quality-supported': [3, 4, 5],
+            'orientation-requested-supported': [3, 4],
+            'copies-supported': (1, 999),
+            'document-format-supported': ['application/pdf', 'application/octet-stream'],
+            'pages-per-minute': int(self.ppm)
+        }
+    
+    def _job_info(self, job: _VirtualJob) -> Dict[str, Any]:
+        """IPP-style job attributes"""
+        info = {
+            'job-id': job.job_id,
+            'job-name': job.title,
+            'job-state': job.state.value,
+            'job-state-reasons': list(job.reasons),
+            'job-state-message': job.message,
+            'job-media-sheets-completed': job.sheets_done,
+            'job-impressions-completed': job.impressions_done,
+            'job-impressions': job.impressions,
+            'job-printer-uri': f'ipp://localhost/printers/{self.name}',
+            'time-at-creation': job.submitted_at
+        }
+        if job.completed_at is not None:
+            info['time-at-completed'] = job.completed_at
+        return info
+    
+    def _page_seconds(self, job: _VirtualJob) -> float:
+        """Simulated time to print one impression of a job"""
+        if self.ppm <= 0:
+            return 0.0  # Instant printer
+        seconds = 60.0 / self.ppm
+        if job.duplex:
+            seconds *= self.duplex_factor
+        if job.color:
+            seconds *= self.color_factor
+        return seconds
+    
+    def _advance(self, now: float) -> None:
+        """Process every simulated event up to now (caller holds the lock)"""
+        while True:
+            if self._current is None:
+                if not self._queue:
+                    self._phase = 'idle'
+                    self._clock = now
+                    return
+                self._start_next()
+            
+            if self._phase_end > now:
+                if self._current is not None:
+                    self.stats['busy_seconds'] += now - max(self._clock, self._phase_start)
+                self._clock = now
+                return
+            
+            self.stats['busy_seconds'] += self._phase_end - max(self._clock, self._phase_start)
+            self._clock = self._phase_end
+            self._end_phase()
+    
+    def _start_next(self) -> None:
+        """Take the next queued job"""
+        job = self._queue.popleft()
+        start = max(self._clock, job.submitted_at)
+        self._current = job
+        job.state = PrintJobStatus.PROCESSING
+        job.reasons = ['job-printing']
+        self._clock = start
+        
+        if start - self._last_page_at > self.sleep_after_seconds and self.warmup_seconds > 0:
+            self.stats['warmups'] += 1
+            job.message = 'Warming up'
+            self._set_phase('warmup', start, self.warmup_seconds + self.job_overhead_seconds)
+        elif self.job_overhead_seconds > 0:
+            job.message = 'Processing'
+            self._set_phase('processing', start, self.job_overhead_seconds)
+        else:
+            self._next_impression(start)
+    
+    def _set_phase(self, phase: str, start: float, duration: float) -> None:
+        """Enter a timed phase of the current job"""
+        self._phase = phase
+        self._phase_start = start
+        self._phase_end = start + duration
+    
+    def _next_impression(self, at: float) -> None:
+        """Start the next impression of the current job, unless paper stops it"""
+        job = self._current
+        starts_sheet = not job.duplex or job.impressions_done % 2 == 0
+        if starts_sheet and self.paper_capacity and self._paper <= 0:
+            self.stats['paper_outs'] += 1
+            self._stop(at, 'media-empty', 'Out of paper', self.refill_seconds)
+            return
+        if starts_sheet and self.jam_rate and self._rng.random() < self.jam_rate:
+            self.stats['jams'] += 1
+            self._stop(at, 'media-jam', 'Paper jam', self.jam_clear_seconds)
+            return
+        
+        job.state = PrintJobStatus.PROCESSING
+        job.reasons = ['job-printing']
+        job.message = f'Printing page {job.impressions_done + 1} of {job.impressions}'
+        self._reasons = ['none']
+        self._set_phase('printing', at, self._page_seconds(job))
+    
+    def _stop(self, at: float, reason: str, message: str, duration: float) -> None:
+        """Stop the printer (and the job on it) until an operator intervenes"""
+        job = self._current
+        job.state = PrintJobStatus.STOPPED
+        job.reasons = ['printer-stopped']
+        job.message = message
+        self._reasons = [f'{reason}-error']
+        self.logger.debug(f"Virtual printer stopped at {at:.0f}s: {message}")
+        self._set_phase('stopped', at, duration)
+    
+    def _end_phase(self) -> None:
+        """Handle the end of the current phase at self._clock"""
+        at = self._clock
+        job = self._current
+        
+        if self._phase == 'stopped':
+            if 'media-empty-error' in self._reasons:
+                self._paper = self.paper_capacity
+            self._next_impression(at)
+            return
+        
+        if self._phase == 'printing':
+            if not job.duplex or job.impressions_done % 2 == 0:
+                self._paper -= 1
+                self.stats['sheets_printed'] += 1
+            job.impressions_done += 1
+            self.stats['impressions_printed'] += 1
+            self._last_page_at = at
+            
+            if job.impressions_done >= job.impressions:
+                self._current = None
+                self._phase = 'idle'
+                self._finish(job, PrintJobStatus.COMPLETED, at, 'Job completed')
+                self.stats['jobs_completed'] += 1
+                return
+        
+        self._next_impression(at)
+    
+    def _finish(self, job: _VirtualJob, state: PrintJobStatus, at: float, message: str) -> None:
+        """Move a job to a terminal state and trim the history"""
+        job.state = state
+        job.completed_at = at
+        job.message = message
+        job.reasons = ['job-completed-successfully' if state == PrintJobStatus.COMPLETED else 'job-canceled-by-user']
+        
+        finished = [job_id for job_id, other in self._jobs.items() if other.completed_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Simulation statistics"""
+        with self._lock:
+            now = self.now()
+            self._advance(now)
+            return {
+                **self.stats,
+                'simulated_seconds': now,
+                'utilization': self.stats['busy_seconds'] / now if now else 0.0,
+                'queued_jobs': len(self._queue) + (1 if self._current else 0),
+                'paper_remaining': self._paper if self.paper_capacity else None
+            }
+
+class VirtualPrintManager:
+    """
+    Drop-in replacement for PrintManager backed by a VirtualPrinter
+    
+    AsyncPrintManager creates one of these per worker thread exactly as it
+    does PrintManager, so the thread pool, batched job tracking and the
+    agent's pipeline all run unchanged against the simulated device.
+    """
+    
+    def __init__(self, device: VirtualPrinter, poll_interval: float = 2.0):
+        """
+        Initialize the facade
+        
+        Args:
+            device: Shared simulated printer
+            poll_interval: How often to poll job status (seconds)
+        """
+        self.device = device
+        self.printer_name = device.name
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(__name__)
+    
+    def print_file(self, file_path: str, job_title: str, print_options: PrintOptions,
+                   cups_options: Optional[Dict[str, str]] = None, raw: bool = False) -> int:
+        """Submit a file to the virtual printer (see PrintManager.print_file)"""
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Print file not found: {file_path}")
+        
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        job_id = self.device.submit(data, job_title, print_options)
+        self.logger.info(f"Print job submitted to virtual printer: Job ID {job_id} ({len(data)} bytes)")
+        return job_id
+    
+    def print_stream(self, chunks: Iterator[bytes], job_title: str, print_options: PrintOptions,
+                     document_format: str = 'application/pdf',
+                     cups_options: Optional[Dict[str, str]] = None) -> int:
+        """Submit a streamed document to the virtual printer (see PrintManager.print_stream)"""
+        data = b''.join(chunks)
+        job_id = self.device.submit(data, job_title, print_options)
+        self.logger.info(f"Print job streamed to virtual printer: Job ID {job_id} ({len(data)} bytes)")
+        return job_id
+    
+    def print_files(self, file_paths: List[str], job_title: str, print_options: PrintOptions,
+                    cups_options: Optional[Dict[str, str]] = None) -> int:
+        """Submit several files as one virtual job (see PrintManager.print_files)"""
+        documents = []
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"Print file not found: {file_path}")
+            with open(file_path, 'rb') as f:
+                documents.append(f.read())
+        
+        data = b''.join(documents)
+        job_id = self.device.submit(data, job_title, print_options)
+        self.logger.info(f"Print job submitted to virtual printer: Job ID {job_id} "
+                         f"({len(documents)} documents, {len(data)} bytes)")
+        return job_id
+    
+    def get_job_status(self, job_id: int) -> Tuple[PrintJobStatus, Dict[str, Any]]:
+        """Get the current status of a print job"""
+        result = self.device.job_status(job_id)
+        if result is None:
+            self.logger.warning(f"Job {job_id} not found on virtual printer")
+            return PrintJobStatus.ABORTED, {}
+        return result
+    
+    def get_jobs_status(self, job_ids: List[int],
+                        requested_attributes: Optional[List[str]] = None) -> Dict[int, Tuple[PrintJobStatus, Dict[str, Any]]]:
+        """Get the status of several jobs at once (see PrintManager.get_jobs_status)"""
+        results = {}
+        for job_id in job_ids:
+            status, job_info = self.get_job_status(job_id)
+            if requested_attributes is not None:
+                job_info = {key: value for key, value in job_info.items() if key in requested_attributes}
+            results[job_id] = (status, job_info)
+        return results
+    
+    def cancel_job(self, job_id: int) -> bool:
+        """Cancel a print job"""
+        cancelled = self.device.cancel(job_id)
+        if cancelled:
+            self.logger.info(f"Job {job_id} cancelled successfully")
+        return cancelled
+    
+    def get_job_attributes(self, job_id: int) -> Dict[str, Any]:
+        """Get the attributes of a single job"""
+        return self.get_job_status(job_id)[1]
+    
+    @property
+    def printer_uri(self) -> str:
+        """IPP URI of the virtual printer"""
+        return f"ipp://localhost/printers/{self.printer_name}"
+    
+    def create_subscription(self, events: List[str], lease_duration: int) -> Optional[int]:
+        """The simulator does not generate events: no subscription, so job monitoring stays on polling"""
+        return None
+    
+    def get_printer_info(self) -> Dict[str, Any]:
+        """Get detailed information about the virtual printer"""
+        return self.device.printer_info()
+    
+    def get_printer_attributes(self) -> Dict[str, Any]:
+        """Get the state and capability attributes of the virtual printer"""
+        return self.device.printer_attributes()
+    
+    def get_job_history(self, limit: int = 10) -> Dict[int, Dict[str, Any]]:
+        """Get recent job history, most recent first"""
+        jobs = self.device.jobs()
+        return dict(sorted(jobs.items(), reverse=True)[:limit])
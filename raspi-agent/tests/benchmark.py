@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Load-generation benchmark for Raspberry Pi Print Agent
+Drives the real HTTP server and job pipeline against the integration-test mocks
+
+Usage:
+    python tests/benchmark.py --requests 2000 --rate 30 --file-size lognormal:500k:1.2 \
+        --env MAX_CONCURRENT_JOBS=2 --output results.json
+    
+    # Same load against the virtual printer model (warm-up, jams, paper-outs)
+    python tests/benchmark.py --env PRINTER_BACKEND=virtual --env VIRTUAL_PRINTER_JAM_RATE=0.001
+"""
+
+import argparse
+import asyncio
+import aiohttp
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Optional
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from integration_test import MockBackend, MockPrintManager, MOCK_PRINT_JOB, MOCK_PDF_CONTENT
+from print_manager import PrintJobStatus, PrinterCache
+import print_agent
+
+def parse_size(text: str) -> int:
+    """Parse a byte size such as 512, 200k or 4m"""
+    text = text.strip().lower()
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1024, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1024 * 1024, text[:-1]
+    return int(float(text) * multiplier)
+
+def parse_size_distribution(spec: str) -> Callable[[random.Random], int]:
+    """
+    Build a file size sampler from a spec
+    
+    Supported specs:
+        fixed:SIZE
+        uniform:MIN:MAX
+        lognormal:MEDIAN:SIGMA
+        choice:SIZE,SIZE,...
+    """
+    kind, _, params = spec.partition(':')
+    args = params.split(':') if params else []
+    
+    if kind == 'fixed':
+        size = parse_size(args[0])
+        return lambda rng: size
+    if kind == 'uniform':
+        low, high = parse_size(args[0]), parse_size(args[1])
+        return lambda rng: rng.randint(low, high)
+    if kind == 'lognormal':
+        median, sigma = parse_size(args[0]), float(args[1])
+        return lambda rng: max(len(MOCK_PDF_CONTENT), int(rng.lognormvariate(math.log(median), sigma)))
+    if kind == 'choice':
+        sizes = [parse_size(size) for size in args[0].split(',')]
+        return lambda rng: rng.choice(sizes)
+    raise ValueError(f"Unknown size distribution: {spec}")
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 (linear interpolation), mean and max of a sample"""
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    
+    ordered = sorted(values)
+    
+    def pick(p: float) -> float:
+        rank = (len(ordered) - 1) * p
+        low = math.floor(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+    
+    return {
+        'count': len(ordered),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'mean': sum(ordered) / len(ordered),
+        'max': ordered[-1]
+    }
+
+class BenchmarkBackend(MockBackend):
+    """MockBackend serving any number of UPIDs over a pool of generated documents"""
+    
+    def __init__(self, document_dir: str, document_count: int, fetch_latency: float, bytes_per_page: int):
+        super().__init__()
+        self.document_dir = document_dir
+        self.document_count = document_count
+        self.fetch_latency = fetch_latency
+        self.bytes_per_page = bytes_per_page
+        self.base_url = ''
+        self.assignments: Dict[str, int] = {}  # upid -> document index
+        self.finished_at: Dict[str, float] = {}  # upid -> time the report arrived
+    
+    async def fetch_print_job(self, request):
+        """Mock /api/print/fetch endpoint for benchmark UPIDs"""
+        if request.headers.get('X-API-KEY') != self.api_key:
+            return web.json_response({'error': 'Invalid API key'}, status=401)
+        
+        upid = request.query.get('upid')
+        if upid not in self.assignments:
+            return web.json_response({'error': 'Job not found'}, status=404)
+        
+        if self.fetch_latency:
+            await asyncio.sleep(self.fetch_latency)
+        
+        index = self.assignments[upid]
+        path = os.path.join(self.document_dir, f'{index}.pdf')
+        size = os.path.getsize(path)
+        return web.json_response({
+            **MOCK_PRINT_JOB,
+            'upid': upid,
+            'jobNumber': f'BENCH-{upid}',
+            'originalName': f'document_{index}.pdf',
+            'fileUrl': f'{self.base_url}/files/{index}.pdf',
+            'fileSize': size,
+            'totalPages': max(1, math.ceil(size / self.bytes_per_page))
+        })
+    
+    async def serve_document(self, request):
+        """Serve a generated document (with Range and ETag support)"""
+        return web.FileResponse(os.path.join(self.document_dir, request.match_info['name']))
+    
+    async def complete_job(self, request):
+        """Mock /api/print/complete endpoint that records arrival time"""
+        data = await request.json()
+        self.completed_jobs.append(data)
+        self.finished_at[data['upid']] = time.monotonic()
+        return web.json_response({'status': 'success'})
+    
+    async def report_error(self, request):
+        """Mock /api/print/error endpoint that records arrival time"""
+        data = await request.json()
+        self.error_reports.append(data)
+        self.finished_at[data['upid']] = time.monotonic()
+        return web.json_response({'status': 'success'})
+
+class BenchmarkPrintManager:
+    """
+    AsyncPrintManager stand-in built on MockPrintManager
+    
+    Jobs are printed one at a time, like a single physical printer, and
+    take pages * 60 / ppm seconds divided by the speedup factor.
+    """
+    
+    def __init__(self, printer_name: str, ppm: float, speedup: float, bytes_per_page: int):
+        self.mock = MockPrintManager(printer_name)
+        self.printer_name = printer_name
+        self.ppm = ppm
+        self.speedup = speedup
+        self.bytes_per_page = bytes_per_page
+        self._printer = asyncio.Lock()
+        self.printer_cache = PrinterCache(self)
+        self._printing: Dict[int, asyncio.Task] = {}
+        self._status_callbacks: Dict[int, Callable] = {}
+    
+    async def connect(self) -> bool:
+        return True
+    
+    async def enable_notifications(self, interval: float = 0.5) -> bool:
+        return False
+    
+    def _submit(self, size: int, job_title: str, print_options) -> int:
+        """Register a job with the mock and start simulated printing"""
+        with redirect_stdout(io.StringIO()):
+            job_id = self.mock.print_file('', job_title, print_options)
+        pages = max(1, math.ceil(size / self.bytes_per_page)) * max(print_options.copies, 1)
+        self.mock.jobs[job_id]['pages'] = pages
+        self._printing[job_id] = asyncio.create_task(self._print(job_id, pages))
+        return job_id
+    
+    async def _print(self, job_id: int, pages: int):
+        """Occupy the printer for the job's simulated print time"""
+        async with self._printer:
+            callback = self._status_callbacks.get(job_id)
+            if callback:
+                callback(job_id, PrintJobStatus.PROCESSING, {})
+            if self.ppm > 0:
+                await asyncio.sleep(pages * 60.0 / self.ppm / self.speedup)
+    
+    async def print_file(self, file_path: str, job_title: str, print_options, raw: bool = False) -> int:
+        return self._submit(os.path.getsize(file_path), job_title, print_options)
+    
+    async def print_files(self, file_paths: List[str], job_title: str, print_options) -> int:
+        return self._submit(sum(os.path.getsize(path) for path in file_paths), job_title, print_options)
+    
+    async def print_stream(self, chunks, job_title: str, print_options,
+                           document_format: str = 'application/pdf') -> int:
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+        return self._submit(size, job_title, print_options)
+    
+    async def wait_for_completion(self, job_id: int, timeout: Optional[float] = None,
+                                  on_status: Optional[Callable] = None) -> tuple:
+        if on_status:
+            self._status_callbacks[job_id] = on_status
+        try:
+            await asyncio.wait_for(asyncio.shield(self._printing[job_id]), timeout)
+        except asyncio.TimeoutError:
+            return False, {}
+        finally:
+            self._status_callbacks.pop(job_id, None)
+        
+        self._printing.pop(job_id, None)
+        job_info = self.mock.jobs.pop(job_id)
+        job_info['job-media-sheets-completed'] = job_info['pages']
+        return True, job_info
+    
+    async def get_printer_info(self) -> Dict[str, Any]:
+        return self.mock.get_printer_info()
+    
+    async def get_printer_attributes(self) -> Dict[str, Any]:
+        return self.mock.get_printer_info()
+    
+    async def close(self) -> None:
+        for task in self._printing.values():
+            task.cancel()
+
+def pdf_document(pages: int, size: int = 0, padding: int = 0) -> bytes:
+    """
+    A well-formed PDF with `pages` pages, padded with a comment after the
+    header to `size` bytes (give or take a digit of the xref offset)
+    
+    Every page is listed in the page tree, so pypdf (preflight) and the
+    virtual printer's page-object count agree on the page count.
+    """
+    content = b'BT\n/F1 12 Tf\n72 720 Td\n(Test Print Job) Tj\nET\n'
+    kids = b' '.join(b'%d 0 R' % (4 + page) for page in range(pages))
+    objects = [
+        b'<<\n/Type /Catalog\n/Pages 2 0 R\n>>',
+        b'<<\n/Type /Pages\n/Kids [%s]\n/Count %d\n>>' % (kids, pages),
+        b'<<\n/Length %d\n>>\nstream\n%sendstream' % (len(content), content)
+    ] + [
+        b'<<\n/Type /Page\n/Parent 2 0 R\n/MediaBox [0 0 612 792]\n/Contents 3 0 R\n>>'
+        for _ in range(pages)
+    ]
+    
+    data = bytearray(b'%PDF-1.4\n')
+    if padding >= 2:
+        data += b'%' + b'x' * (padding - 2) + b'\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref_offset = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    data += b'trailer\n<<\n/Size %d\n/Root 1 0 R\n>>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+    if not padding and size - len(data) >= 2:
+        return pdf_document(pages, padding=size - len(data))
+    return bytes(data)
+
+def build_documents(document_dir: str, count: int, sampler: Callable[[random.Random], int],
+                    rng: random.Random, bytes_per_page: int) -> List[int]:
+    """Write the document pool to disk and return the sizes"""
+    sizes = []
+    for index in range(count):
+        size = max(sampler(rng), len(MOCK_PDF_CONTENT))
+        document = pdf_document(max(1, math.ceil(size / bytes_per_page)), size)
+        with open(os.path.join(document_dir, f'{index}.pdf'), 'wb') as f:
+            f.write(document)
+        sizes.append(len(document))
+    return sizes
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    """Run one benchmark and return the results"""
+    rng = random.Random(args.seed)
+    work_dir = tempfile.mkdtemp(prefix='print_agent_bench_')
+    document_dir = os.path.join(work_dir, 'documents')
+    os.makedirs(document_dir)
+    sizes = build_documents(document_dir, args.documents, parse_size_distribution(args.file_size), rng,
+                            parse_size(args.bytes_per_page))
+    
+    # Mock backend and storage
+    backend = BenchmarkBackend(document_dir, args.documents, args.fetch_latency_ms / 1000,
+                               parse_size(args.bytes_per_page))
+    backend.base_url = f'http://localhost:{args.backend_port}'
+    backend_app = web.Application()
+    backend_app.router.add_get('/api/print/fetch', backend.fetch_print_job)
+    backend_app.router.add_get('/files/{name}', backend.serve_document)
+    backend_app.router.add_post('/api/print/complete', backend.complete_job)
+    backend_app.router.add_post('/api/print/error', backend.report_error)
+    backend_runner = web.AppRunner(backend_app, access_log=None)
+    await backend_runner.setup()
+    await web.TCPSite(backend_runner, 'localhost', args.backend_port).start()
+    
+    # Real agent and HTTP server
+    env = {
+        'BACKEND_URL': backend.base_url,
+        'RASPI_API_KEY': backend.api_key,
+        'PRINTER_NAME': 'Benchmark_Printer',
+        'LOG_LEVEL': 'WARNING',
+        'CUPS_NOTIFICATIONS': 'false',
+        'STATE_DIR': os.path.join(work_dir, 'state'),
+        'CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'VIRTUAL_PRINTER_PPM': str(args.ppm),
+        'VIRTUAL_PRINTER_SPEEDUP': str(args.speedup)
+    }
+    for override in args.env:
+        key, _, value = override.partition('=')
+        env[key] = value
+    os.environ.update(env)
+    
+    config = print_agent.Config.from_env()
+    if config.printer_backend == 'virtual':
+        agent = print_agent.PrintAgent(config)  # Real AsyncPrintManager over the simulated device
+    else:
+        manager = BenchmarkPrintManager(config.printer_names[0], args.ppm, args.speedup, parse_size(args.bytes_per_page))
+        agent = print_agent.PrintAgent(config, print_manager=manager)
+    
+    # Time each pipeline stage per job
+    samples: Dict[str, List[float]] = {'queue_wait': [], 'fetch': [], 'download': [], 'print': []}
+    
+    def timed(name: str, handler):
+        async def wrapper(ctx):
+            started_at = time.monotonic()
+            if name == 'fetch':
+                samples['queue_wait'].append(started_at - ctx.enqueued_at)
+            try:
+                return await handler(ctx)
+            finally:
+                samples[name].append(time.monotonic() - started_at)
+        return wrapper
+    
+    agent._fetch_stage = timed('fetch', agent._fetch_stage)
+    agent._download_stage = timed('download', agent._download_stage)
+    agent._print_stage = timed('print', agent._print_stage)
+    
+    await agent.initialize()
+    app, port = await print_agent.create_http_server(agent, args.port)
+    agent_runner = web.AppRunner(app, access_log=None)
+    await agent_runner.setup()
+    await web.TCPSite(agent_runner, 'localhost', port).start()
+    
+    # Drive /print at the configured arrival rate (Poisson arrivals)
+    sent_at: Dict[str, float] = {}
+    http_latency: List[float] = []
+    dispositions: Dict[str, int] = {}
+    
+    async def send(session: aiohttp.ClientSession, upid: str):
+        started_at = time.monotonic()
+        try:
+            async with session.post(f'http://localhost:{port}/print', json={'upid': upid}) as response:
+                body = await response.json()
+                key = 'rejected' if response.status == 429 else body.get('status', f'http_{response.status}')
+        except aiohttp.ClientError as e:
+            key = f'error_{type(e).__name__}'
+        http_latency.append(time.monotonic() - started_at)
+        dispositions[key] = dispositions.get(key, 0) + 1
+        if key == 'queued':
+            sent_at[upid] = started_at
+    
+    print(f"🚀 Sending {args.requests} requests at {args.rate}/s "
+          f"({args.documents} documents, {sum(sizes) // args.documents} bytes average)")
+    
+    started = time.monotonic()
+    try:
+        async with aiohttp.ClientSession() as session:
+            senders = []
+            next_at = started
+            for i in range(args.requests):
+                upid = f'BENCH{i:06d}'
+                backend.assignments[upid] = rng.randrange(args.documents)
+                next_at += rng.expovariate(args.rate)
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                senders.append(asyncio.create_task(send(session, upid)))
+            await asyncio.gather(*senders)
+        
+        # Wait for every admitted job to be reported back
+        deadline = time.monotonic() + args.drain_timeout
+        while time.monotonic() < deadline and any(upid not in backend.finished_at for upid in sent_at):
+            await asyncio.sleep(0.1)
+        elapsed = time.monotonic() - started
+        
+        end_to_end = [
+            backend.finished_at[upid] - sent_at[upid]
+            for upid in sent_at if upid in backend.finished_at
+        ]
+        stats = agent.get_stats()
+    finally:
+        await agent.cleanup()
+        await agent_runner.cleanup()
+        await backend_runner.cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        'benchmark': 'print_agent_pipeline',
+        'timestamp': datetime.now().isoformat(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'agent_config': {key: value for key, value in vars(config).items() if key != 'raspi_api_key'},
+        'requests': {
+            'sent': args.requests,
+            'dispositions': dispositions,
+            'completed': len(backend.completed_jobs),
+            'failed': len(backend.error_reports),
+            'unfinished': sum(1 for upid in sent_at if upid not in backend.finished_at)
+        },
+        'elapsed_seconds': elapsed,
+        'throughput_jobs_per_second': len(end_to_end) / elapsed if elapsed else 0.0,
+        'bytes_per_document': percentiles([float(size) for size in sizes]),
+        'latency_seconds': {
+            'http_accept': percentiles(http_latency),
+            **{stage: percentiles(values) for stage, values in samples.items()},
+            'end_to_end': percentiles(end_to_end)
+        },
+        'agent_stats': stats
+    }
+
+def print_summary(results: Dict[str, Any]):
+    """Human-readable summary of one run"""
+    print("\n📊 Results")
+    print(f"   Requests: {results['requests']}")
+    print(f"   Throughput: {results['throughput_jobs_per_second']:.2f} jobs/s "
+          f"over {results['elapsed_seconds']:.1f}s")
+    print(f"   {'stage':<12} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for stage, summary in results['latency_seconds'].items():
+        if not summary['count']:
+            continue
+        print(f"   {stage:<12} {summary['count']:>7} "
+              + ' '.join(f"{summary[key] * 1000:>7.1f}ms" for key in ('mean', 'p50', 'p95', 'p99', 'max')))
+
+def parse_args(argv=None):
+    """Command line options"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000, help='Number of /print requests to send')
+    parser.add_argument('--rate', type=float, default=20.0, help='Mean arrival rate (requests per second)')
+    parser.add_argument('--file-size', default='lognormal:200k:1.0',
+                        help='Document size distribution: fixed:SIZE, uniform:MIN:MAX, '
+                             'lognormal:MEDIAN:SIGMA or choice:SIZE,SIZE,...')
+    parser.add_argument('--documents', type=int, default=100, help='Distinct documents shared by the requests')
+    parser.add_argument('--fetch-latency-ms', type=float, default=20.0, help='Simulated backend fetch latency')
+    parser.add_argument('--ppm', type=float, default=40.0, help='Simulated printer speed (0 prints instantly)')
+    parser.add_argument('--speedup', type=float, default=100.0, help='Run simulated printing this many times faster')
+    parser.add_argument('--bytes-per-page', default='100k', help='Document bytes per printed page')
+    parser.add_argument('--drain-timeout', type=float, default=300.0, help='Seconds to wait for admitted jobs to finish')
+    parser.add_argument('--backend-port', type=int, default=9999)
+    parser.add_argument('--port', type=int, default=8089, help='Agent HTTP port')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Agent configuration override, e.g. --env MAX_CONCURRENT_JOBS=4')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    
+    try:
+        results = asyncio.run(run_benchmark(args))
+    except KeyboardInterrupt:
+        print("\n⏹️  Benchmark interrupted by user")
+        sys.exit(1)
+    
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\n💾 Results written to {args.output}")
\ No newline at end of file
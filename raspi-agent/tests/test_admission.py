@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Unit tests for job admission
+Deduplication, load shedding and fail-fast rejection while the backend is down
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend_client import BackendClient, CircuitBreaker
+from job_journal import JobJournal
+from outbox import ReportOutbox
+from print_agent import Config, PipelineStage, PrintAgent, PrintJobContext
+
+async def no_delivery(kind, payload):
+    return 503
+
+@pytest.fixture
+def agent(tmp_path):
+    manager = SimpleNamespace(printer_cache=SimpleNamespace(capabilities=SimpleNamespace(pages_per_minute=None)))
+    agent = PrintAgent(Config('http://backend.test', 'key', 'Test_Printer', log_level='WARNING'),
+                       print_manager=manager)
+    agent.journal = JobJournal(str(tmp_path / 'journal.db'))
+    agent.outbox = ReportOutbox(str(tmp_path / 'outbox.db'), no_delivery)
+    agent.backend = BackendClient(None, 'http://backend.test', 'key',
+                                  breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    agent.pipeline = [PipelineStage(name, None, 1, 2, None) for name in ('fetch', 'download', 'print')]
+    agent.job_queue = agent.pipeline[0].queue
+    return agent
+
+def open_breaker(agent: PrintAgent) -> None:
+    agent.backend.breaker.acquire()
+    agent.backend.breaker.record(False)
+
+def submit(agent: PrintAgent, *upids: str):
+    async def run():
+        return [agent.submit_job(upid)[0] for upid in upids]
+    return asyncio.run(run())
+
+def test_jobs_are_queued_once_and_shed_when_the_queue_is_full(agent):
+    assert submit(agent, 'UPID1', 'UPID1', 'UPID2', 'UPID3') == ['queued', 'coalesced', 'queued', 'rejected']
+    assert agent.stats['jobs_rejected'] == 1
+    assert [job['upid'] for job in agent.journal.unfinished()] == ['UPID1', 'UPID2']
+
+def test_jobs_are_turned_away_at_once_while_the_breaker_is_open(agent):
+    open_breaker(agent)
+    
+    assert submit(agent, 'UPID1') == ['unavailable']
+    assert agent.job_queue.qsize() == 0
+    assert agent.journal.unfinished() == []
+    assert agent.backend_retry_after_seconds() == 30
+
+def test_half_open_breaker_admits_jobs(agent):
+    open_breaker(agent)
+    agent.backend.breaker._open_until = 0.0  # The open period has run out
+    assert submit(agent, 'UPID1') == ['queued']
+
+def test_queued_job_fails_fast_and_is_not_replayed_when_the_backend_goes_down(agent):
+    async def run():
+        agent.submit_job('UPID1')
+        ctx = agent.job_queue.get_nowait()
+        open_breaker(agent)
+        passed = await asyncio.wait_for(agent._fetch_stage(ctx), 1.0)
+        await agent._job_exit(ctx, passed, None)
+        return passed
+    
+    assert asyncio.run(run()) is False
+    assert agent.outbox.pending() == 1
+    assert 'UPID1' not in agent.recent_results
+    assert 'UPID1' not in agent.inflight
+
+def test_finished_jobs_are_replayed(agent):
+    async def run():
+        agent.submit_job('UPID1')
+        ctx = agent.job_queue.get_nowait()
+        await agent._job_exit(ctx, True, None)
+        return agent.submit_job('UPID1')
+    
+    assert asyncio.run(run()) == ('done', True)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the backend client
+Circuit breaker state machine and the hedged-request race, with a fake session
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any, List, Tuple
+
+import aiohttp
+import pytest
+
+import backend_client
+from backend_client import BackendClient, BackendUnavailable, CircuitBreaker
+
+class FakeClock:
+    """time.monotonic() replacement the tests move by hand"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(backend_client, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+class FakeResponse:
+    """Just enough of aiohttp.ClientResponse"""
+    
+    def __init__(self, status: int, body: Any):
+        self.status = status
+        self.body = body
+        self.content_type = 'application/json'
+    
+    async def json(self) -> Any:
+        return self.body
+
+class FakeSession:
+    """
+    Answers requests from a script of (delay, status or exception) in call order
+    
+    Every call is recorded, with whether it ran to completion or was cancelled.
+    """
+    
+    def __init__(self, *script: Tuple[float, Any]):
+        self.script = list(script)
+        self.calls: List[dict] = []
+    
+    def request(self, method: str, url: str, **kwargs):
+        delay, outcome = self.script.pop(0)
+        call = {'method': method, 'url': url, 'cancelled': False, **kwargs}
+        self.calls.append(call)
+        number = len(self.calls)
+        
+        class Context:
+            async def __aenter__(self):
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    call['cancelled'] = True
+                    raise
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return FakeResponse(outcome, {'status': outcome, 'call': number})
+            
+            async def __aexit__(self, *exc_info):
+                return False
+        
+        return Context()
+
+def client(session: FakeSession, breaker: CircuitBreaker = None, hedge_default_delay: float = 0.05,
+           **kwargs) -> BackendClient:
+    return BackendClient(session, 'http://backend.test/', 'key', breaker=breaker,
+                         hedge_default_delay=hedge_default_delay, **kwargs)
+
+def fail(breaker: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        assert breaker.acquire()
+        breaker.record(False)
+
+# Circuit breaker
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.acquire() is False
+    assert breaker.stats == {'opened': 1, 'rejected': 1}
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    fail(breaker, 2)
+    assert breaker.acquire()
+    breaker.record(True)
+    fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_open_breaker_turns_half_open_after_the_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    fail(breaker, 1)
+    clock.advance(9.9)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.get_stats()['open_seconds_left'] == pytest.approx(0.1)
+    
+    clock.advance(0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_half_open_allows_one_trial_at_a_time(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, success_threshold=2)
+    fail(breaker, 1)
+    clock.advance(10)
+    
+    assert breaker.acquire() is True
+    assert breaker.acquire() is False  # Trial in flight
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    
+    assert breaker.acquire() is True
+    assert breaker.acquire() is False
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.acquire() and breaker.acquire()  # No limit once closed
+
+def test_abandoned_trial_frees_the_slot_without_counting(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, success_threshold=1)
+    fail(breaker, 1)
+    clock.advance(10)
+    
+    assert breaker.acquire()
+    breaker.record(None)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.acquire()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_failed_trials_double_the_open_period_up_to_the_cap(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, max_reset_timeout=50, success_threshold=1)
+    fail(breaker, 1)
+    
+    periods = []
+    for _ in range(4):
+        period = breaker.get_stats()['open_seconds_left']
+        periods.append(period)
+        clock.advance(period)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        fail(breaker, 1)
+    assert periods == [10, 20, 40, 50]
+    assert breaker.get_stats()['open_seconds_left'] == 50
+    
+    # A successful trial closes it, and the next opening starts from the base period again
+    clock.advance(50)
+    assert breaker.acquire()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    fail(breaker, 1)
+    assert breaker.get_stats()['open_seconds_left'] == 10
+
+def test_wait_returns_once_a_trial_would_be_allowed():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        fail(breaker, 1)
+        assert await breaker.wait(0.01) is False
+        assert await breaker.wait(1.0) is True
+        return breaker.state
+    
+    assert asyncio.run(run()) == CircuitBreaker.HALF_OPEN
+
+# Requests and hedging
+
+def test_requests_go_to_the_backend_with_the_api_key():
+    session = FakeSession((0, 200))
+    response = asyncio.run(client(session, hedge=False).request('POST', '/api/print/complete', json={'a': 1}))
+    
+    assert response.status == 200
+    [call] = session.calls
+    assert call['url'] == 'http://backend.test/api/print/complete'
+    assert call['headers']['X-API-KEY'] == 'key'
+    assert call['json'] == {'a': 1}
+
+def test_server_errors_count_as_breaker_failures():
+    breaker = CircuitBreaker(failure_threshold=3)
+    session = FakeSession((0, 404), (0, 500), (0, 429), (0, 503))
+    backend = client(session, breaker=breaker, hedge=False)
+    
+    async def run():
+        statuses = [(await backend.request('GET', '/x')).status for _ in range(4)]
+        with pytest.raises(BackendUnavailable):
+            await backend.request('GET', '/x')
+        return statuses
+    
+    assert asyncio.run(run()) == [404, 500, 429, 503]
+    assert breaker.state == CircuitBreaker.OPEN
+    assert backend.stats['failures'] == 3
+    assert len(session.calls) == 4
+
+def test_connection_errors_count_as_breaker_failures():
+    breaker = CircuitBreaker(failure_threshold=1)
+    session = FakeSession((0, aiohttp.ClientConnectionError('refused')))
+    
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(client(session, breaker=breaker, hedge=False).request('GET', '/x'))
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_request_waits_for_an_open_breaker_when_asked():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, success_threshold=1)
+    fail(breaker, 1)
+    session = FakeSession((0, 200))
+    
+    response = asyncio.run(client(session, breaker=breaker, hedge=False).request('POST', '/x', wait=1.0))
+    assert response.status == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_fast_request_is_not_hedged():
+    session = FakeSession((0.0, 200))
+    backend = client(session, hedge_default_delay=0.2)
+    
+    assert asyncio.run(backend.request('GET', '/api/printers')).status == 200
+    assert len(session.calls) == 1
+    assert backend.stats['hedges_sent'] == 0
+
+def test_slow_request_is_hedged_and_the_hedge_wins():
+    session = FakeSession((0.5, 200), (0.0, 200))
+    backend = client(session, hedge_default_delay=0.05)
+    
+    response = asyncio.run(backend.request('GET', '/api/printers'))
+    assert response.body['call'] == 2
+    assert backend.stats['hedges_sent'] == 1
+    assert backend.stats['hedges_won'] == 1
+    assert session.calls[0]['cancelled'] is True  # The losing primary is cancelled
+
+def test_losing_hedge_error_does_not_beat_the_primary_success():
+    # The hedge fails fast (e.g. a busy replica) while the primary is still working
+    session = FakeSession((0.2, 200), (0.0, 409))
+    backend = client(session, hedge_default_delay=0.05)
+    
+    response = asyncio.run(backend.request('GET', '/api/printers'))
+    assert response.status == 200
+    assert response.body['call'] == 1
+    assert backend.stats['hedges_sent'] == 1
+    assert backend.stats['hedges_won'] == 0
+
+def test_primary_answer_is_returned_when_neither_succeeds():
+    session = FakeSession((0.2, 404), (0.0, 409))
+    response = asyncio.run(client(session).request('GET', '/api/printers'))
+    assert response.status == 404
+
+def test_hedge_covers_a_failed_primary():
+    session = FakeSession((0.1, aiohttp.ClientConnectionError('reset')), (0.1, 200))
+    response = asyncio.run(client(session).request('GET', '/api/printers'))
+    assert response.status == 200
+
+def test_primary_error_is_raised_when_both_fail():
+    session = FakeSession((0.1, aiohttp.ClientConnectionError('primary')),
+                          (0.0, aiohttp.ClientConnectionError('hedge')))
+    with pytest.raises(aiohttp.ClientConnectionError, match='primary'):
+        asyncio.run(client(session).request('GET', '/api/printers'))
+
+def test_no_hedge_while_the_breaker_is_not_closed():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, success_threshold=2)
+    fail(breaker, 1)
+    session = FakeSession((0.2, 200))
+    backend = client(session, breaker=breaker, hedge_default_delay=0.05)
+    
+    async def run():
+        await asyncio.sleep(0.02)  # Half-open
+        return await backend.request('GET', '/api/printers')
+    
+    assert asyncio.run(run()).status == 200
+    assert len(session.calls) == 1
+    assert backend.stats['hedges_sent'] == 0
+
+def test_hedging_can_be_turned_off_per_call():
+    session = FakeSession((0.2, 200))
+    backend = client(session, hedge_default_delay=0.01)
+    assert asyncio.run(backend.request('GET', '/api/print/fetch', hedge=False)).status == 200
+    assert len(session.calls) == 1
+    assert backend.stats['hedges_sent'] == 0
+
+def test_posts_are_never_hedged():
+    session = FakeSession((0.2, 200))
+    backend = client(session, hedge_default_delay=0.01)
+    assert asyncio.run(backend.request('POST', '/api/print/complete')).status == 200
+    assert len(session.calls) == 1
+
+def test_hedge_delay_follows_the_p95_latency():
+    backend = client(FakeSession(), hedge_default_delay=1.0, hedge_min_delay=0.05)
+    backend.latencies.extend([0.1] * (BackendClient.MIN_SAMPLES - 1))
+    assert backend.hedge_delay == 1.0  # Too few samples
+    
+    backend.latencies.clear()
+    backend.latencies.extend([0.1] * 95 + [2.0] * 5)
+    assert backend.hedge_delay == 2.0
+    backend.latencies.clear()
+    backend.latencies.extend([0.1] * 96 + [2.0] * 4)
+    assert backend.hedge_delay == 0.1
+    
+    backend.latencies.clear()
+    backend.latencies.extend([0.001] * 100)
+    assert backend.hedge_delay == 0.05
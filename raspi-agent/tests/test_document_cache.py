@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the document cache
+LRU eviction under the byte budget, pinning, aliases and reloading from disk
+"""
+
+import hashlib
+import os
+import time
+
+import pytest
+
+from document_cache import DocumentCache
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+def put(cache: DocumentCache, content: bytes, *aliases: str, etag: str = None, release: bool = True) -> str:
+    """Insert a document as a finished download would; returns its SHA-256"""
+    temp_path = cache.new_temp_path()
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = cache.insert(temp_path, sha256, list(aliases), etag)
+    if release:
+        cache.release(path)
+    return sha256
+
+def test_inserted_document_is_found_by_alias(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    sha256 = put(cache, b'a' * 100, 'checksum:abc', etag='"v1"')
+    
+    assert cache.resolve('checksum:abc') == sha256
+    assert cache.resolve('checksum:other') is None
+    assert cache.contains(sha256)
+    assert cache.etag_for(sha256) == '"v1"'
+    assert cache.owns(cache.path_for(sha256))
+    assert not cache.owns(os.path.join(cache_dir, 'elsewhere', sha256))
+    with open(cache.path_for(sha256), 'rb') as f:
+        assert f.read() == b'a' * 100
+    assert os.listdir(cache.tmp_dir) == []
+
+def test_same_content_under_a_new_alias_is_stored_once(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    first = put(cache, b'a' * 100, 'url:one')
+    second = put(cache, b'a' * 100, 'url:two')
+    
+    assert first == second
+    assert cache.resolve('url:one') == cache.resolve('url:two') == first
+    assert cache.bytes_used == 100
+    assert os.listdir(cache.tmp_dir) == []
+
+def test_least_recently_used_documents_are_evicted_first(cache_dir):
+    cache = DocumentCache(cache_dir, 250)
+    a = put(cache, b'a' * 100, 'a')
+    b = put(cache, b'b' * 100, 'b')
+    cache.release(cache.hit(a))  # b is now the least recently used
+    c = put(cache, b'c' * 100, 'c')
+    
+    assert cache.contains(a) and cache.contains(c)
+    assert not cache.contains(b)
+    assert cache.resolve('b') is None
+    assert not os.path.exists(cache.path_for(b))
+    assert cache.bytes_used == 200
+    assert cache.stats['evictions'] == 1
+
+def test_pinned_documents_are_never_evicted(cache_dir):
+    cache = DocumentCache(cache_dir, 150)
+    a = put(cache, b'a' * 100, 'a', release=False)
+    b = put(cache, b'b' * 100, 'b')
+    
+    # a is older but pinned, so b goes even though it was just inserted
+    assert cache.contains(a)
+    assert not cache.contains(b)
+
+def test_document_stays_pinned_until_every_user_releases_it(cache_dir):
+    cache = DocumentCache(cache_dir, 150)
+    a = put(cache, b'a' * 100, 'a', release=False)
+    cache.hit(a)  # Second user
+    put(cache, b'b' * 100, 'b', release=False)
+    assert cache.bytes_used == 200  # Over budget: nothing can go
+    
+    cache.release(cache.path_for(a))
+    assert cache.contains(a)
+    cache.release(cache.path_for(a))
+    assert not cache.contains(a)
+    assert cache.bytes_used == 100
+
+def test_document_larger_than_the_budget_is_kept_while_in_use(cache_dir):
+    cache = DocumentCache(cache_dir, 100)
+    sha256 = put(cache, b'x' * 500, 'big', release=False)
+    assert cache.contains(sha256)
+    
+    cache.release(cache.path_for(sha256))
+    assert not cache.contains(sha256)
+    assert cache.bytes_used == 0
+
+def test_releasing_an_unpinned_document_is_harmless(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    sha256 = put(cache, b'a' * 100, 'a')
+    cache.release(cache.path_for(sha256))
+    assert cache.contains(sha256)
+
+def test_hits_count_the_bytes_saved(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    sha256 = put(cache, b'a' * 100, 'a')
+    cache.release(cache.hit(sha256))
+    cache.release(cache.hit(sha256))
+    
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['bytes_saved']) == (2, 1, 200)
+    assert stats['hit_ratio'] == pytest.approx(2 / 3)
+
+def test_cache_survives_a_restart(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    a = put(cache, b'a' * 100, 'a', etag='"a"')
+    b = put(cache, b'b' * 100, 'b')
+    open(os.path.join(cache.tmp_dir, 'download_interrupted.part'), 'wb').close()
+    
+    cache = DocumentCache(cache_dir, 1000)
+    assert cache.resolve('a') == a
+    assert cache.resolve('b') == b
+    assert cache.etag_for(a) == '"a"'
+    assert cache.bytes_used == 200
+    assert os.listdir(cache.tmp_dir) == []
+
+def test_restart_with_a_smaller_budget_evicts_the_oldest(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    a = put(cache, b'a' * 100, 'a')
+    b = put(cache, b'b' * 100, 'b')
+    past = time.time() - 60
+    os.utime(cache.path_for(b), (past, past))  # b was used longest ago
+    
+    cache = DocumentCache(cache_dir, 150)
+    assert cache.contains(a)
+    assert not cache.contains(b)
+    assert cache.resolve('b') is None
+    
+    # The pruned index is what the next start sees
+    cache = DocumentCache(cache_dir, 1000)
+    assert cache.resolve('b') is None
+    assert cache.resolve('a') == a
+
+def test_unreadable_index_only_loses_the_aliases(cache_dir):
+    cache = DocumentCache(cache_dir, 1000)
+    sha256 = put(cache, b'a' * 100, 'a')
+    with open(os.path.join(cache_dir, DocumentCache.INDEX_FILE), 'w') as f:
+        f.write('{not json')
+    
+    cache = DocumentCache(cache_dir, 1000)
+    assert cache.contains(sha256)
+    assert cache.resolve('a') is None
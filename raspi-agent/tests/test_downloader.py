@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the ranged downloader
+Parallel chunks, resuming after dropped connections and verification, against a local storage server
+"""
+
+import asyncio
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from downloader import DownloadError, RangedDownloader
+
+DATA = bytes(range(256)) * 22  # 5632 bytes
+SHA256 = hashlib.sha256(DATA).hexdigest()
+RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)')
+
+class StorageServer:
+    """
+    S3 stand-in serving one object
+    
+    `cuts` maps a request number (from 1) to the bytes sent before the
+    connection is dropped. `ranges=False` makes the server ignore Range
+    altogether; `full_first=True` ignores it for the first request only.
+    `etags` changes the object's ETag from the given request number on.
+    """
+    
+    def __init__(self, ranges: bool = True, full_first: bool = False, cuts: Optional[Dict[int, int]] = None,
+                 etags: Optional[Dict[int, str]] = None):
+        self.ranges = ranges
+        self.full_first = full_first
+        self.cuts = cuts or {}
+        self.etags = etags or {}
+        self.etag = '"v1"'
+        self.requests: List[Dict[str, str]] = []
+    
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append(dict(request.headers))
+        number = len(self.requests)
+        self.etag = self.etags.get(number, self.etag)
+        if request.headers.get('If-None-Match') == self.etag:
+            return web.Response(status=304, headers={'ETag': self.etag})
+        if request.headers.get('If-Match', self.etag) != self.etag:
+            return web.Response(status=412)
+        
+        headers = {'ETag': self.etag}
+        match = RANGE_RE.match(request.headers.get('Range', ''))
+        if match and self.ranges and not (self.full_first and number == 1):
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(DATA) - 1), len(DATA) - 1)
+            body, status = DATA[start:end + 1], 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(DATA)}'
+        else:
+            body, status = DATA, 200
+            if self.ranges:
+                headers['Accept-Ranges'] = 'bytes'
+        
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = len(body)
+        await response.prepare(request)
+        if number in self.cuts:
+            await response.write(body[:self.cuts[number]])
+            await asyncio.sleep(0.01)  # Let the bytes reach the client before the connection drops
+            request.transport.close()
+            return response
+        await response.write(body)
+        await response.write_eof()
+        return response
+
+async def download(server: StorageServer, dest_path: str, chunk_size: int = 1024, max_retries: int = 3,
+                   **kwargs):
+    """Run one download against the server; returns (result, downloader stats)"""
+    app = web.Application()
+    app.router.add_get('/object', server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            downloader = RangedDownloader(session, chunk_size=chunk_size, max_retries=max_retries,
+                                          base_retry_delay=0.0)
+            result = await downloader.download(f'http://127.0.0.1:{port}/object', dest_path, **kwargs)
+            return result, downloader.stats
+    finally:
+        await runner.cleanup()
+
+def ranges(server: StorageServer) -> List[Optional[str]]:
+    return [headers.get('Range') for headers in server.requests]
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+@pytest.fixture
+def dest(tmp_path):
+    return str(tmp_path / 'document.pdf')
+
+def test_small_file_arrives_in_one_request(dest):
+    server = StorageServer()
+    result, stats = asyncio.run(download(server, dest, chunk_size=8192))
+    
+    assert (result.status, result.size, result.sha256, result.etag) == (200, len(DATA), SHA256, '"v1"')
+    assert read(dest) == DATA
+    assert len(server.requests) == 1
+    assert stats['ranged_downloads'] == 0
+
+def test_large_file_is_fetched_in_parallel_ranges(dest):
+    server = StorageServer()
+    result, stats = asyncio.run(download(server, dest, expected_size=len(DATA), expected_sha256=SHA256.upper()))
+    
+    assert result.sha256 == SHA256
+    assert read(dest) == DATA
+    assert sorted(ranges(server)) == [
+        'bytes=0-1023', 'bytes=1024-2047', 'bytes=2048-3071', 'bytes=3072-4095', 'bytes=4096-5119',
+        'bytes=5120-5631'
+    ]
+    # Every chunk after the first is pinned to the version the first one came from
+    assert all(headers.get('If-Match') == '"v1"' for headers in server.requests[1:])
+    assert stats['ranged_downloads'] == 1
+    assert stats['bytes_downloaded'] == len(DATA)
+
+def test_server_without_range_support_gets_a_plain_download(dest):
+    server = StorageServer(ranges=False)
+    result, _ = asyncio.run(download(server, dest))
+    
+    assert result.sha256 == SHA256
+    assert read(dest) == DATA
+    assert len(server.requests) == 1
+
+def test_dropped_chunk_resumes_from_the_last_byte_written(dest):
+    server = StorageServer(cuts={2: 300})  # The first parallel chunk drops after 300 bytes
+    result, stats = asyncio.run(download(server, dest))
+    
+    assert result.sha256 == SHA256
+    assert read(dest) == DATA
+    assert 'bytes=1324-2047' in ranges(server)
+    assert stats['chunk_retries'] == 1
+    assert stats['bytes_downloaded'] == len(DATA)
+
+def test_dropped_first_chunk_resumes(dest):
+    server = StorageServer(cuts={1: 100})
+    result, _ = asyncio.run(download(server, dest))
+    
+    assert result.sha256 == SHA256
+    assert read(dest) == DATA
+    assert ranges(server)[1] == 'bytes=100-1023'
+
+def test_dropped_plain_download_resumes_with_a_range(dest):
+    server = StorageServer(full_first=True, cuts={1: 2000})
+    result, _ = asyncio.run(download(server, dest))
+    
+    assert result.sha256 == SHA256
+    assert read(dest) == DATA
+    assert ranges(server)[1] == f'bytes=2000-{len(DATA) - 1}'
+
+def test_dropped_download_without_range_support_fails(dest):
+    server = StorageServer(ranges=False, cuts={1: 2000})
+    with pytest.raises(DownloadError, match='failed at 2000 bytes'):
+        asyncio.run(download(server, dest))
+
+def test_chunk_that_keeps_dropping_fails_the_download(dest):
+    server = StorageServer(cuts={number: 10 for number in range(1, 20)})
+    with pytest.raises(DownloadError, match='after 2 attempts'):
+        asyncio.run(download(server, dest, max_retries=2))
+
+def test_object_replaced_mid_download_fails_instead_of_mixing_versions(dest):
+    server = StorageServer(etags={2: '"v2"'})
+    with pytest.raises(DownloadError, match='HTTP 412'):
+        asyncio.run(download(server, dest))
+
+def test_size_mismatch_fails_verification(dest):
+    with pytest.raises(DownloadError, match='Size mismatch'):
+        asyncio.run(download(StorageServer(), dest, expected_size=len(DATA) + 1))
+
+@pytest.mark.parametrize('chunk_size', [1024, 8192])
+def test_checksum_mismatch_fails_verification(dest, chunk_size):
+    with pytest.raises(DownloadError, match='Checksum mismatch'):
+        asyncio.run(download(StorageServer(), dest, chunk_size=chunk_size, expected_sha256='0' * 64))
+
+def test_not_modified_writes_nothing(dest):
+    server = StorageServer()
+    result, stats = asyncio.run(download(server, dest, headers={'If-None-Match': '"v1"'}))
+    
+    assert (result.status, result.etag) == (304, '"v1"')
+    assert read(dest) == b''
+    assert stats['downloads'] == 0
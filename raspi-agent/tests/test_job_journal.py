@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the job journal
+Stage transitions, field preservation and schema migration on a temporary SQLite file
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from job_journal import JobJournal
+
+JOB_DATA = {'upid': 'UPID1', 'fileUrl': 'https://storage.example/doc.pdf', 'totalPages': 120}
+
+# The jobs table as written before jobs could be batched or split
+OLD_SCHEMA = """
+    CREATE TABLE jobs (
+        upid TEXT PRIMARY KEY,
+        stage TEXT NOT NULL,
+        job_data TEXT,
+        file_path TEXT,
+        streamed INTEGER,
+        cups_job_id INTEGER,
+        pages_printed INTEGER,
+        accepted_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+"""
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'journal.db')
+
+def test_stage_transitions_keep_one_row_per_job(db_path):
+    journal = JobJournal(db_path)
+    journal.record('UPID1', JobJournal.ACCEPTED)
+    journal.record('UPID1', JobJournal.FETCHED, job_data=JOB_DATA)
+    journal.record('UPID1', JobJournal.DOWNLOADED, file_path='/tmp/doc.pdf', streamed=False)
+    journal.record('UPID1', JobJournal.SUBMITTED, cups_job_id=42)
+    
+    [job] = journal.unfinished()
+    assert job['stage'] == JobJournal.SUBMITTED
+    assert job['job_data'] == JOB_DATA
+    assert job['file_path'] == '/tmp/doc.pdf'
+    assert job['streamed'] is False
+    assert job['cups_job_id'] == 42
+    assert journal.stats['transitions'] == 4
+    assert journal.get_stats()['unfinished'] == {JobJournal.SUBMITTED: 1}
+
+def test_none_fields_keep_earlier_values(db_path):
+    journal = JobJournal(db_path)
+    ranges = [{'first': 1, 'last': 50, 'cups_job_id': 7}, {'first': 51, 'last': 120, 'cups_job_id': None}]
+    journal.record('UPID1', JobJournal.FETCHED, job_data=JOB_DATA)
+    journal.record('UPID1', JobJournal.DOWNLOADED, file_path='/tmp/doc.pdf', streamed=True)
+    journal.record('UPID1', JobJournal.SUBMITTED, cups_job_id=7, page_offset=3, page_ranges=ranges)
+    journal.record('UPID1', JobJournal.COMPLETED, pages_printed=120)
+    
+    [job] = journal.unfinished()
+    assert job['stage'] == JobJournal.COMPLETED
+    assert job['job_data'] == JOB_DATA
+    assert job['file_path'] == '/tmp/doc.pdf'
+    assert job['streamed'] is True
+    assert job['cups_job_id'] == 7
+    assert job['pages_printed'] == 120
+    assert job['page_offset'] == 3
+    assert job['page_ranges'] == ranges
+
+def test_later_values_replace_earlier_ones(db_path):
+    journal = JobJournal(db_path)
+    journal.record('UPID1', JobJournal.SUBMITTED, cups_job_id=7, page_ranges=[{'first': 1, 'last': 50}])
+    journal.record('UPID1', JobJournal.SUBMITTED, cups_job_id=8, page_ranges=[{'first': 51, 'last': 120}])
+    
+    [job] = journal.unfinished()
+    assert job['cups_job_id'] == 8
+    assert job['page_ranges'] == [{'first': 51, 'last': 120}]
+
+def test_accepted_time_is_kept_across_stages(db_path):
+    journal = JobJournal(db_path)
+    journal.record('UPID1', JobJournal.ACCEPTED)
+    accepted_at = journal.unfinished()[0]['accepted_at']
+    time.sleep(0.01)
+    journal.record('UPID1', JobJournal.FETCHED, job_data=JOB_DATA)
+    
+    [job] = journal.unfinished()
+    assert job['accepted_at'] == accepted_at
+    assert job['updated_at'] > accepted_at
+
+def test_unfinished_jobs_survive_a_restart_in_order(db_path):
+    journal = JobJournal(db_path)
+    journal.record('UPID1', JobJournal.SUBMITTED, job_data=JOB_DATA, cups_job_id=1)
+    journal.record('UPID2', JobJournal.DOWNLOADED, file_path='/tmp/two.pdf')
+    journal.record('UPID3', JobJournal.ACCEPTED)
+    journal.finish('UPID1')
+    journal.close()
+    
+    journal = JobJournal(db_path)
+    assert [job['upid'] for job in journal.unfinished()] == ['UPID2', 'UPID3']
+    assert journal.file_paths() == ['/tmp/two.pdf']
+
+def test_old_journal_is_migrated(db_path):
+    db = sqlite3.connect(db_path)
+    db.execute(OLD_SCHEMA)
+    db.execute(
+        'INSERT INTO jobs (upid, stage, job_data, file_path, streamed, cups_job_id, pages_printed, '
+        'accepted_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        ('UPID1', JobJournal.SUBMITTED, '{"upid": "UPID1"}', '/tmp/doc.pdf', 0, 42, None, 1.0, 2.0)
+    )
+    db.commit()
+    db.close()
+    
+    journal = JobJournal(db_path)
+    [job] = journal.unfinished()
+    assert job['cups_job_id'] == 42
+    assert job['job_data'] == {'upid': 'UPID1'}
+    assert job['page_offset'] is None
+    assert job['page_ranges'] is None
+    
+    # The new columns are usable, and old fields survive the update
+    journal.record('UPID1', JobJournal.SUBMITTED, page_offset=2, page_ranges=[{'first': 1, 'last': 10}])
+    [job] = journal.unfinished()
+    assert job['cups_job_id'] == 42
+    assert job['page_offset'] == 2
+    assert job['page_ranges'] == [{'first': 1, 'last': 10}]
+    journal.close()
+    
+    # Opening an already migrated journal again is a no-op
+    journal = JobJournal(db_path)
+    assert journal.unfinished()[0]['page_offset'] == 2
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the report outbox
+Durable delivery against a temporary SQLite file and a fake backend
+"""
+
+import asyncio
+import time
+from typing import Dict, Any, List, Tuple
+
+import pytest
+
+from outbox import ReportOutbox
+
+class FakeBackend:
+    """Records delivered reports and answers with scripted statuses"""
+    
+    def __init__(self, *statuses):
+        """
+        Initialize the fake backend
+        
+        Args:
+            statuses: Status (or exception) per call in order; the last one repeats
+        """
+        self.statuses = list(statuses) or [200]
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+    
+    async def send(self, kind: str, payload: Dict[str, Any]) -> int:
+        self.calls.append((kind, payload))
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'outbox.db')
+
+def rows(outbox: ReportOutbox) -> List[Tuple[str, str, int, float]]:
+    """(kind, upid, attempts, next_attempt_at) of every pending report"""
+    return outbox._db.execute(
+        'SELECT kind, upid, attempts, next_attempt_at FROM reports ORDER BY id'
+    ).fetchall()
+
+def test_duplicate_reports_are_ignored(db_path):
+    outbox = ReportOutbox(db_path, FakeBackend().send)
+    
+    assert outbox.enqueue('complete', 'UPID1', {'pages': 3}) is True
+    assert outbox.enqueue('complete', 'UPID1', {'pages': 3}) is False
+    assert outbox.enqueue('error', 'UPID1', {'error': 'jam'}) is True  # Other kind, same UPID
+    
+    assert outbox.pending() == 2
+    assert outbox.stats['duplicates'] == 1
+    assert outbox.stats['enqueued'] == 2
+
+def test_delivered_reports_are_removed(db_path):
+    backend = FakeBackend(200)
+    outbox = ReportOutbox(db_path, backend.send)
+    outbox.enqueue('complete', 'UPID1', {'pages': 3})
+    
+    assert asyncio.run(outbox.flush()) == 1
+    assert backend.calls == [('complete', {'pages': 3})]
+    assert outbox.pending() == 0
+    assert outbox.stats['delivered'] == 1
+
+@pytest.mark.parametrize('status', [400, 401, 404, 409, 422])
+def test_client_errors_are_dropped(db_path, status):
+    outbox = ReportOutbox(db_path, FakeBackend(status).send)
+    outbox.enqueue('complete', 'UPID1', {})
+    
+    assert asyncio.run(outbox.flush()) == 0
+    assert outbox.pending() == 0
+    assert outbox.stats['dropped'] == 1
+    assert outbox.stats['retries'] == 0
+
+@pytest.mark.parametrize('status', [500, 502, 503, 408, 429, ConnectionError('refused')])
+def test_server_errors_are_retried_later(db_path, status):
+    outbox = ReportOutbox(db_path, FakeBackend(status).send, base_retry_delay=2.0)
+    outbox.enqueue('complete', 'UPID1', {})
+    
+    before = time.time()
+    assert asyncio.run(outbox.flush()) == 0
+    
+    [(_, _, attempts, next_attempt_at)] = rows(outbox)
+    assert attempts == 1
+    assert next_attempt_at >= before + 2.0
+    assert outbox.stats['retries'] == 1
+    assert outbox.stats['dropped'] == 0
+    
+    # Not due yet: nothing is sent until the backoff has passed
+    assert asyncio.run(outbox.flush()) == 0
+    assert outbox.stats['retries'] == 1
+
+def test_retry_delay_doubles_up_to_the_cap(db_path):
+    outbox = ReportOutbox(db_path, FakeBackend(503).send, base_retry_delay=2.0, max_retry_delay=10.0)
+    outbox.enqueue('complete', 'UPID1', {})
+    
+    delays = []
+    for _ in range(5):
+        now = time.time()
+        asyncio.run(outbox.flush(ignore_schedule=True))
+        delays.append(round(rows(outbox)[0][3] - now))
+    assert delays == [2, 4, 8, 10, 10]
+
+def test_outage_backs_off_until_a_report_gets_through(db_path):
+    backend = FakeBackend(503, 503, 200)
+    outbox = ReportOutbox(db_path, backend.send)
+    outbox.enqueue('complete', 'UPID1', {})
+    
+    asyncio.run(outbox.flush(ignore_schedule=True))
+    asyncio.run(outbox.flush(ignore_schedule=True))
+    assert outbox._outage_failures == 2
+    
+    asyncio.run(outbox.flush(ignore_schedule=True))
+    assert outbox._outage_failures == 0
+    assert outbox.pending() == 0
+
+def test_partial_failure_is_not_an_outage(db_path):
+    outbox = ReportOutbox(db_path, FakeBackend(200, 503).send)
+    outbox.enqueue('complete', 'UPID1', {})
+    outbox.enqueue('complete', 'UPID2', {})
+    
+    assert asyncio.run(outbox.flush()) == 1
+    assert outbox._outage_failures == 0
+    assert [upid for _, upid, _, _ in rows(outbox)] == ['UPID2']
+
+def test_undelivered_reports_are_replayed_after_restart(db_path):
+    async def first_run():
+        outbox = ReportOutbox(db_path, FakeBackend(ConnectionError('down')).send, base_retry_delay=3600)
+        outbox.enqueue('complete', 'UPID1', {'pages': 1})
+        outbox.enqueue('error', 'UPID2', {'error': 'jam'})
+        await outbox.flush()
+        await outbox.stop(drain_timeout=1.0)
+    asyncio.run(first_run())
+    
+    # The backoff of the previous run is reset: both reports are due at once
+    backend = FakeBackend(200)
+    outbox = ReportOutbox(db_path, backend.send)
+    assert outbox.pending() == 2
+    assert asyncio.run(outbox.flush()) == 2
+    assert sorted(kind for kind, _ in backend.calls) == ['complete', 'error']
+
+def test_flusher_delivers_in_the_background(db_path):
+    backend = FakeBackend(200)
+    
+    async def run():
+        outbox = ReportOutbox(db_path, backend.send, flush_interval=0.05)
+        outbox.start()
+        outbox.enqueue('complete', 'UPID1', {})
+        for _ in range(100):
+            if not outbox.pending():
+                break
+            await asyncio.sleep(0.01)
+        pending = outbox.pending()
+        await outbox.stop()
+        return pending
+    
+    assert asyncio.run(run()) == 0
+    assert len(backend.calls) == 1
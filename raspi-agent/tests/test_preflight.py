@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Unit tests for PDF preflight
+Rejecting documents that cannot print, paper size checks and the result cache
+"""
+
+import asyncio
+
+import pytest
+from pypdf import PdfWriter
+
+import preflight
+from preflight import Preflight, paper_dimensions, preflight_pdf
+
+A4 = (595.0, 842.0)
+LETTER = (612.0, 792.0)
+
+def write_pdf(path, *sizes, password: str = None) -> str:
+    """Write a PDF with one blank page per (width, height) in points"""
+    writer = PdfWriter()
+    for width, height in sizes:
+        writer.add_blank_page(width, height)
+    if password:
+        writer.encrypt(password, algorithm='RC4-128')
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+@pytest.fixture
+def basic(monkeypatch):
+    """Check documents with the raw scan, as on a device without pypdf"""
+    monkeypatch.setattr(preflight, 'PdfReader', None)
+
+def test_paper_dimensions():
+    assert paper_dimensions('A4') == pytest.approx(A4, abs=1)
+    assert paper_dimensions('iso_a4_210x297mm') == pytest.approx(A4, abs=1)
+    assert paper_dimensions('na_letter_8.5x11in') == pytest.approx(LETTER)
+    assert paper_dimensions('custom') is None
+
+def test_document_on_the_requested_paper_passes(tmp_path):
+    result = preflight_pdf(write_pdf(tmp_path / 'doc.pdf', A4, A4[::-1], A4), 'A4')
+    assert (result.ok, result.pages, result.method) == (True, 3, 'pypdf')
+    assert result.mismatched_sizes == []
+
+def test_pages_of_another_paper_size_are_reported(tmp_path):
+    result = preflight_pdf(write_pdf(tmp_path / 'doc.pdf', A4, LETTER), 'A4')
+    assert result.ok
+    assert result.mismatched_sizes == ['page 2: 612x792pt']
+    assert preflight_pdf(str(tmp_path / 'doc.pdf'), 'Custom').mismatched_sizes == []
+
+@pytest.mark.parametrize('content, error', [
+    (b'', 'Document is empty'),
+    (b'<html>Access denied</html>', 'Not a PDF document'),
+    (b'%PDF-1.7\n1 0 obj\n<< /Type /Catalog', 'Malformed PDF'),
+])
+def test_unprintable_documents_are_rejected(tmp_path, content, error):
+    path = tmp_path / 'doc.pdf'
+    path.write_bytes(content)
+    result = preflight_pdf(str(path), 'A4')
+    assert not result.ok
+    assert result.error.startswith(error)
+
+def test_password_protected_document_is_rejected(tmp_path):
+    result = preflight_pdf(write_pdf(tmp_path / 'doc.pdf', A4, password='secret'), 'A4')
+    assert not result.ok
+    assert result.encrypted
+    assert 'password protected' in result.error
+
+def test_basic_scan_counts_pages_and_sizes(tmp_path, basic):
+    result = preflight_pdf(write_pdf(tmp_path / 'doc.pdf', A4, LETTER, LETTER), 'A4')
+    assert (result.ok, result.pages, result.method) == (True, 3, 'basic')
+    assert result.mismatched_sizes == ['612x792pt']
+
+def test_basic_scan_catches_truncated_uploads(tmp_path, basic):
+    path = write_pdf(tmp_path / 'doc.pdf', A4)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    
+    result = preflight_pdf(path, 'A4')
+    assert not result.ok
+    assert 'truncated' in result.error
+
+def check(checker: Preflight, *calls):
+    async def run():
+        try:
+            return [await checker.check(*args) for args in calls]
+        finally:
+            await checker.close()
+    return asyncio.run(run())
+
+def test_paper_mismatch_is_only_rejected_in_strict_mode(tmp_path):
+    path = write_pdf(tmp_path / 'doc.pdf', LETTER)
+    
+    [lenient] = check(Preflight(workers=1), (path, 'A4'))
+    assert lenient.ok
+    
+    checker = Preflight(workers=1, strict_paper=True)
+    [strict] = check(checker, (path, 'A4'))
+    assert not strict.ok
+    assert strict.error == 'Document does not match paper size A4 (page 1: 612x792pt)'
+    assert (checker.stats['paper_mismatches'], checker.stats['rejected']) == (1, 1)
+
+def test_results_are_cached_by_content_hash_and_paper(tmp_path):
+    path = write_pdf(tmp_path / 'doc.pdf', A4)
+    checker = Preflight(workers=1, cache_size=1)
+    results = check(checker, (path, 'A4', 'abc'), (path, 'a4', 'abc'), (path, 'Letter', 'abc'), (path, 'A4', 'abc'),
+                    (path, 'A4'), (path, 'A4'))
+    
+    assert all(result.ok for result in results)
+    # The Letter check pushed the A4 result out of the one-entry cache; unhashed documents are never cached
+    assert (checker.stats['checked'], checker.stats['cache_hits']) == (5, 1)
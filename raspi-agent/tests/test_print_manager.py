@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the asyncio print manager
+Worker connection handling and batched job tracking, with fake PrintManagers
+"""
+
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from print_manager import AsyncPrintManager, PrintJobStatus, PrintOptions
+
+class FakeManager:
+    """PrintManager stand-in that drains the document and remembers it"""
+    
+    def __init__(self, created: List['FakeManager']):
+        self.documents: List[bytes] = []
+        created.append(self)
+    
+    def print_stream(self, chunks, job_title, print_options, document_format, cups_options) -> int:
+        self.documents.append(b''.join(chunks))
+        return len(self.documents)
+    
+    def get_printer_attributes(self):
+        return {}
+
+async def chunks(*parts, error: Exception = None):
+    for part in parts:
+        yield part
+    if error:
+        raise error
+
+def manager(created: List[FakeManager]) -> AsyncPrintManager:
+    return AsyncPrintManager('Test_Printer', max_workers=1, manager_factory=lambda: FakeManager(created))
+
+def test_streaming_keeps_the_worker_connection():
+    created = []
+    
+    async def run():
+        async_manager = manager(created)
+        await async_manager.print_stream(chunks(b'a', b'b'), 'Job', PrintOptions())
+        await async_manager.print_stream(chunks(b'c'), 'Job', PrintOptions())
+    
+    asyncio.run(run())
+    [worker] = created
+    assert worker.documents == [b'ab', b'c']
+
+def test_failed_chunk_source_drops_the_worker_connection():
+    created = []
+    
+    async def run():
+        async_manager = manager(created)
+        with pytest.raises(ConnectionResetError):
+            await async_manager.print_stream(chunks(b'a', error=ConnectionResetError('storage')), 'Job',
+                                             PrintOptions())
+        return await async_manager.print_stream(chunks(b'b'), 'Job', PrintOptions())
+    
+    assert asyncio.run(run()) == 1
+    broken, fresh = created
+    assert broken.documents == []
+    assert fresh.documents == [b'b']
+
+class JobTable:
+    """PrintManager stand-in answering batched job lookups from a dict of job states"""
+    
+    def __init__(self, states: Dict[int, PrintJobStatus]):
+        self.states = dict(states)
+        self.lookups: List[List[int]] = []
+        self.errors: List[Exception] = []
+    
+    def get_jobs_status(self, job_ids, requested_attributes=None) -> Dict[int, tuple]:
+        self.lookups.append(sorted(job_ids))
+        if self.errors:
+            raise self.errors.pop(0)
+        return {
+            job_id: (self.states[job_id], {'job-id': job_id, 'job-media-sheets-completed': 1})
+            for job_id in job_ids if job_id in self.states
+        }
+
+def tracked(table: JobTable) -> AsyncPrintManager:
+    return AsyncPrintManager('Test_Printer', poll_interval=0.01, max_workers=1, manager_factory=lambda: table)
+
+def test_concurrent_waiters_share_one_lookup_per_tick():
+    table = JobTable({1: PrintJobStatus.PROCESSING, 2: PrintJobStatus.PENDING, 3: PrintJobStatus.PROCESSING})
+    
+    async def run():
+        async_manager = tracked(table)
+        waiters = asyncio.gather(*(async_manager.wait_for_completion(job_id, timeout=5) for job_id in (1, 2, 3)))
+        await asyncio.sleep(0.05)
+        table.states.update({1: PrintJobStatus.COMPLETED, 2: PrintJobStatus.ABORTED, 3: PrintJobStatus.COMPLETED})
+        return await waiters, async_manager.tracker
+    
+    results, tracker = asyncio.run(run())
+    assert [success for success, _ in results] == [True, False, True]
+    assert all(lookup == [1, 2, 3] for lookup in table.lookups)
+    assert tracker.polls == len(table.lookups)
+    assert tracker.watched_jobs == []
+
+def test_status_callback_fires_only_when_the_status_changes():
+    table = JobTable({1: PrintJobStatus.PENDING})
+    seen = []
+    
+    async def run():
+        async_manager = tracked(table)
+        waiter = asyncio.ensure_future(async_manager.wait_for_completion(
+            1, timeout=5, on_status=lambda job_id, status, job_info: seen.append(status)))
+        await asyncio.sleep(0.05)
+        table.states[1] = PrintJobStatus.PROCESSING
+        await asyncio.sleep(0.05)
+        table.states[1] = PrintJobStatus.COMPLETED
+        return await waiter
+    
+    assert asyncio.run(run())[0] is True
+    assert len(table.lookups) > 3
+    assert seen == [PrintJobStatus.PENDING, PrintJobStatus.PROCESSING, PrintJobStatus.COMPLETED]
+
+def test_late_waiter_gets_the_recorded_result_without_a_lookup():
+    table = JobTable({1: PrintJobStatus.COMPLETED})
+    
+    async def run():
+        async_manager = tracked(table)
+        await async_manager.wait_for_completion(1, timeout=5)
+        lookups = len(table.lookups)
+        result = await async_manager.wait_for_completion(1, timeout=5)
+        return result, lookups
+    
+    (success, job_info), lookups = asyncio.run(run())
+    assert success is True
+    assert job_info['job-id'] == 1
+    assert len(table.lookups) == lookups
+
+def test_failed_lookup_keeps_the_job_watched():
+    table = JobTable({1: PrintJobStatus.COMPLETED})
+    table.errors.append(RuntimeError('cups busy'))
+    
+    async def run():
+        return await tracked(table).wait_for_completion(1, timeout=5)
+    
+    assert asyncio.run(run())[0] is True
+    assert len(table.lookups) == 2
+
+def test_timed_out_waiter_stops_the_polling():
+    table = JobTable({1: PrintJobStatus.PROCESSING})
+    
+    async def run():
+        async_manager = tracked(table)
+        result = await async_manager.wait_for_completion(1, timeout=0.05)
+        await asyncio.sleep(0.05)
+        return result, async_manager.tracker
+    
+    (success, job_info), tracker = asyncio.run(run())
+    assert success is False
+    assert job_info['job-id'] == 1  # The last status seen before giving up
+    assert tracker.watched_jobs == []
+    assert tracker._task.done()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the printer cache
+Option validation against the printer's capabilities, the compiled-options memo and shared refreshes
+"""
+
+import asyncio
+from typing import Any, Dict
+
+from print_manager import PrintOptions, PrinterCache
+
+FULL_SUPPORT = {
+    'printer-state': 3,
+    'print-color-mode-supported': ['monochrome', 'color'],
+    'sides-supported': ['one-sided', 'two-sided-long-edge', 'two-sided-short-edge'],
+    'media-supported': ['iso_a4_210x297mm', 'na_letter_8.5x11in'],
+    'print-quality-supported': [3, 4, 5],
+    'orientation-requested-supported': [3, 4],
+    'copies-supported': (1, 10)
+}
+
+class FakeManager:
+    """AsyncPrintManager stand-in that counts attribute reads"""
+    
+    printer_name = 'Test_Printer'
+    
+    def __init__(self, **attributes):
+        self.attributes = {**FULL_SUPPORT, **attributes}
+        self.reads = 0
+    
+    async def get_printer_attributes(self) -> Dict[str, Any]:
+        self.reads += 1
+        await asyncio.sleep(0)
+        return dict(self.attributes)
+
+def compile_options(cache: PrinterCache, **options) -> Dict[str, str]:
+    return asyncio.run(cache.compile_options(PrintOptions(**options)))
+
+def test_supported_options_pass_through_with_media_renamed():
+    cache = PrinterCache(FakeManager())
+    cups_options = compile_options(cache, copies=2, duplex=True, color_mode='color', print_quality='high')
+    
+    assert cups_options == {
+        'copies': '2',
+        'sides': 'two-sided-long-edge',
+        'media': 'iso_a4_210x297mm',
+        'orientation-requested': '3',
+        'print-color-mode': 'color',
+        'print-quality': '5'
+    }
+    # Renaming the media to the printer's spelling is not an adjustment
+    assert cache.stats['options_adjusted'] == 0
+
+def test_unsupported_options_are_downgraded_or_left_to_the_printer():
+    cache = PrinterCache(FakeManager(**{
+        'print-color-mode-supported': ['monochrome'],
+        'sides-supported': ['one-sided'],
+        'media-supported': ['na_letter_8.5x11in'],
+        'print-quality-supported': [4],
+        'copies-supported': (1, 5)
+    }))
+    cups_options = compile_options(cache, copies=9, duplex=True, color_mode='color', print_quality='draft')
+    
+    assert cups_options == {
+        'copies': '5',
+        'sides': 'one-sided',
+        'orientation-requested': '3',
+        'print-color-mode': 'monochrome'
+    }
+    assert cache.stats['options_adjusted'] == 1
+
+def test_mono_printer_without_a_mode_list_prints_monochrome():
+    manager = FakeManager(**{'color-supported': False})
+    del manager.attributes['print-color-mode-supported']
+    cache = PrinterCache(manager)
+    assert compile_options(cache, color_mode='colour')['print-color-mode'] == 'monochrome'
+
+def test_options_are_left_alone_when_support_is_unknown():
+    cache = PrinterCache(FakeManager(**{name: None for name in FULL_SUPPORT}))
+    print_options = PrintOptions(copies=3, duplex=True, paper_size='A3', color_mode='color')
+    assert asyncio.run(cache.compile_options(print_options)) == print_options.to_cups_options()
+
+def test_compiled_options_are_memoized_per_combination():
+    cache = PrinterCache(FakeManager())
+    first = compile_options(cache, duplex=True)
+    assert compile_options(cache, duplex=True) == first
+    compile_options(cache, duplex=False)
+    
+    assert (cache.stats['options_compiled'], cache.stats['options_cache_hits']) == (2, 1)
+    assert cache.get_stats()['compiled_option_sets'] == 2
+
+def test_page_ranges_bypass_the_memo():
+    cache = PrinterCache(FakeManager())
+    first = compile_options(cache, page_ranges='1-50')
+    second = compile_options(cache, page_ranges='51-100')
+    
+    assert first['page-ranges'] == '1-50'
+    assert second['page-ranges'] == '51-100'
+    assert 'page-ranges' not in compile_options(cache)
+    assert (cache.stats['options_compiled'], cache.stats['options_cache_hits']) == (1, 2)
+
+def test_memo_is_bounded():
+    cache = PrinterCache(FakeManager(), max_compiled=2)
+    for copies in (1, 2, 3):
+        compile_options(cache, copies=copies)
+    compile_options(cache, copies=1)  # The oldest set was dropped
+    
+    assert cache.stats['options_compiled'] == 4
+    assert cache.get_stats()['compiled_option_sets'] == 2
+
+def test_capability_change_drops_the_memo():
+    manager = FakeManager()
+    cache = PrinterCache(manager)
+    assert compile_options(cache, color_mode='color')['print-color-mode'] == 'color'
+    
+    # A state change alone keeps the compiled options
+    manager.attributes['printer-state'] = 4
+    asyncio.run(cache.refresh())
+    assert cache.get_stats()['compiled_option_sets'] == 1
+    
+    manager.attributes['print-color-mode-supported'] = ['monochrome']  # The colour cartridge was removed
+    asyncio.run(cache.refresh())
+    assert cache.get_stats()['compiled_option_sets'] == 0
+    assert compile_options(cache, color_mode='color')['print-color-mode'] == 'monochrome'
+
+def test_concurrent_readers_share_one_refresh():
+    manager = FakeManager()
+    cache = PrinterCache(manager, ttl=60)
+    
+    async def run():
+        await asyncio.gather(*(cache.get() for _ in range(5)))
+        await cache.get()
+    
+    asyncio.run(run())
+    assert manager.reads == 1
+    assert cache.fresh
+    
+    cache.invalidate()
+    asyncio.run(cache.get())
+    assert manager.reads == 2
+
+def test_failed_refresh_falls_back_to_the_last_capabilities():
+    manager = FakeManager(**{'print-color-mode-supported': ['monochrome']})
+    cache = PrinterCache(manager)
+    asyncio.run(cache.refresh())
+    cache.invalidate()
+    
+    async def unreachable():
+        raise RuntimeError('cups down')
+    
+    manager.get_printer_attributes = unreachable
+    assert compile_options(cache, color_mode='color')['print-color-mode'] == 'monochrome'
+    assert cache.stats['refresh_errors'] == 1
+
+def test_printer_state_events_update_the_copy_in_place():
+    cache = PrinterCache(FakeManager(), ttl=60)
+    asyncio.run(cache.refresh())
+    
+    cache.apply_event({'notify-subscribed-event': 'printer-state-changed', 'printer-state': 5,
+                       'printer-state-reasons': ['media-empty']})
+    assert cache.attributes['printer-state'] == 5
+    assert cache.fresh
+    
+    cache.apply_event({'notify-subscribed-event': 'printer-media-changed'})
+    assert not cache.fresh
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the printer pool
+Routing by capability and load, fallback and quarantine, with fake print managers
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List
+
+import cups
+import pytest
+
+from print_manager import PrintOptions, PrinterCache
+from printer_pool import PRINTER_STOPPED, PrinterPool
+from scheduler import DEFAULT_PPM
+
+COLOUR = PrintOptions(color_mode='color')
+MONO = PrintOptions()
+
+class FakeManager:
+    """AsyncPrintManager stand-in for one printer; submissions fail while `errors` is non-empty"""
+    
+    job_ids = itertools.count(1)
+    
+    def __init__(self, name: str, ppm: float = None, color: bool = True, **attributes):
+        self.printer_name = name
+        self.attributes = {
+            'printer-state': 3,
+            'printer-is-accepting-jobs': True,
+            'color-supported': color,
+            'pages-per-minute': ppm,
+            **attributes
+        }
+        self.printer_cache = PrinterCache(self, ttl=3600)
+        self.errors: List[Exception] = []
+        self.submitted: List[int] = []
+    
+    async def connect(self) -> None:
+        await self.printer_cache.refresh()
+    
+    async def get_printer_attributes(self) -> Dict[str, Any]:
+        return self.attributes
+    
+    async def print_file(self, file_path: str, job_title: str, print_options: PrintOptions, raw: bool = False) -> int:
+        if self.errors:
+            raise self.errors.pop(0)
+        job_id = next(self.job_ids)
+        self.submitted.append(job_id)
+        return job_id
+    
+    async def print_stream(self, chunks, job_title: str, print_options: PrintOptions, document_format: str) -> int:
+        async for _ in chunks:
+            pass
+        return await self.print_file('-', job_title, print_options)
+    
+    async def wait_for_completion(self, job_id: int, timeout=None, on_status=None):
+        return True, {'job-media-sheets-completed': 3}
+
+def pool(*managers: FakeManager, **kwargs) -> PrinterPool:
+    printer_pool = PrinterPool({manager.printer_name: manager for manager in managers}, **kwargs)
+    asyncio.run(printer_pool.connect())
+    return printer_pool
+
+def submit(printer_pool: PrinterPool, print_options: PrintOptions = MONO, pages: int = 1, **kwargs) -> str:
+    """Submit a job and return the name of the printer it went to"""
+    job_id = asyncio.run(printer_pool.print_file('/tmp/doc.pdf', 'Job', print_options, pages=pages, **kwargs))
+    return printer_pool.job_printer(job_id)
+
+def test_jobs_go_to_the_least_loaded_printer():
+    printer_pool = pool(FakeManager('A', ppm=20), FakeManager('B', ppm=20))
+    assert submit(printer_pool, pages=10) == 'A'
+    assert submit(printer_pool, pages=5) == 'B'
+    assert submit(printer_pool, pages=1) == 'B'
+    assert printer_pool.get_stats()['A']['queued_pages'] == 10
+    assert printer_pool.get_stats()['B']['queued_pages'] == 6
+
+def test_load_is_measured_in_minutes_of_printing():
+    printer_pool = pool(FakeManager('SLOW', ppm=10), FakeManager('FAST', ppm=40))
+    assert [submit(printer_pool, pages=10) for _ in range(4)] == ['FAST', 'FAST', 'FAST', 'SLOW']
+
+def test_printers_without_a_speed_are_assumed_to_print_at_the_default_rate():
+    printer_pool = pool(FakeManager('UNKNOWN'), FakeManager('FAST', ppm=DEFAULT_PPM * 2))
+    unknown, fast = printer_pool.printers
+    assert unknown.load_after(DEFAULT_PPM) == pytest.approx(1.0)
+    
+    assert [submit(printer_pool, pages=20) for _ in range(4)] == ['FAST', 'UNKNOWN', 'FAST', 'FAST']
+
+def test_colour_jobs_go_to_a_colour_printer():
+    printer_pool = pool(FakeManager('MONO', ppm=40, color=False), FakeManager('COLOUR', ppm=10))
+    assert submit(printer_pool, COLOUR, pages=50) == 'COLOUR'
+    assert submit(printer_pool, COLOUR, pages=50) == 'COLOUR'
+    assert submit(printer_pool, MONO) == 'MONO'
+
+def test_jobs_fall_back_to_an_incapable_printer_rather_than_fail():
+    printer_pool = pool(FakeManager('MONO', color=False))
+    assert submit(printer_pool, COLOUR) == 'MONO'
+
+def test_stopped_and_rejecting_printers_are_skipped():
+    printer_pool = pool(FakeManager('STOPPED', ppm=60, **{'printer-state': PRINTER_STOPPED}),
+                        FakeManager('REJECTING', ppm=60, **{'printer-is-accepting-jobs': False}),
+                        FakeManager('READY', ppm=5))
+    assert submit(printer_pool, pages=100) == 'READY'
+    assert submit(printer_pool, pages=100) == 'READY'
+
+def test_split_job_parts_stay_on_one_printer():
+    printer_pool = pool(FakeManager('A', ppm=20), FakeManager('B', ppm=20))
+    assert submit(printer_pool, pages=50) == 'A'
+    assert submit(printer_pool, pages=50, printer_name='A') == 'A'
+
+def test_failed_submission_falls_back_to_the_next_printer():
+    a, b = FakeManager('A', ppm=20), FakeManager('B', ppm=20)
+    printer_pool = pool(a, b)
+    a.errors.append(cups.IPPError(1280, 'server-error-busy'))
+    
+    assert submit(printer_pool) == 'B'
+    assert printer_pool.get_stats()['A']['submit_errors'] == 1
+    assert printer_pool.printers[0].consecutive_failures == 1
+
+def test_error_is_raised_when_every_printer_fails():
+    a, b = FakeManager('A'), FakeManager('B')
+    printer_pool = pool(a, b)
+    a.errors.append(cups.IPPError(1280, 'a'))
+    b.errors.append(cups.IPPError(1280, 'b'))
+    with pytest.raises(cups.IPPError, match='b'):
+        submit(printer_pool)
+
+def test_missing_file_is_not_blamed_on_the_printer():
+    a, b = FakeManager('A'), FakeManager('B')
+    printer_pool = pool(a, b)
+    a.errors.append(FileNotFoundError('/tmp/doc.pdf'))
+    with pytest.raises(FileNotFoundError):
+        submit(printer_pool)
+    assert b.submitted == []
+    assert printer_pool.printers[0].consecutive_failures == 0
+
+def test_failing_printer_is_quarantined_and_tried_last():
+    a, b = FakeManager('A', ppm=60), FakeManager('B', ppm=5)
+    printer_pool = pool(a, b, failure_threshold=2, quarantine_seconds=60)
+    a.errors.extend([cups.IPPError(1280, 'jam')] * 2)
+    submit(printer_pool)
+    submit(printer_pool)
+    
+    printer = printer_pool.printers[0]
+    assert printer.available is False
+    assert printer.quarantined_until - time.monotonic() == pytest.approx(60, abs=1)
+    assert [candidate.name for candidate in asyncio.run(printer_pool.candidates(MONO))] == ['B', 'A']
+    assert submit(printer_pool, pages=100) == 'B'
+
+def test_quarantine_doubles_while_the_printer_keeps_failing():
+    a, b = FakeManager('A'), FakeManager('B')
+    printer_pool = pool(a, b, failure_threshold=1, quarantine_seconds=10, max_quarantine_seconds=30)
+    printer = printer_pool.printers[0]
+    
+    periods = []
+    for _ in range(4):
+        printer.quarantined_until = 0.0  # The quarantine has run out; the next job tries A again
+        a.errors.append(cups.IPPError(1280, 'jam'))
+        submit(printer_pool)
+        periods.append(round(printer.quarantined_until - time.monotonic()))
+    assert periods == [10, 20, 30, 30]
+    assert printer.stats['quarantines'] == 4
+
+def test_successful_submission_ends_the_quarantine():
+    a, b = FakeManager('A'), FakeManager('B')
+    printer_pool = pool(a, b, failure_threshold=1)
+    a.errors.append(cups.IPPError(1280, 'jam'))
+    submit(printer_pool)
+    b.errors.append(cups.IPPError(1280, 'jam'))  # Only the quarantined printer is left
+    
+    assert submit(printer_pool) == 'A'
+    printer = printer_pool.printers[0]
+    assert printer.consecutive_failures == 0
+    assert printer.available is True
+
+def test_unreachable_printer_is_quarantined_at_connect():
+    class Unreachable(FakeManager):
+        async def get_printer_attributes(self):
+            raise RuntimeError('cups down')
+    
+    printer_pool = pool(Unreachable('A'), FakeManager('B'), failure_threshold=3)
+    assert printer_pool.printers[0].available is False
+    assert submit(printer_pool) == 'B'
+
+def test_no_reachable_printer_fails_the_connect():
+    class Unreachable(FakeManager):
+        async def get_printer_attributes(self):
+            raise RuntimeError('cups down')
+    
+    with pytest.raises(RuntimeError, match='None of the printers'):
+        pool(Unreachable('A'), Unreachable('B'))
+
+def test_stream_errors_from_the_document_source_do_not_count_against_the_printer():
+    printer_pool = pool(FakeManager('A'))
+    
+    async def broken_download():
+        yield b'%PDF'
+        raise ConnectionResetError('storage')
+    
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(printer_pool.print_stream(broken_download(), 'Job', MONO))
+    assert printer_pool.printers[0].consecutive_failures == 0
+
+def test_cups_stream_errors_count_against_the_printer():
+    a = FakeManager('A')
+    printer_pool = pool(a)
+    a.errors.append(cups.HTTPError(500))
+    
+    async def document():
+        yield b'%PDF'
+    
+    with pytest.raises(cups.HTTPError):
+        asyncio.run(printer_pool.print_stream(document(), 'Job', MONO))
+    assert printer_pool.printers[0].consecutive_failures == 1
+
+def test_finished_jobs_come_off_the_printer_load():
+    printer_pool = pool(FakeManager('A'))
+    job_id = asyncio.run(printer_pool.print_file('/tmp/doc.pdf', 'Job', MONO, pages=7))
+    assert printer_pool.get_stats()['A']['queued_pages'] == 7
+    
+    assert asyncio.run(printer_pool.wait_for_completion(job_id))[0] is True
+    stats = printer_pool.get_stats()['A']
+    assert stats['queued_pages'] == 0
+    assert stats['active_jobs'] == 0
+    assert stats['jobs_completed'] == 1
+    assert stats['pages_printed'] == 3
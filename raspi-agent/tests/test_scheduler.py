@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the job scheduler
+Ordering per policy, aging and take() on the scheduled queue
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pytest
+
+from scheduler import ScheduledQueue, estimate_print_seconds, estimated_waits
+
+@dataclass(eq=False)
+class Job:
+    """Stand-in for a print job context"""
+    upid: str
+    estimated_seconds: Optional[float]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    print_started_at: Optional[float] = None
+
+def drain(queue: ScheduledQueue):
+    """UPIDs in the order get() hands them out"""
+    upids = []
+    while not queue.empty():
+        upids.append(queue.get_nowait().upid)
+        queue.task_done()
+    return upids
+
+def fill(queue: ScheduledQueue, *jobs: Job) -> ScheduledQueue:
+    for job in jobs:
+        queue.put_nowait(job)
+    return queue
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ScheduledQueue(policy='lifo')
+
+def test_fifo_keeps_arrival_order():
+    queue = fill(ScheduledQueue(policy='fifo'), Job('A', 30), Job('B', 10), Job('C', None), Job('D', 20))
+    assert [job.upid for job in queue.scheduled()] == ['A', 'B', 'C', 'D']
+    assert drain(queue) == ['A', 'B', 'C', 'D']
+
+def test_sjf_runs_shortest_first_with_unknown_estimates_last():
+    queue = fill(ScheduledQueue(policy='sjf'), Job('A', 30), Job('B', None), Job('C', 10), Job('D', 20),
+                 Job('E', 10))
+    assert [job.upid for job in queue.scheduled()] == ['C', 'E', 'D', 'A', 'B']
+    assert drain(queue) == ['C', 'E', 'D', 'A', 'B']
+
+def test_sjf_lets_a_long_job_wait_behind_newer_short_ones():
+    now = time.monotonic()
+    queue = fill(ScheduledQueue(policy='sjf'), Job('BIG', 300, enqueued_at=now - 1000), Job('SMALL', 10))
+    assert drain(queue) == ['SMALL', 'BIG']
+
+def test_aged_sjf_promotes_jobs_that_have_waited():
+    now = time.monotonic()
+    queue = fill(
+        ScheduledQueue(policy='aged-sjf', aging=1.0),
+        Job('BIG', 300, enqueued_at=now - 295),  # Effective estimate ~5s
+        Job('MEDIUM', 60, enqueued_at=now - 10),  # ~50s
+        Job('SMALL', 10)  # ~10s
+    )
+    assert drain(queue) == ['BIG', 'SMALL', 'MEDIUM']
+
+def test_aging_rate_scales_the_promotion():
+    now = time.monotonic()
+    jobs = (Job('BIG', 300, enqueued_at=now - 100), Job('SMALL', 150))
+    assert drain(fill(ScheduledQueue(policy='aged-sjf', aging=1.0), *jobs)) == ['SMALL', 'BIG']
+    assert drain(fill(ScheduledQueue(policy='aged-sjf', aging=2.0), *jobs)) == ['BIG', 'SMALL']
+
+def test_take_removes_matching_items_in_scheduled_order():
+    queue = fill(ScheduledQueue(policy='sjf'), Job('A1', 30), Job('B1', 5), Job('A2', 10), Job('A3', 20))
+    taken = asyncio.run(queue.take(lambda job: job.upid.startswith('A'), limit=2))
+    
+    assert [job.upid for job in taken] == ['A2', 'A3']
+    assert [job.upid for job in queue.scheduled()] == ['B1', 'A1']
+    for _ in taken:
+        queue.task_done()
+    assert drain(queue) == ['B1', 'A1']
+
+def test_take_returns_at_once_when_nothing_matches():
+    queue = fill(ScheduledQueue(), Job('A', 10))
+    assert asyncio.run(queue.take(lambda job: False, limit=3)) == []
+    assert queue.qsize() == 1
+
+def test_take_waits_for_matching_arrivals():
+    async def run():
+        queue = fill(ScheduledQueue(), Job('A1', 10))
+        
+        async def arrive():
+            await asyncio.sleep(0.02)
+            queue.put_nowait(Job('B1', 10))
+            await asyncio.sleep(0.02)
+            queue.put_nowait(Job('A2', 10))
+        
+        arrivals = asyncio.create_task(arrive())
+        taken = await queue.take(lambda job: job.upid.startswith('A'), limit=2, timeout=2.0)
+        await arrivals
+        return [job.upid for job in taken], [job.upid for job in queue.scheduled()]
+    
+    assert asyncio.run(run()) == (['A1', 'A2'], ['B1'])
+
+def test_take_gives_up_after_the_timeout():
+    async def run():
+        queue = fill(ScheduledQueue(), Job('A1', 10))
+        started_at = time.monotonic()
+        taken = await queue.take(lambda job: True, limit=5, timeout=0.05)
+        return len(taken), time.monotonic() - started_at
+    
+    taken, elapsed = asyncio.run(run())
+    assert taken == 1
+    assert 0.05 <= elapsed < 1.0
+
+def test_take_wakes_blocked_putters():
+    async def run():
+        queue = fill(ScheduledQueue(maxsize=2), Job('A1', 10), Job('B1', 10))
+        blocked = asyncio.create_task(queue.put(Job('A2', 10)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        
+        taken = await queue.take(lambda job: job.upid == 'A1', limit=1)
+        await asyncio.wait_for(blocked, 1.0)
+        return [job.upid for job in taken], [job.upid for job in queue.scheduled()]
+    
+    assert asyncio.run(run()) == (['A1'], ['B1', 'A2'])
+
+def test_taken_items_count_towards_join():
+    async def run():
+        queue = fill(ScheduledQueue(), Job('A1', 10), Job('A2', 10))
+        taken = await queue.take(lambda job: True, limit=2)
+        joined = asyncio.create_task(queue.join())
+        await asyncio.sleep(0.01)
+        pending = not joined.done()
+        for _ in taken:
+            queue.task_done()
+        await asyncio.wait_for(joined, 1.0)
+        return pending
+    
+    assert asyncio.run(run()) is True
+
+def test_get_still_blocks_until_an_item_arrives():
+    async def run():
+        queue = ScheduledQueue(policy='sjf')
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0.01)
+        queue.put_nowait(Job('A', 10))
+        return (await asyncio.wait_for(getter, 1.0)).upid
+    
+    assert asyncio.run(run()) == 'A'
+
+def test_estimate_scales_with_pages_copies_duplex_and_colour():
+    base = estimate_print_seconds({'totalPages': 10}, ppm=60)
+    assert base == pytest.approx(5.0 + 10)
+    assert estimate_print_seconds({'totalPages': 10, 'copies': 2}, ppm=60) == pytest.approx(5.0 + 20)
+    assert estimate_print_seconds({'totalPages': 10, 'doubleSided': True}, ppm=60) == pytest.approx(5.0 + 16)
+    assert estimate_print_seconds({'totalPages': 10, 'colorMode': 'color'}, ppm=60) == pytest.approx(5.0 + 13)
+    assert estimate_print_seconds({}, ppm=60) == pytest.approx(5.0 + 1)
+
+def test_estimated_waits_accumulate_the_backlog():
+    now = time.monotonic()
+    printing = [Job('P', 100, print_started_at=now - 40)]
+    queued = [Job('A', 30), Job('B', None), Job('C', 10)]
+    waits = estimated_waits(printing, queued, servers=2)
+    
+    assert waits['A'] == pytest.approx(30, abs=1)
+    assert waits['B'] == pytest.approx(45, abs=1)
+    assert waits['C'] is None
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Unit tests for resuming journaled jobs after a restart
+Which pipeline stage a split job re-enters, and with which file
+"""
+
+import asyncio
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+from job_journal import JobJournal
+from print_agent import Config, PageRange, PipelineStage, PrintAgent
+
+JOB_DATA = {'upid': 'UPID1', 'fileUrl': 'https://storage.example/doc.pdf', 'totalPages': 120}
+
+@pytest.fixture
+def agent(tmp_path):
+    manager = SimpleNamespace(printer_cache=SimpleNamespace(capabilities=SimpleNamespace(pages_per_minute=None)))
+    agent = PrintAgent(Config('http://backend.test', 'key', 'Test_Printer', log_level='WARNING'),
+                       print_manager=manager)
+    agent.journal = JobJournal(str(tmp_path / 'journal.db'))
+    agent.pipeline = [PipelineStage(name, None, 1, 10, None) for name in ('fetch', 'download', 'print')]
+    return agent
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / 'print_job_UPID1.pdf'
+    path.write_bytes(b'%PDF-1.4\n%%EOF\n')
+    return str(path)
+
+def journal_split(agent: PrintAgent, file_path: str, *parts: PageRange) -> None:
+    agent.journal.record('UPID1', JobJournal.DOWNLOADED, job_data=JOB_DATA, file_path=file_path, streamed=False)
+    agent.journal.record('UPID1', JobJournal.SUBMITTED, cups_job_id=parts[0].cups_job_id,
+                         page_ranges=[asdict(part) for part in parts])
+
+def resume(agent: PrintAgent):
+    """Resume the journaled jobs and return (stage name, context) of each"""
+    asyncio.run(agent._resume_jobs())
+    return [(stage.name, stage.queue.get_nowait()) for stage in agent.pipeline for _ in range(stage.queue.qsize())]
+
+def test_split_job_resumes_printing_from_its_downloaded_file(agent, document):
+    journal_split(agent, document,
+                  PageRange(1, 50, cups_job_id=7, printer_name='Test_Printer', printed=True, sheets=50),
+                  PageRange(51, 100, cups_job_id=8, printer_name='Test_Printer'),
+                  PageRange(101, None))
+    
+    [(stage, ctx)] = resume(agent)
+    assert stage == 'print'
+    assert ctx.file_path == document
+    assert document in agent.temp_files
+    assert [part.printed for part in ctx.page_ranges] == [True, False, False]
+    assert [part.cups_job_id for part in ctx.page_ranges] == [7, 8, None]
+
+def test_split_job_is_downloaded_again_when_its_file_is_gone(agent, tmp_path):
+    journal_split(agent, str(tmp_path / 'print_job_gone.pdf'),
+                  PageRange(1, 50, cups_job_id=7, printed=True, sheets=50),
+                  PageRange(51, None))
+    
+    [(stage, ctx)] = resume(agent)
+    assert stage == 'download'
+    assert ctx.file_path is None
+    assert [part.printed for part in ctx.page_ranges] == [True, False]
+
+def test_fully_printed_split_job_needs_no_file(agent, tmp_path):
+    journal_split(agent, str(tmp_path / 'print_job_gone.pdf'),
+                  PageRange(1, 50, cups_job_id=7, printed=True, sheets=50),
+                  PageRange(51, None, cups_job_id=8, printed=True, sheets=70))
+    
+    [(stage, ctx)] = resume(agent)
+    assert stage == 'print'
+    assert ctx.file_path is None
+
+def test_unsplit_submitted_job_reattaches_without_its_file(agent, tmp_path):
+    agent.journal.record('UPID1', JobJournal.SUBMITTED, job_data=JOB_DATA, cups_job_id=42,
+                         file_path=str(tmp_path / 'print_job_gone.pdf'))
+    
+    [(stage, ctx)] = resume(agent)
+    assert stage == 'print'
+    assert ctx.cups_job_id == 42
+    assert ctx.page_ranges is None